@@ -0,0 +1,90 @@
+"""Benchmark concurrent `dp` processes updating the same config file, as parallel CI jobs do.
+
+Run with `python -m benchmarks.config_contention --help` from the repository root.
+"""
+
+import configparser
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Annotated
+
+import typer
+from rich.console import Console
+from rich.table import Table
+
+app = typer.Typer()
+console = Console()
+
+# What a single invocation does with the config: the reads of the version check and `dp auth show-access-token`,
+# followed by a token refresh. Every process refreshes the tokens of its own section, so lost updates can be counted.
+INVOCATION = """
+import sys
+import typer
+typer.get_app_dir = lambda app_name, **kwargs: sys.argv[1]
+from dp import config
+process, refreshes = sys.argv[2], int(sys.argv[3])
+for refresh in range(refreshes):
+    config.get("general", "last_checked_version", namespace=None)
+    config.get(f"process-{process}", "access_token", namespace="dapla-cli-prod")
+    config.update(
+        f"process-{process}",
+        {"access_token": f"access-{refresh}", "refresh_token": f"refresh-{refresh}"},
+        namespace="dapla-cli-prod",
+    )
+"""
+
+
+@app.command()
+def main(
+    processes: Annotated[
+        int, typer.Option(help="The number of concurrent dp processes")
+    ] = 200,
+    refreshes: Annotated[
+        int, typer.Option(help="The number of token refreshes per process")
+    ] = 5,
+) -> None:
+    """Benchmark concurrent dp processes updating the same config file."""
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+    with tempfile.TemporaryDirectory() as app_dir:
+        start = time.perf_counter()
+        running = [
+            subprocess.Popen(
+                [sys.executable, "-c", INVOCATION, app_dir, str(i), str(refreshes)],
+                env=env,
+                stderr=subprocess.DEVNULL,
+            )
+            for i in range(processes)
+        ]
+        failed = sum(process.wait() != 0 for process in running)
+        wall_time = time.perf_counter() - start
+
+        config = configparser.ConfigParser()
+        try:
+            config.read(Path(app_dir) / "config-dapla-cli-prod.ini")
+            lost = str(
+                sum(
+                    config.get(f"process-{i}", "access_token", fallback=None)
+                    != f"access-{refreshes - 1}"
+                    for i in range(processes)
+                )
+            )
+        except configparser.Error:
+            lost = "all (corrupt config file)"
+
+    table = Table("Processes", "Refreshes", "Wall time (s)", "Failed", "Lost updates")
+    table.add_row(
+        str(processes),
+        str(processes * refreshes),
+        f"{wall_time:.2f}",
+        str(failed),
+        lost,
+    )
+    console.print(table)
+
+
+if __name__ == "__main__":
+    app()
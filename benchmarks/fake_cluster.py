@@ -0,0 +1,309 @@
+"""An in-process stand-in for helm and kubectl, serving a generated fleet of Dapla Lab services."""
+
+import base64
+import gzip
+import json
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any
+from unittest import mock
+
+from dp import utils
+from dp.utils import RunResult
+from dp.workloads import RELEASE_NAME_ANNOTATION, SUSPENDED_REPLICAS_ANNOTATION
+
+SERVICE_KINDS = ["jupyter", "jupyter-pyspark", "vscode-python", "rstudio", "datadoc"]
+TRANSIENT_ERROR = (
+    "Error: UPGRADE FAILED: another operation (install/upgrade/rollback) is in progress"
+)
+
+# The real process runner, before it is replaced by FakeCluster.installed()
+_spawn = utils._run
+
+
+@dataclass
+class FakeRelease:
+    """A helm release in the fake cluster."""
+
+    name: str
+    namespace: str
+    revision: int
+    created: datetime
+    updated: datetime
+    status: str = "deployed"
+    suspended: bool = False
+    chart: str = "jupyter"
+    chart_version: str = "4.2.1"
+    history: list[datetime] = field(default_factory=list)
+    scaled_down: bool = False
+
+    def listed(self) -> dict[str, Any]:
+        """Return the release as listed by `helm list --output json`."""
+        return {
+            "name": self.name,
+            "namespace": self.namespace,
+            "revision": str(self.revision),
+            "updated": _timestamp(self.updated),
+            "status": self.status,
+            "chart": f"{self.chart}-{self.chart_version}",
+            "app_version": "1.0.0",
+        }
+
+    def secrets(self) -> list[dict[str, Any]]:
+        """Return the Helm v3 release secrets of the first and the current revision."""
+        revisions = {1: self.created, self.revision: self.updated}
+        return [
+            _release_secret(self, revision, deployed)
+            for revision, deployed in revisions.items()
+        ]
+
+
+class FakeCluster:
+    """A generated fleet of Dapla Lab services, served through a fake process runner behind `utils.run`.
+
+    Every command the CLI runs, whichever module runs it, is answered in-process with realistic JSON. A command the
+    fake does not know fails the benchmark, rather than reaching a real cluster. Every call can be delayed by a configurable latency, and
+    mutations fail at a configurable rate with a transient helm error. In exec mode, every answer is additionally
+    routed through a real process spawned by the original `utils.run`, so that the cost of spawning is measured too.
+    """
+
+    def __init__(
+        self,
+        namespaces: int = 1000,
+        releases: int = 5000,
+        latency: float = 0.0,
+        mutation_latency: float = 0.0,
+        failure_rate: float = 0.0,
+        exec_mode: bool = False,
+        seed: int = 42,
+    ) -> None:
+        """Generate a fleet of releases spread over user namespaces."""
+        self.latency = latency
+        self.mutation_latency = mutation_latency
+        self.failure_rate = failure_rate
+        self.exec_mode = exec_mode
+        self.calls: Counter[str] = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._tmp_dir = Path(tempfile.mkdtemp(prefix="dp-bench-"))
+
+        now = datetime.now(timezone.utc)
+        self.releases: dict[tuple[str, str], FakeRelease] = {}
+        for i in range(releases):
+            namespace = f"user-ssb-{self._random.randrange(namespaces):04d}"
+            kind = self._random.choice(SERVICE_KINDS)
+            created = now - timedelta(hours=self._random.uniform(0, 24 * 10))
+            release = FakeRelease(
+                name=f"{kind}-{i:05d}",
+                namespace=namespace,
+                revision=self._random.randint(1, 5),
+                created=created,
+                updated=created + (now - created) * self._random.random(),
+                status="failed" if self._random.random() < 0.02 else "deployed",
+                suspended=self._random.random() < 0.3,
+                chart=kind,
+            )
+            self.releases[(namespace, release.name)] = release
+
+    @property
+    def total_calls(self) -> int:
+        """The number of commands run against the cluster."""
+        return sum(self.calls.values())
+
+    @contextmanager
+    def installed(self, app_dir: Path) -> Iterator["FakeCluster"]:
+        """Serve all commands run by the CLI from this cluster, and keep the CLI's state in a separate app dir."""
+        self.unknown_commands: list[list[str]] = []
+        with (
+            mock.patch("dp.utils._run", self.run),
+            mock.patch("typer.get_app_dir", lambda *args, **kwargs: str(app_dir)),
+            mock.patch.dict("os.environ", {"KUBECONFIG": str(app_dir / "kubeconfig")}),
+        ):
+            yield self
+        if self.unknown_commands:
+            raise UnknownCommand(f"Unknown commands were run: {self.unknown_commands}")
+
+    def run(self, command: list[str], timeout: float | None = None) -> RunResult:
+        """Run a helm or kubectl command against the fake cluster, in place of spawning a process.
+
+        Raises:
+            UnknownCommand: If the fake does not know the command.
+        """
+        args = list(command)
+        with self._lock:
+            self.calls[" ".join(args[:2])] += 1
+
+        mutation = args[:2] in (["helm", "upgrade"], ["helm", "delete"])
+        time.sleep(self.mutation_latency if mutation else self.latency)
+        result = self._answer(args)
+
+        if self.exec_mode:
+            result = self._spawned(result)
+        return result
+
+    def _answer(self, args: list[str]) -> RunResult:
+        namespace = _option(args, "--namespace")
+        match args[:2]:
+            case ["helm", "list"]:
+                releases = [
+                    r.listed()
+                    for r in self._releases()
+                    if "--all-namespaces" in args or r.namespace == namespace
+                ]
+                return _ok(json.dumps(releases))
+            case ["helm", "history"]:
+                release = self.releases[(str(namespace), args[2])]
+                history = [
+                    {"revision": 1, "updated": _timestamp(release.created)},
+                    {
+                        "revision": release.revision,
+                        "updated": _timestamp(release.updated),
+                    },
+                ]
+                return _ok(json.dumps(history))
+            case ["helm", "get"]:
+                release = self.releases[(str(namespace), args[3])]
+                return _ok(json.dumps({"global": {"suspend": release.suspended}}))
+            case ["helm", "upgrade"]:
+                return self._upgrade(str(namespace), args[2], args)
+            case ["helm", "delete"]:
+                return self._delete(str(namespace), args[2])
+            case ["helm", "repo"]:
+                return _ok("")
+            case ["kubectl", "config"]:
+                return _ok("gke_dapla-lab-dev")
+            case ["kubectl", "get"] if args[2] == "deployments,statefulsets":
+                workloads = [
+                    _workload(r)
+                    for r in self._releases()
+                    if "--all-namespaces" in args or r.namespace == namespace
+                ]
+                return _ok(json.dumps({"items": workloads}))
+            case ["kubectl", "patch"]:
+                return self._scale(str(namespace), args[2].split("/")[1], args)
+            case ["kubectl", "get"] if args[2] == "secrets":
+                secrets = [
+                    secret
+                    for r in self._releases()
+                    if "--all-namespaces" in args or r.namespace == namespace
+                    for secret in r.secrets()
+                ]
+                return _ok(json.dumps({"items": secrets}))
+
+        with self._lock:
+            self.unknown_commands.append(args)
+        raise UnknownCommand(f"The fake cluster does not know the command {args}")
+
+    def _upgrade(self, namespace: str, name: str, args: list[str]) -> RunResult:
+        with self._lock:
+            if self._random.random() < self.failure_rate:
+                return RunResult(stdout="", stderr=TRANSIENT_ERROR, returncode=1)
+            release = self.releases[(namespace, name)]
+            release.revision += 1
+            release.updated = datetime.now(timezone.utc)
+            release.suspended = "global.suspend=True" in args
+        return _ok(f'Release "{name}" has been upgraded.')
+
+    def _scale(self, namespace: str, name: str, args: list[str]) -> RunResult:
+        replicas = json.loads(args[-1]).get("spec", {}).get("replicas")
+        with self._lock:
+            release = self.releases[(namespace, name)]
+            if replicas is not None:
+                release.scaled_down = replicas == 0
+        return _ok(f"deployment.apps/{name} patched")
+
+    def _delete(self, namespace: str, name: str) -> RunResult:
+        with self._lock:
+            if self._random.random() < self.failure_rate:
+                return RunResult(stdout="", stderr=TRANSIENT_ERROR, returncode=1)
+            self.releases.pop((namespace, name), None)
+        return _ok(f'release "{name}" uninstalled')
+
+    def _releases(self) -> list[FakeRelease]:
+        with self._lock:
+            return list(self.releases.values())
+
+    def _spawned(self, result: RunResult) -> RunResult:
+        """Return the result of a command, as the output of a real process."""
+        with tempfile.NamedTemporaryFile(
+            "w", dir=self._tmp_dir, delete=False, suffix=".out"
+        ) as f:
+            f.write(result.stdout)
+        try:
+            spawned = _spawn(["cat", f.name], None)
+        finally:
+            Path(f.name).unlink()
+        return RunResult(
+            stdout=spawned.stdout, stderr=result.stderr, returncode=result.returncode
+        )
+
+
+class UnknownCommand(Exception):
+    """Raised when the CLI runs a command that the fake cluster does not know."""
+
+
+def _option(args: list[str], name: str) -> str | None:
+    return args[args.index(name) + 1] if name in args else None
+
+
+def _ok(stdout: str) -> RunResult:
+    return RunResult(stdout=stdout, stderr="", returncode=0)
+
+
+def _timestamp(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def _release_secret(
+    release: FakeRelease, revision: int, deployed: datetime
+) -> dict[str, Any]:
+    payload = {
+        "name": release.name,
+        "namespace": release.namespace,
+        "version": revision,
+        "info": {
+            "first_deployed": _timestamp(release.created),
+            "last_deployed": _timestamp(deployed),
+            "status": release.status if revision == release.revision else "superseded",
+        },
+        "chart": {
+            "metadata": {
+                "name": release.chart,
+                "version": release.chart_version,
+                "appVersion": "1.0.0",
+            }
+        },
+        "config": {"global": {"suspend": release.suspended}},
+    }
+    encoded = base64.b64encode(gzip.compress(json.dumps(payload).encode()))
+    return {
+        "metadata": {
+            "name": f"sh.helm.release.v1.{release.name}.v{revision}",
+            "namespace": release.namespace,
+            "labels": {"owner": "helm", "name": release.name},
+        },
+        "data": {"release": base64.b64encode(encoded).decode()},
+    }
+
+
+def _workload(release: FakeRelease) -> dict[str, Any]:
+    annotations = {RELEASE_NAME_ANNOTATION: release.name}
+    if release.scaled_down:
+        annotations[SUSPENDED_REPLICAS_ANNOTATION] = "1"
+    return {
+        "kind": "Deployment",
+        "metadata": {
+            "name": release.name,
+            "namespace": release.namespace,
+            "annotations": annotations,
+        },
+        "spec": {"replicas": 0 if release.scaled_down else 1},
+    }
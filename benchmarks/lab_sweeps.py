@@ -0,0 +1,198 @@
+"""Benchmark `dp lab` sweeps against a fake fleet of Dapla Lab services.
+
+Run with `python -m benchmarks.lab_sweeps --help` from the repository root. Results are written to
+`benchmarks/results/<version>.json`, and can be compared with the results of another version with `--compare`.
+"""
+
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from contextlib import redirect_stderr, redirect_stdout
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Annotated, Any
+
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from dp import lab
+from dp.lab import Env, Inventory
+from dp.utils import get_current_version
+
+from .fake_cluster import FakeCluster
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+app = typer.Typer()
+console = Console()
+
+Sweep = Callable[[int, Inventory], None]
+SWEEPS: dict[str, Sweep] = {
+    "list": lambda parallel, inventory: lab.plan_prune(
+        env=Env.dev,
+        namespace="all",
+        plan_file=Path(os.devnull),
+        parallel=parallel,
+        inventory_backend=inventory,
+        no_cache=True,
+    ),
+    "suspend": lambda parallel, inventory: lab.suspend_services(
+        env=Env.dev,
+        namespace="all",
+        parallel=parallel,
+        inventory_backend=inventory,
+        no_cache=True,
+    ),
+    "prune": lambda parallel, inventory: lab.prune_services(
+        env=Env.dev,
+        namespace="all",
+        parallel=parallel,
+        inventory_backend=inventory,
+        no_cache=True,
+    ),
+    "kill": lambda parallel, inventory: lab.kill_services(
+        env=Env.dev, namespace="all", parallel=parallel, inventory_backend=inventory
+    ),
+}
+
+
+def run_sweep(
+    name: str, cluster: FakeCluster, parallel: int, inventory: Inventory
+) -> dict[str, Any]:
+    """Run a sweep against a fake cluster, and measure wall time, subprocess count and peak memory."""
+    with (
+        tempfile.TemporaryDirectory() as app_dir,
+        cluster.installed(Path(app_dir)),
+        open(os.devnull, "w") as devnull,
+        redirect_stdout(devnull),
+        redirect_stderr(devnull),
+    ):
+        tracemalloc.start()
+        start = time.perf_counter()
+        SWEEPS[name](parallel, inventory)
+        wall_time = time.perf_counter() - start
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        "sweep": name,
+        "wall_time": round(wall_time, 3),
+        "subprocesses": cluster.total_calls,
+        "peak_memory": peak_memory,
+        "calls": dict(cluster.calls),
+    }
+
+
+@app.command()
+def main(
+    sweeps: Annotated[
+        list[str] | None,
+        typer.Option("--sweep", help="The sweeps to run: list, suspend, prune or kill"),
+    ] = None,
+    namespaces: Annotated[
+        int, typer.Option(help="The number of user namespaces")
+    ] = 1000,
+    releases: Annotated[int, typer.Option(help="The number of helm releases")] = 5000,
+    latency: Annotated[
+        float, typer.Option(help="Seconds every read command takes")
+    ] = 0.0,
+    mutation_latency: Annotated[
+        float, typer.Option(help="Seconds every helm upgrade/delete takes")
+    ] = 0.0,
+    failure_rate: Annotated[
+        float, typer.Option(help="The fraction of mutations that fail")
+    ] = 0.0,
+    parallel: Annotated[
+        int, typer.Option(help="The --parallel setting of the sweeps")
+    ] = 1,
+    inventory: Annotated[
+        Inventory, typer.Option(help="The --inventory setting of the sweeps")
+    ] = Inventory.helm,
+    exec_mode: Annotated[
+        bool, typer.Option("--exec", help="Spawn a real process for every command")
+    ] = False,
+    save: Annotated[
+        bool, typer.Option(help="Store the results for later comparison")
+    ] = True,
+    compare: Annotated[
+        Path | None, typer.Option(help="Stored results to compare with")
+    ] = None,
+) -> None:
+    """Benchmark dp lab sweeps against a fake fleet of services."""
+    parameters = {
+        "namespaces": namespaces,
+        "releases": releases,
+        "latency": latency,
+        "mutation_latency": mutation_latency,
+        "failure_rate": failure_rate,
+        "parallel": parallel,
+        "inventory": inventory.value,
+        "exec": exec_mode,
+    }
+    results = []
+    for name in sweeps or list(SWEEPS):
+        cluster = FakeCluster(
+            namespaces=namespaces,
+            releases=releases,
+            latency=latency,
+            mutation_latency=mutation_latency,
+            failure_rate=failure_rate,
+            exec_mode=exec_mode,
+        )
+        results.append(run_sweep(name, cluster, parallel, inventory))
+
+    baseline = json.loads(compare.read_text()) if compare else None
+    console.print(_table(results, baseline))
+
+    if save:
+        version = str(get_current_version() or "dev")
+        RESULTS_DIR.mkdir(exist_ok=True)
+        results_file = RESULTS_DIR / f"{version}.json"
+        results_file.write_text(
+            json.dumps(
+                {
+                    "version": version,
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "timestamp": datetime.now(timezone.utc).isoformat(),
+                    "parameters": parameters,
+                    "results": results,
+                },
+                indent=2,
+            )
+        )
+        console.print(f"Results written to {results_file}")
+
+
+def _table(results: list[dict[str, Any]], baseline: dict[str, Any] | None) -> Table:
+    previous = {r["sweep"]: r for r in baseline["results"]} if baseline else {}
+    table = Table("Sweep", "Wall time (s)", "Subprocesses", "Peak memory (MiB)")
+    for result in results:
+        before = previous.get(result["sweep"])
+        table.add_row(
+            result["sweep"],
+            _cell(result["wall_time"], before and before["wall_time"]),
+            _cell(result["subprocesses"], before and before["subprocesses"]),
+            _cell(
+                round(result["peak_memory"] / 2**20, 1),
+                before and round(before["peak_memory"] / 2**20, 1),
+            ),
+        )
+    return table
+
+
+def _cell(value: float, before: float | None) -> str:
+    if not before:
+        return str(value)
+    change = (value - before) / before * 100
+    color = "red" if change > 5 else "green" if change < -5 else "grey50"
+    return f"{value} [{color}]({change:+.0f}%)[/{color}]"
+
+
+if __name__ == "__main__":
+    app()
@@ -243,3 +243,10 @@ def docs(session: Session) -> None:
         shutil.rmtree(build_dir)
 
     session.run("sphinx-autobuild", *args)
+
+
+@session(python=python_versions[-1])
+def benchmarks(session: Session) -> None:
+    """Benchmark dp lab sweeps against a fake fleet of services."""
+    session.install(".")
+    session.run("python", "-m", "benchmarks.lab_sweeps", *session.posargs)
@@ -0,0 +1,208 @@
+import json
+import logging
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from pathlib import Path
+
+import typer
+
+from . import config
+from .auth import (
+    TOKEN_REFRESH_MARGIN,
+    Env,
+    TokenRefreshFailed,
+    stored_access_token,
+    token_claims,
+)
+
+# Environment variable that overrides the path of the agent socket
+SOCKET_ENV_VARIABLE = "DP_AGENT_SOCKET"
+# Seconds a client waits for the agent, before falling back to reading the token from the config itself
+CLIENT_TIMEOUT = 1.0
+# Seconds between checks for tokens that are about to expire
+REFRESH_INTERVAL = 60
+
+logger = logging.getLogger(__name__)
+
+
+def socket_path() -> Path:
+    """Return the path of the agent socket, `agent.sock` in the dapla-cli app dir unless overridden."""
+    if os.getenv(SOCKET_ENV_VARIABLE):
+        return Path(os.environ[SOCKET_ENV_VARIABLE])
+    return Path(typer.get_app_dir("dapla-cli")) / "agent.sock"
+
+
+def request_token(env: Env, client: str) -> str | None:
+    """Request a valid access token from a running agent.
+
+    Returns:
+        The access token, or None if no agent is running or it could not serve a token, in which case the caller
+        should read the token from the config itself.
+    """
+    path = socket_path()
+    if sys.platform == "win32" or not path.exists():
+        return None
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            connection.settimeout(CLIENT_TIMEOUT)
+            connection.connect(str(path))
+            connection.sendall(_encode({"env": env.value, "client": client}))
+            with connection.makefile("rb") as f:
+                response = json.loads(f.readline())
+    except (OSError, ValueError):
+        return None
+
+    token = response.get("token")
+    return token if isinstance(token, str) else None
+
+
+class TokenAgent:
+    """Keeps access tokens in memory, and refreshes them before they expire.
+
+    Tokens are read from the config the first time they are requested, so the user must have logged in with
+    `dp auth login` first. Refreshed tokens are saved to the config as usual, so dp invocations that do not use the
+    agent see them as well. Conversely, a token that was replaced in the config, e.g. by logging in again or out, is
+    not served anymore.
+    """
+
+    def __init__(self) -> None:
+        """Create an agent that holds no tokens yet."""
+        self.tokens: dict[tuple[Env, str], tuple[str, float]] = {}
+        # Held while tokens are loaded or refreshed, so that concurrent requests do not refresh the same token twice
+        self._lock = threading.Lock()
+
+    def token(self, env: Env, client: str) -> str:
+        """Return an access token that is valid for at least `TOKEN_REFRESH_MARGIN` seconds.
+
+        Raises:
+            Exit: If the user is not logged in, or the token could not be refreshed.
+        """
+        with self._lock:
+            cached = self.tokens.get((env, client))
+            stored = config.get(
+                "auth", "access_token", namespace=f"{client}-{env.value}"
+            )
+            if (
+                cached
+                and cached[0] == stored
+                and cached[1] - time.time() > TOKEN_REFRESH_MARGIN
+            ):
+                return cached[0]
+            return self._load(env, client, TOKEN_REFRESH_MARGIN)
+
+    def refresh(self) -> None:
+        """Refresh the tokens that would otherwise expire before the next refresh, off the path of requests.
+
+        A token that could not be refreshed, e.g. because Keycloak could not be reached or failed with a server error,
+        is kept, and refreshing it is retried at the next refresh. A token that can not be refreshed anymore, because
+        the user logged out or Keycloak rejected the refresh token, e.g. as it expired, is dropped.
+        """
+        margin = TOKEN_REFRESH_MARGIN + REFRESH_INTERVAL
+        with self._lock:
+            for (env, client), (_, expiry) in list(self.tokens.items()):
+                if expiry - time.time() > margin:
+                    continue
+                try:
+                    self._load(env, client, margin)
+                except TokenRefreshFailed as e:
+                    if e.rejected:
+                        del self.tokens[(env, client)]
+                    else:
+                        logger.warning(
+                            f"Could not refresh the {client} token for {env.value}: {e.message}"
+                        )
+                except typer.Exit:
+                    del self.tokens[(env, client)]
+                # requests.RequestException is an OSError, and is not imported to keep the agent client fast to load
+                except (OSError, ValueError, KeyError) as e:
+                    logger.warning(
+                        f"Could not refresh the {client} token for {env.value}: {e!r}"
+                    )
+
+    def _load(self, env: Env, client: str, refresh_margin: float) -> str:
+        token = stored_access_token(env, client, refresh_margin=refresh_margin)
+        self.tokens[(env, client)] = (token, token_claims(token)["exp"])
+        return token
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """Answers token requests, one JSON object per line, until the client disconnects."""
+
+    server: "AgentServer"
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                token = self.server.agent.token(Env(request["env"]), request["client"])
+                response = {"token": token}
+            except (OSError, ValueError, KeyError, typer.Exit) as e:
+                response = {"error": f"Could not serve a token: {e!r}"}
+            self.wfile.write(_encode(response))
+
+
+if sys.platform != "win32":  # Unix sockets are not supported by Python on Windows
+
+    class AgentServer(socketserver.ThreadingUnixStreamServer):
+        """Serves the tokens of an agent on a Unix socket."""
+
+        daemon_threads = True
+
+        def __init__(self, path: Path, agent: TokenAgent) -> None:
+            """Listen on a socket that only the current user can connect to."""
+            self.path = path
+            self.agent = agent
+            path.parent.mkdir(parents=True, exist_ok=True)
+            umask = os.umask(0o177)
+            try:
+                super().__init__(str(path), _Handler)
+            finally:
+                os.umask(umask)
+
+    def listen(path: Path) -> AgentServer:
+        """Start listening for token requests on a socket, replacing the socket of an agent that is no longer running.
+
+        Raises:
+            ValueError: If another agent is already listening on the socket.
+        """
+        if path.exists():
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+                    connection.connect(str(path))
+            except OSError:
+                path.unlink()  # Left behind by an agent that did not shut down cleanly
+            else:
+                raise ValueError(f"An agent is already running on {path}")
+
+        return AgentServer(path, TokenAgent())
+
+    def serve(server: AgentServer) -> None:
+        """Serve access tokens until interrupted, refreshing them in the background, and remove the socket afterwards."""
+        stopped = threading.Event()
+        threading.Thread(
+            target=refresh_periodically, args=(server.agent, stopped), daemon=True
+        ).start()
+        try:
+            with server:
+                server.serve_forever()
+        finally:
+            stopped.set()
+            server.path.unlink(missing_ok=True)
+
+
+def refresh_periodically(token_agent: TokenAgent, stopped: threading.Event) -> None:
+    """Refresh the tokens of an agent every `REFRESH_INTERVAL` seconds until stopped, whatever a refresh raises."""
+    while not stopped.wait(REFRESH_INTERVAL):
+        try:
+            token_agent.refresh()
+        except Exception:
+            logger.exception("Could not refresh tokens")
+
+
+def _encode(message: dict[str, str]) -> bytes:
+    return json.dumps(message).encode() + b"\n"
@@ -1,14 +1,31 @@
 import os
+import subprocess
+import sys
+import threading
 from collections.abc import Callable
 from datetime import datetime, timedelta
 from functools import wraps
 from typing import Any
 
 import typer
-from rich import print as rich_print
 
 from . import config
-from .utils import get_current_version, get_latest_pypi_version, print_err, red, run
+from .utils import (
+    err,
+    get_installed_version,
+    get_latest_pypi_version,
+    print_err,
+    run,
+)
+
+# Serializes the helm repo freshness check when services are discovered concurrently
+_helm_repos_lock = threading.Lock()
+# The command that refreshes the cached latest version in the background
+REFRESH_LATEST_VERSION_COMMAND = [
+    sys.executable,
+    "-c",
+    "from dp.annotations import refresh_latest_version; refresh_latest_version()",
+]
 
 
 def dryrunnable(f: Callable[..., Any]) -> Callable[..., Any]:
@@ -23,7 +40,8 @@ def dryrunnable(f: Callable[..., Any]) -> Callable[..., Any]:
         dryrun = kwargs.get("dryrun", False)
 
         if dryrun:
-            rich_print(red("Dry run enabled. No state will be mutated."))
+            # Print to stderr so that machine-readable output on stdout stays intact
+            print_err("Dry run enabled. No state will be mutated.")
 
         return f(*args, **kwargs)
 
@@ -37,15 +55,17 @@ def ensure_helm_repos_updated(f: Callable[..., Any]) -> Callable[..., Any]:
     def wrapper(*args: Any, **kwargs: Any) -> Any:
         config_section = "helm"
         config_key = "repos_last_updated"
-        last_updated = _get_config_timestamp(config_section, config_key)
 
-        if datetime.now() - last_updated > timedelta(hours=2):
-            res = run("helm repo update")
-            if res.returncode != 0:
-                print_err(f"Failed to update Helm repos: {res.stderr}")
-                raise typer.Exit(code=1)
+        with _helm_repos_lock:
+            last_updated = _get_config_timestamp(config_section, config_key)
 
-            _update_config_timestamp(config_section, config_key)
+            if datetime.now() - last_updated > timedelta(hours=2):
+                res = run(["helm", "repo", "update"])
+                if res.returncode != 0:
+                    print_err(f"Failed to update Helm repos: {res.stderr}")
+                    raise typer.Exit(code=1)
+
+                _update_config_timestamp(config_section, config_key)
         return f(*args, **kwargs)
 
     return wrapper
@@ -54,8 +74,9 @@ def ensure_helm_repos_updated(f: Callable[..., Any]) -> Callable[..., Any]:
 def check_version(f: Callable[..., Any]) -> Callable[..., Any]:
     """Annotation to check for newer versions from PyPI.
 
-    This annotation checks for newer versions from PyPI and prints a message if a newer version is available.
-    The check is performed once every 24 hours. You can disable this check by setting the environment
+    Once every 24 hours, this annotation prints a message to stderr if a newer version is available, according to the
+    latest version cached in the config. The cache is refreshed at the same time by a detached background process, so
+    commands never wait on PyPI, and work the same offline. You can disable this check by setting the environment
     variable DAPLA_CLI_NO_VERSION_CHECK to any value.
     """
 
@@ -69,21 +90,77 @@ def check_version(f: Callable[..., Any]) -> Callable[..., Any]:
         last_updated = _get_config_timestamp(config_section, config_key)
 
         if datetime.now() - last_updated > timedelta(hours=24):
-            current_version = get_current_version()
-            latest_pypi_version = get_latest_pypi_version()
-
-            if current_version and latest_pypi_version:
-                if current_version >= latest_pypi_version:
-                    rich_print(
-                        f"A new version is available: {latest_pypi_version} (Installed: {current_version})"
-                    )
-
+            # Updated up front, so that concurrent invocations do not all start a refresh
             _update_config_timestamp(config_section, config_key)
+            _refresh_latest_version_in_background()
+            _notify_of_newer_version()
+
         return f(*args, **kwargs)
 
     return wrapper
 
 
+def refresh_latest_version() -> None:
+    """Fetch the latest version from PyPI, and cache it in the config for `check_version` to read."""
+    latest_version = get_latest_pypi_version()
+    if latest_version:
+        config.put("general", "latest_version", str(latest_version), namespace=None)
+
+
+def _refresh_latest_version_in_background() -> None:
+    """Start a process that refreshes the cached latest version, without waiting for it.
+
+    The process is detached from the terminal and from the process group of dp, so that it neither prints anything
+    nor is killed by e.g. a Ctrl+C meant for dp. Failing to start it is not worth bothering the user about.
+    """
+    try:
+        if sys.platform == "win32":
+            subprocess.Popen(
+                REFRESH_LATEST_VERSION_COMMAND,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                creationflags=subprocess.DETACHED_PROCESS
+                | subprocess.CREATE_NEW_PROCESS_GROUP,
+            )
+        else:
+            subprocess.Popen(
+                REFRESH_LATEST_VERSION_COMMAND,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True,
+            )
+    except OSError:
+        pass
+
+
+def _notify_of_newer_version() -> None:
+    """Print a message to stderr if the cached latest version is newer than the installed version.
+
+    Versions are only parsed if they differ, since importing packaging takes a noticeable part of the startup time.
+    """
+    installed_version = get_installed_version()
+    latest_version = config.get("general", "latest_version", namespace=None)
+    if (
+        not installed_version
+        or not latest_version
+        or installed_version == latest_version
+    ):
+        return
+
+    from packaging.version import InvalidVersion, Version
+
+    try:
+        newer = Version(installed_version) < Version(latest_version)
+    except InvalidVersion:
+        return
+    if newer:
+        err.print(
+            f"A new version is available: {latest_version} (Installed: {installed_version})"
+        )
+
+
 def _get_config_timestamp(
     section: str, key: str, default: str = "1970-01-01T00:00:00"
 ) -> datetime:
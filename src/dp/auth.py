@@ -1,20 +1,19 @@
 import base64
+import contextlib
 import hashlib
 import json
 import logging
 import os
+import sys
 import time
 from enum import Enum
-from typing import Annotated
+from pathlib import Path
+from typing import Annotated, Any
 
-import jwt
-import pyperclip
-import requests
 import typer
 from rich import print as rich_print
 from rich import print_json
 from rich.console import Console
-from rich.progress import Progress, SpinnerColumn, TextColumn
 
 from . import config
 from .utils import green, red
@@ -25,7 +24,34 @@ console = Console()
 logger = logging.getLogger(__name__)
 
 DAPLA_CLI_CLIENT_ID = "dapla-cli"
-POLL_INTERVAL = 5  # Time to wait between polling attempts (in seconds)
+POLL_INTERVAL = 5  # Time to wait between polling attempts, unless the server says otherwise (in seconds)
+SLOW_DOWN_INCREMENT = 5  # Time added to the polling interval when the server asks to slow down (in seconds)
+DEVICE_CODE_LIFETIME = (
+    600  # Time a device code is valid, unless the server says otherwise (in seconds)
+)
+BROWSER_LOGIN_TIMEOUT = 300  # Time to wait for the browser to be redirected back after logging in (in seconds)
+TOKEN_REFRESH_MARGIN = 300  # Refresh access tokens that expire within this many seconds
+REQUEST_TIMEOUT = 10  # Time to wait for Keycloak to respond (in seconds)
+# Environment variable with a number of seconds before TOKEN_REFRESH_MARGIN to start refreshing tokens proactively
+TOKEN_REFRESH_AHEAD_ENV_VARIABLE = "DAPLA_CLI_TOKEN_REFRESH_AHEAD"
+
+
+class TokenRefreshFailed(typer.Exit):
+    """An access token could not be refreshed.
+
+    The message is not printed when raised, so callers for which refreshing is optional can carry on quietly.
+    """
+
+    def __init__(self, message: str, rejected: bool) -> None:
+        """Create the error, exiting with code 1 unless caught.
+
+        Args:
+            message: Why the token could not be refreshed.
+            rejected: Whether Keycloak rejected the refresh token, so that retrying is pointless.
+        """
+        super().__init__(code=1)
+        self.message = message
+        self.rejected = rejected
 
 
 class Env(str, Enum):
@@ -79,11 +105,30 @@ def _get_keycloak_setting(env: Env, key: str) -> str:
 
 
 @app.command()
-def login(env: env_option = Env.prod, client: client_arg = DAPLA_CLI_CLIENT_ID) -> None:
+def login(
+    env: env_option = Env.prod,
+    client: client_arg = DAPLA_CLI_CLIENT_ID,
+    browser: Annotated[
+        bool,
+        typer.Option(
+            "--browser",
+            help="Log in with a browser on this machine, which completes as soon as it is redirected back, instead of entering a code. The client must allow redirects to http://127.0.0.1.",
+        ),
+    ] = False,
+) -> None:
     """Log in to Keycloak."""
+    if browser:
+        _login_with_browser(env, client)
+        return
+
     device_info = _init_device_flow(env, client)
     _poll_for_token(
-        device_info["device_code"], device_info["code_verifier"], env, client
+        device_info["device_code"],
+        device_info["code_verifier"],
+        env,
+        client,
+        interval=device_info["interval"],
+        expires_in=device_info["expires_in"],
     )
 
 
@@ -92,6 +137,8 @@ def logout(
     env: env_option = Env.prod, client: client_arg = DAPLA_CLI_CLIENT_ID
 ) -> None:
     """Log out of Keycloak."""
+    from . import http
+
     refresh_token = config.get(
         "auth", "refresh_token", namespace=f"{client}-{env.value}"
     )
@@ -100,9 +147,8 @@ def logout(
             "client_id": client,
             "refresh_token": refresh_token,
         }
-        response = requests.post(
-            _get_keycloak_setting(env, "keycloak_url"), data=payload
-        )
+        logout_url = _get_keycloak_setting(env, "keycloak_url")
+        response = http.post(logout_url, data=payload, timeout=REQUEST_TIMEOUT)
         if response.status_code == 200:
             rich_print("Logged out successfully")
             config.remove("auth", namespace=f"{client}-{env.value}")
@@ -126,19 +172,61 @@ def show_access_token(
     access_token = local_access_token(env=env, client=client, ensure_valid=True)
 
     if decoded:
+        import jwt
+
         decoded_token = jwt.decode(access_token, options={"verify_signature": False})
         print_json(json.dumps(decoded_token))
     else:
         # Use std library python print since the print from Rich inserts undesirable newlines.
         print(access_token, end="")
         if to_clipboard:
+            import pyperclip
+
             pyperclip.copy(access_token)
 
 
+@app.command(name="agent")
+def run_agent(
+    socket_file: Annotated[
+        Path | None,
+        typer.Option(
+            "--socket",
+            dir_okay=False,
+            help="The socket to listen on. Other dp commands find it through the DP_AGENT_SOCKET environment variable.",
+        ),
+    ] = None,
+) -> None:
+    """Run an agent that keeps access tokens in memory and serves them to other dp commands, like ssh-agent.
+
+    While the agent runs, `dp auth show-access-token` and `dp team-api` get access tokens from it over a Unix socket,
+    instead of reading and decoding them from the config. The agent refreshes tokens before they expire. Stop it with
+    Ctrl+C.
+    """
+    if sys.platform == "win32":
+        rich_print(red("The agent is not supported on Windows"))
+        raise typer.Exit(code=1)
+
+    from . import agent
+
+    path = socket_file or agent.socket_path()
+    try:
+        server = agent.listen(path)
+    except ValueError as e:
+        rich_print(red(str(e)))
+        raise typer.Exit(code=1) from e
+
+    if socket_file:
+        err.print(f"export {agent.SOCKET_ENV_VARIABLE}={path}")
+    err.print(f"Serving access tokens on {path}")
+    with contextlib.suppress(KeyboardInterrupt):
+        agent.serve(server)
+
+
 def local_access_token(env: Env, client: str, ensure_valid: bool = True) -> str:
     """Return the access token stored in the local configuration.
 
-    If the token is not found, the user is prompted to log in.
+    If the token is not found, the user is prompted to log in. If a token agent is running (see `dp auth agent`), a
+    valid token is served by the agent instead.
 
     Args:
         env: The environment to get the access token for.
@@ -151,21 +239,91 @@ def local_access_token(env: Env, client: str, ensure_valid: bool = True) -> str:
     Raises:
         Exit: If no access token is found, prompts the user to log in and exits.
     """
+    if ensure_valid:
+        from .agent import request_token
+
+        access_token = request_token(env, client)
+        if access_token:
+            return access_token
+
+    return stored_access_token(env, client, ensure_valid)
+
+
+def stored_access_token(
+    env: Env,
+    client: str,
+    ensure_valid: bool = True,
+    refresh_margin: float = TOKEN_REFRESH_MARGIN,
+) -> str:
+    """Return the access token stored in the local configuration, without asking a token agent.
+
+    If DAPLA_CLI_TOKEN_REFRESH_AHEAD is set to a number of seconds, a token that expires within that many seconds
+    more than `refresh_margin` is refreshed proactively, unless another process is refreshing it already. Until
+    then, or if refreshing it fails, the token is returned as is, since it is still valid.
+
+    Args:
+        env: The environment to get the access token for.
+        client: The Keycloak client to get the access token for.
+        ensure_valid: If True, the token is refreshed if it expires within `refresh_margin` seconds.
+        refresh_margin: How many seconds the returned token must at least be valid for, if ensure_valid.
+
+    Returns:
+        str: A valid JWT access token.
+
+    Raises:
+        Exit: If no access token is found, prompts the user to log in and exits.
+        TokenRefreshFailed: If the token had to be refreshed, but could not be.
+    """
     access_token = config.get("auth", "access_token", namespace=f"{client}-{env.value}")
     if not access_token:
         rich_print(f"No access token found for {env.value}. Please log in.")
         raise typer.Exit(code=1)
 
     if ensure_valid:
-        decoded_token = jwt.decode(access_token, options={"verify_signature": False})
+        decoded_token = token_claims(access_token)
         current_time = time.time()
-        if (current_time + 300) >= decoded_token["exp"]:
-            access_token = _refresh_token(env, client)
+        refresh_ahead = float(os.getenv(TOKEN_REFRESH_AHEAD_ENV_VARIABLE) or 0)
+        if (current_time + refresh_margin) >= decoded_token["exp"]:
+            try:
+                access_token = _refresh_token(env, client, refresh_margin)
+            except TokenRefreshFailed as e:
+                rich_print(red(e.message))
+                raise
+        elif (current_time + refresh_margin + refresh_ahead) >= decoded_token["exp"]:
+            import requests
+
+            # Refreshing ahead is optional, so the token, which is still valid, is kept if it fails. Nothing is
+            # printed, as the token may be captured from stdout.
+            with contextlib.suppress(
+                config.ConfigLocked, TokenRefreshFailed, requests.RequestException
+            ):
+                access_token = _refresh_token(
+                    env, client, refresh_margin + refresh_ahead, wait=False
+                )
 
     return access_token or ""
 
 
-def _init_device_flow(env: Env, client: str) -> dict[str, str]:
+def token_claims(token: str) -> dict[str, Any]:
+    """Return the claims of a JWT, without verifying its signature.
+
+    Unlike `jwt.decode`, this does not need PyJWT and the cryptography package to be imported, which would make up
+    most of the time `dp auth show-access-token` takes.
+    """
+    try:
+        payload = token.split(".")[1]
+        claims: dict[str, Any] = json.loads(
+            base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4))
+        )
+    except (IndexError, ValueError) as e:
+        rich_print(red(f"Invalid access token: {e}. Please log in again."))
+        raise typer.Exit(code=1) from e
+    return claims
+
+
+def _init_device_flow(env: Env, client: str) -> dict[str, Any]:
+    from . import http
+
     # Generate PKCE values
     code_verifier = _generate_code_verifier()
     code_challenge = _generate_code_challenge(code_verifier)
@@ -177,7 +335,7 @@ def _init_device_flow(env: Env, client: str) -> dict[str, str]:
         "code_challenge": code_challenge,
     }
     device_auth_url = f"{_get_keycloak_setting(env, 'keycloak_url')}/realms/ssb/protocol/openid-connect/auth/device"
-    response = requests.post(device_auth_url, data=payload)
+    response = http.post(device_auth_url, data=payload, timeout=REQUEST_TIMEOUT)
 
     if response.status_code == 200:
         result = response.json()
@@ -191,6 +349,8 @@ def _init_device_flow(env: Env, client: str) -> dict[str, str]:
             "device_code": device_code,
             "user_code": user_code,
             "code_verifier": code_verifier,
+            "interval": float(result.get("interval", POLL_INTERVAL)),
+            "expires_in": float(result.get("expires_in", DEVICE_CODE_LIFETIME)),
         }
     else:
         rich_print(
@@ -199,8 +359,26 @@ def _init_device_flow(env: Env, client: str) -> dict[str, str]:
         raise typer.Exit(code=1)
 
 
-def _poll_for_token(device_code: str, code_verifier: str, env: Env, client: str) -> str:
-    """Polls the token endpoint until the user completes authentication, with a progress bar."""
+def _poll_for_token(
+    device_code: str,
+    code_verifier: str,
+    env: Env,
+    client: str,
+    interval: float = POLL_INTERVAL,
+    expires_in: float = DEVICE_CODE_LIFETIME,
+) -> str:
+    """Polls the token endpoint until the user completes authentication, with a progress bar.
+
+    Polling follows RFC 8628: requests are made `interval` seconds apart, the interval grows by
+    `SLOW_DOWN_INCREMENT` seconds whenever the server asks to slow down, and doubles when the server can not be reached.
+    Polling stops once the device code has expired.
+    """
+    import requests
+    from rich.progress import Progress, SpinnerColumn, TextColumn
+
+    from . import http
+
+    expiry = time.monotonic() + expires_in
     with Progress(
         SpinnerColumn(),
         TextColumn("[progress.description]{task.description}"),
@@ -209,6 +387,11 @@ def _poll_for_token(device_code: str, code_verifier: str, env: Env, client: str)
         task = progress.add_task("Waiting for user authentication...", start=False)
 
         while True:
+            if time.monotonic() + interval >= expiry:
+                rich_print(red("The login code expired. Please log in again."))
+                raise typer.Exit(code=1)
+            time.sleep(interval)
+
             payload = {
                 "client_id": client,
                 "grant_type": "urn:ietf:params:oauth:grant-type:device_code",
@@ -217,24 +400,17 @@ def _poll_for_token(device_code: str, code_verifier: str, env: Env, client: str)
             }
 
             token_url = f"{_get_keycloak_setting(env, 'keycloak_url')}/realms/ssb/protocol/openid-connect/token"
-            response = requests.post(token_url, data=payload)
+            try:
+                response = http.post(token_url, data=payload, timeout=REQUEST_TIMEOUT)
+            except (requests.ConnectionError, requests.Timeout):
+                interval *= 2
+                progress.update(
+                    task, description="Could not reach Keycloak, retrying..."
+                )
+                continue
 
             if response.status_code == 200:
-                result = response.json()
-                access_token: str = result["access_token"]
-                refresh_token: str = result["refresh_token"]
-                config.put(
-                    section="auth",
-                    key="access_token",
-                    value=access_token,
-                    namespace=f"{client}-{env.value}",
-                )
-                config.put(
-                    section="auth",
-                    key="refresh_token",
-                    value=refresh_token,
-                    namespace=f"{client}-{env.value}",
-                )
+                access_token = _save_tokens(env, client, response.json())
                 rich_print(green("OK"))
                 return access_token
 
@@ -244,13 +420,15 @@ def _poll_for_token(device_code: str, code_verifier: str, env: Env, client: str)
                     progress.update(
                         task, description="Waiting for user authentication..."
                     )
-                    time.sleep(POLL_INTERVAL)
                 elif error == "slow_down":
+                    interval += SLOW_DOWN_INCREMENT
                     progress.update(
                         task,
                         description="Slowing down polling as requested by server...",
                     )
-                    time.sleep(POLL_INTERVAL * 1.5)
+                elif error == "expired_token":
+                    rich_print(red("The login code expired. Please log in again."))
+                    raise typer.Exit(code=1)
                 else:
                     rich_print(red(f"Error: {error}"))
                     raise typer.Exit(code=1)
@@ -263,6 +441,68 @@ def _poll_for_token(device_code: str, code_verifier: str, env: Env, client: str)
                 raise typer.Exit(code=1)
 
 
+def _login_with_browser(env: Env, client: str) -> str:
+    """Log in with the authorization code flow with PKCE, receiving the redirect on a loopback address (RFC 8252).
+
+    The login completes as soon as the browser is redirected back, without any polling.
+    """
+    import secrets
+    import webbrowser
+    from urllib.parse import urlencode
+
+    from . import http, loopback
+
+    code_verifier = _generate_code_verifier()
+    state = secrets.token_urlsafe(16)
+    keycloak_url = _get_keycloak_setting(env, "keycloak_url")
+    with loopback.RedirectReceiver(state) as receiver:
+        params = {
+            "client_id": client,
+            "response_type": "code",
+            "scope": "openid",
+            "redirect_uri": receiver.redirect_uri,
+            "state": state,
+            "code_challenge_method": "S256",
+            "code_challenge": _generate_code_challenge(code_verifier),
+        }
+        auth_url = f"{keycloak_url}/realms/ssb/protocol/openid-connect/auth?{urlencode(params)}"
+        rich_print(f"Log in with your browser. If it does not open, visit {auth_url}")
+        webbrowser.open(auth_url)
+        try:
+            code = receiver.wait(BROWSER_LOGIN_TIMEOUT)
+        except ValueError as e:
+            rich_print(red(f"Error: {e}"))
+            raise typer.Exit(code=1) from e
+
+    payload = {
+        "client_id": client,
+        "grant_type": "authorization_code",
+        "code": code,
+        "redirect_uri": params["redirect_uri"],
+        "code_verifier": code_verifier,
+    }
+    token_url = f"{keycloak_url}/realms/ssb/protocol/openid-connect/token"
+    response = http.post(token_url, data=payload, timeout=REQUEST_TIMEOUT)
+    if response.status_code != 200:
+        rich_print(red(f"Error logging in: {response.status_code} - {response.text}"))
+        raise typer.Exit(code=1)
+
+    access_token = _save_tokens(env, client, response.json())
+    rich_print(green("OK"))
+    return access_token
+
+
+def _save_tokens(env: Env, client: str, result: dict[str, Any]) -> str:
+    """Save the tokens of a token endpoint response to the config, and return the access token."""
+    access_token: str = result["access_token"]
+    config.update(
+        "auth",
+        {"access_token": access_token, "refresh_token": result["refresh_token"]},
+        namespace=f"{client}-{env.value}",
+    )
+    return access_token
+
+
 def _generate_code_verifier() -> str:
     """Generates a secure random code verifier."""
     return base64.urlsafe_b64encode(os.urandom(32)).decode("utf-8").rstrip("=")
@@ -274,44 +514,61 @@ def _generate_code_challenge(verifier: str) -> str:
     return base64.urlsafe_b64encode(challenge).decode("utf-8").rstrip("=")
 
 
-def _refresh_token(env: Env, client: str) -> str:
-    """Refreshes the access token using the refresh token."""
-    refresh_token = config.get(
-        "auth", "refresh_token", namespace=f"{client}-{env.value}"
-    )
-    if not refresh_token:
-        rich_print("No refresh token found. Please log in.")
-        raise typer.Exit(code=1)
+def _refresh_token(
+    env: Env,
+    client: str,
+    refresh_margin: float = TOKEN_REFRESH_MARGIN,
+    wait: bool = True,
+) -> str:
+    """Refreshes the access token using the refresh token, unless another process has just refreshed it.
 
-    payload = {
-        "client_id": client,
-        "grant_type": "refresh_token",
-        "refresh_token": refresh_token,
-    }
-    response = requests.post(
-        f"{_get_keycloak_setting(env, 'keycloak_url')}/realms/ssb/protocol/openid-connect/token",
-        data=payload,
-    )
+    Refresh tokens are single use, so when several dp processes find the access token about to expire at once, only
+    one of them may refresh it. Refreshing therefore happens in a transaction on the config: the first process
+    refreshes the token, while the others wait for the transaction to complete, and then find the token refreshed.
 
-    if response.status_code == 200:
-        result = response.json()
-        new_access_token: str = result["access_token"]
-        new_refresh_token: str = result["refresh_token"]
-        config.put(
-            section="auth",
-            key="access_token",
-            value=new_access_token,
-            namespace=f"{client}-{env.value}",
-        )
-        config.put(
-            section="auth",
-            key="refresh_token",
-            value=new_refresh_token,
-            namespace=f"{client}-{env.value}",
-        )
-        return new_access_token
-    else:
-        rich_print(
-            red(f"Error refreshing token: {response.status_code} - {response.text}")
-        )
-        raise typer.Exit(code=1)
+    Args:
+        env: The environment to refresh the access token for.
+        client: The Keycloak client to refresh the access token for.
+        refresh_margin: The token is refreshed if it expires within this many seconds, and otherwise returned as is.
+        wait: If False, raise `ConfigLocked` instead of waiting for another process that is refreshing the token.
+
+    Returns:
+        str: The refreshed access token.
+
+    Raises:
+        TokenRefreshFailed: If there is no refresh token, or the token could not be refreshed.
+    """
+    from . import http
+
+    with config.transaction(namespace=f"{client}-{env.value}", wait=wait) as tokens:
+        access_token = tokens.get("auth", "access_token", fallback=None)
+        if access_token and (
+            token_claims(access_token)["exp"] > time.time() + refresh_margin
+        ):
+            return access_token  # Refreshed by another process
+
+        refresh_token = tokens.get("auth", "refresh_token", fallback=None)
+        if not refresh_token:
+            raise TokenRefreshFailed(
+                "No refresh token found. Please log in.", rejected=True
+            )
+
+        payload = {
+            "client_id": client,
+            "grant_type": "refresh_token",
+            "refresh_token": refresh_token,
+        }
+        token_url = f"{_get_keycloak_setting(env, 'keycloak_url')}/realms/ssb/protocol/openid-connect/token"
+        response = http.post(token_url, data=payload, timeout=REQUEST_TIMEOUT)
+
+        if response.status_code == 200:
+            result = response.json()
+            new_access_token: str = result["access_token"]
+            tokens["auth"]["access_token"] = new_access_token
+            tokens["auth"]["refresh_token"] = result["refresh_token"]
+            return new_access_token
+        else:
+            raise TokenRefreshFailed(
+                f"Error refreshing token: {response.status_code} - {response.text}",
+                rejected=400 <= response.status_code < 500,
+            )
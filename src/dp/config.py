@@ -1,18 +1,45 @@
 import configparser
+import os
+import sys
+import tempfile
+import threading
+from collections.abc import Iterator
 from configparser import ConfigParser
+from contextlib import contextmanager
 from pathlib import Path
 from typing import Any
 
 import typer
 
+from . import tracing
+
+if sys.platform == "win32":
+    import msvcrt
+else:
+    import fcntl
+
+# Parsed config files by path, with the identity of the file they were parsed from (inode, modification time, size)
+_cache: dict[Path, tuple[tuple[int, int, int] | None, ConfigParser]] = {}
+# Serializes access to the cache, and transactions within this process
+_lock = threading.RLock()
+
+
+class ConfigLocked(Exception):
+    """The config is locked by another transaction, and the caller chose not to wait for it."""
+
 
 def put(section: str, key: str, value: Any, namespace: str | None) -> None:
     """Set a config value for a key in a section."""
-    config = _load_config(namespace)
-    if section not in config:
-        config[section] = {}
-    config[section][key] = value
-    _save_config(config, namespace)
+    update(section, {key: value}, namespace)
+
+
+def update(section: str, values: dict[str, Any], namespace: str | None) -> None:
+    """Set config values for several keys in a section, with a single write."""
+    with transaction(namespace) as config:
+        if section not in config:
+            config[section] = {}
+        for key, value in values.items():
+            config[section][key] = value
 
 
 def get(section: str, key: str, namespace: str | None) -> Any:
@@ -26,29 +53,133 @@ def get(section: str, key: str, namespace: str | None) -> Any:
 
 def remove(section: str, namespace: str | None) -> None:
     """Remove a section from the config."""
-    config = _load_config(namespace)
-    if section in config:
-        config.remove_section(section)
-        _save_config(config, namespace)
+    with transaction(namespace) as config:
+        if section in config:
+            config.remove_section(section)
+
+
+@contextmanager
+def transaction(namespace: str | None, wait: bool = True) -> Iterator[ConfigParser]:
+    """Load the config for an update, and save it when the context exits, if it was changed.
+
+    The config file is locked for the duration of the context, so that concurrent dp processes do not lose each
+    other's updates. The config is loaded after the lock is taken, so updates made by other processes in the
+    meantime are seen. If the context raises, nothing is saved.
+
+    Args:
+        namespace: The namespace of the config.
+        wait: If False, raise `ConfigLocked` instead of waiting for another transaction to complete.
+
+    Yields:
+        The config, to be changed in place.
+
+    Raises:
+        ConfigLocked: If not waiting, and another transaction is in progress.
+    """
+    config_file = _config_file(namespace)
+    if not _lock.acquire(blocking=wait):
+        raise ConfigLocked(f"{config_file} is locked")
+    try:
+        with _file_lock(config_file, wait):
+            config = _load_config(namespace)
+            before = _contents(config)
+            try:
+                yield config
+            except BaseException:
+                _cache.pop(config_file, None)  # Discard partial changes
+                raise
+
+            if _contents(config) != before:
+                _save_config(config, namespace)
+    finally:
+        _lock.release()
 
 
 def _config_file(namespace: str | None) -> Path:
     config_dir = Path(typer.get_app_dir("dapla-cli"))
-    config_dir.mkdir(parents=True, exist_ok=True)  # Ensure the directory exists
     filename = "config.ini" if namespace is None else f"config-{namespace}.ini"
     return config_dir / filename
 
 
 def _load_config(namespace: str | None) -> ConfigParser:
-    """Load the config file."""
-    config = configparser.ConfigParser()
+    """Load the config file.
+
+    The parsed config is cached for as long as the file is unchanged, so it is parsed at most once per process unless
+    another process changes it. Since files are replaced rather than rewritten in place, a changed file is always
+    detected by its inode.
+    """
     config_file = _config_file(namespace)
-    if config_file.exists():
-        config.read(config_file)
-    return config
+    identity = _identity(config_file)
+    with _lock:
+        cached = _cache.get(config_file)
+        if cached and cached[0] == identity:
+            return cached[1]
+
+        config = configparser.ConfigParser()
+        with tracing.span("config read", "config", path=str(config_file)):
+            if identity:
+                config.read(config_file)
+        _cache[config_file] = (identity, config)
+        return config
 
 
 def _save_config(config: ConfigParser, namespace: str | None) -> None:
-    """Save the config file."""
-    with open(_config_file(namespace), "w") as f:
-        config.write(f)
+    """Save the config file atomically, by writing it to a temporary file that then replaces it.
+
+    Readers therefore never see a partly written file, and no lock is needed to read the config.
+    """
+    config_file = _config_file(namespace)
+    config_file.parent.mkdir(parents=True, exist_ok=True)
+    with tracing.span("config write", "config", path=str(config_file)):
+        with tempfile.NamedTemporaryFile(
+            "w", dir=config_file.parent, prefix=f"{config_file.name}.", delete=False
+        ) as f:
+            config.write(f)
+        os.replace(f.name, config_file)
+    with _lock:
+        _cache[config_file] = (_identity(config_file), config)
+
+
+def _identity(path: Path) -> tuple[int, int, int] | None:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def _contents(config: ConfigParser) -> dict[str, dict[str, str]]:
+    return {section: dict(config[section]) for section in config.sections()}
+
+
+@contextmanager
+def _file_lock(path: Path, wait: bool = True) -> Iterator[None]:
+    """Hold an exclusive lock on a config file across processes.
+
+    The lock is taken on a separate lock file, since the config file itself is replaced on every write.
+
+    Raises:
+        ConfigLocked: If not waiting, and another process holds the lock.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_name(f"{path.name}.lock"), "a+") as f:
+        try:
+            if sys.platform == "win32":
+                f.seek(0)
+                msvcrt.locking(
+                    f.fileno(), msvcrt.LK_LOCK if wait else msvcrt.LK_NBLCK, 1
+                )
+            else:
+                fcntl.flock(f, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError as e:
+            if wait:
+                raise
+            raise ConfigLocked(f"{path} is locked") from e
+        try:
+            yield
+        finally:
+            if sys.platform == "win32":
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f, fcntl.LOCK_UN)
@@ -0,0 +1,303 @@
+import json
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from enum import Enum
+from types import TracebackType
+from typing import Any, TextIO
+
+from rich import print as rich_print
+from rich.console import Console
+from rich.progress import (
+    BarColumn,
+    MofNCompleteColumn,
+    Progress,
+    SpinnerColumn,
+    TextColumn,
+    TimeElapsedColumn,
+    TimeRemainingColumn,
+)
+
+from .utils import grey, red
+
+
+class OutputFormat(str, Enum):
+    """Denotes how the progress of an operation on many services is reported."""
+
+    text = "text"
+    jsonl = "jsonl"
+
+
+class EventType(str, Enum):
+    """Denotes what happened during an operation on many services."""
+
+    discovered = "discovered"
+    planned = "planned"
+    started = "started"
+    finished = "finished"
+    retrying = "retrying"
+    failed = "failed"
+    skipped = "skipped"
+    summary = "summary"
+
+
+class Reporter:
+    """Reports the progress of an operation on many services as human readable text.
+
+    If stdout is a terminal, a live progress view shows how many services have been processed, the throughput and the
+    remaining time. Otherwise only failures and the final summary are printed.
+
+    Reporters are used as context managers, and are safe to use from multiple threads.
+    """
+
+    def __init__(self, description: str, console: Console | None = None) -> None:
+        """Create a reporter, with a description of the operation for the progress view."""
+        self.description = description
+        self.console = console or Console()
+        self._start = time.monotonic()
+        self._completed = 0
+        self._lock = threading.Lock()
+        self._progress = Progress(
+            SpinnerColumn(),
+            TextColumn("[progress.description]{task.description}"),
+            BarColumn(),
+            MofNCompleteColumn(),
+            TextColumn("{task.fields[rate]} services/s"),
+            TimeElapsedColumn(),
+            TextColumn("eta"),
+            TimeRemainingColumn(),
+            console=self.console,
+            transient=True,
+            disable=not self.console.is_terminal,
+        )
+        self._task = self._progress.add_task(description, total=0, rate="0.0")
+
+    def __enter__(self) -> "Reporter":
+        """Start the live progress view."""
+        self._start = time.monotonic()
+        self._progress.start()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        """Stop the live progress view."""
+        self._progress.stop()
+
+    def discovered(self, namespace: str, services: int, duration: float) -> None:
+        """Report that the services of a namespace have been discovered."""
+        self._progress.update(self._task, total=self._total() + services)
+
+    def planned(self, namespace: str, name: str, operation: str) -> None:
+        """Report that an operation on a service has been scheduled."""
+
+    def started(self, namespace: str, name: str, operation: str) -> None:
+        """Report that an operation on a service has started."""
+
+    def finished(
+        self, namespace: str, name: str, operation: str, duration: float
+    ) -> None:
+        """Report that an operation on a service has completed successfully."""
+        self._advance()
+
+    def retrying(
+        self,
+        namespace: str,
+        name: str,
+        operation: str,
+        attempt: int,
+        delay: float,
+        error: str,
+    ) -> None:
+        """Report that an operation on a service failed transiently, and will be retried after a delay."""
+        self._progress.console.print(
+            grey(
+                f"Retrying {operation} of {name} in namespace {namespace} in {delay:.1f}s (attempt {attempt}): {error.strip()}"
+            )
+        )
+
+    def failed(
+        self, namespace: str, name: str, operation: str, duration: float, error: str
+    ) -> None:
+        """Report that an operation on a service has failed."""
+        self._progress.console.print(red(error))
+        self._advance()
+
+    def skipped(self, namespace: str, name: str, operation: str, reason: str) -> None:
+        """Report that an operation on a service was not carried out."""
+        self._progress.console.print(grey(reason))
+        self._advance()
+
+    def summary(self, message: str, **counts: int) -> None:
+        """Report the outcome of the whole operation."""
+        rich_print(message)
+
+    def _total(self) -> float:
+        return self._progress.tasks[0].total or 0
+
+    def _advance(self) -> None:
+        with self._lock:
+            self._completed += 1
+            rate = self._completed / max(time.monotonic() - self._start, 1e-3)
+        self._progress.update(self._task, advance=1, rate=f"{rate:.1f}")
+
+
+class JsonlReporter(Reporter):
+    """Reports the progress of an operation on many services as JSON lines, one per event.
+
+    Events are buffered, and written in batches to avoid a write per event when output goes to a log collector.
+    """
+
+    def __init__(
+        self,
+        description: str,
+        stream: TextIO | None = None,
+        buffer_size: int = 100,
+        flush_interval: float = 1.0,
+    ) -> None:
+        """Create a reporter that writes to stdout, unless another stream is given."""
+        self.description = description
+        self.stream = stream or sys.stdout
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self._buffer: list[str] = []
+        self._last_flush = time.monotonic()
+        self._start = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "JsonlReporter":
+        """Start timing the operation."""
+        self._start = time.monotonic()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        """Write any buffered events."""
+        self.flush()
+
+    def discovered(self, namespace: str, services: int, duration: float) -> None:
+        """Report that the services of a namespace have been discovered."""
+        self._emit(
+            EventType.discovered,
+            namespace=namespace,
+            services=services,
+            duration=duration,
+        )
+
+    def planned(self, namespace: str, name: str, operation: str) -> None:
+        """Report that an operation on a service has been scheduled."""
+        self._emit(
+            EventType.planned, namespace=namespace, name=name, operation=operation
+        )
+
+    def started(self, namespace: str, name: str, operation: str) -> None:
+        """Report that an operation on a service has started."""
+        self._emit(
+            EventType.started, namespace=namespace, name=name, operation=operation
+        )
+
+    def finished(
+        self, namespace: str, name: str, operation: str, duration: float
+    ) -> None:
+        """Report that an operation on a service has completed successfully."""
+        self._emit(
+            EventType.finished,
+            namespace=namespace,
+            name=name,
+            operation=operation,
+            duration=duration,
+        )
+
+    def retrying(
+        self,
+        namespace: str,
+        name: str,
+        operation: str,
+        attempt: int,
+        delay: float,
+        error: str,
+    ) -> None:
+        """Report that an operation on a service failed transiently, and will be retried after a delay."""
+        self._emit(
+            EventType.retrying,
+            namespace=namespace,
+            name=name,
+            operation=operation,
+            attempt=attempt,
+            delay=delay,
+            error=error,
+        )
+
+    def failed(
+        self, namespace: str, name: str, operation: str, duration: float, error: str
+    ) -> None:
+        """Report that an operation on a service has failed."""
+        self._emit(
+            EventType.failed,
+            namespace=namespace,
+            name=name,
+            operation=operation,
+            duration=duration,
+            error=error,
+        )
+
+    def skipped(self, namespace: str, name: str, operation: str, reason: str) -> None:
+        """Report that an operation on a service was not carried out."""
+        self._emit(
+            EventType.skipped,
+            namespace=namespace,
+            name=name,
+            operation=operation,
+            reason=reason,
+        )
+
+    def summary(self, message: str, **counts: int) -> None:
+        """Report the outcome of the whole operation."""
+        self._emit(
+            EventType.summary,
+            message=message,
+            duration=time.monotonic() - self._start,
+            **counts,
+        )
+        self.flush()
+
+    def flush(self) -> None:
+        """Write all buffered events."""
+        with self._lock:
+            lines, self._buffer = self._buffer, []
+            self._last_flush = time.monotonic()
+            if lines:
+                self.stream.write("".join(lines))
+                self.stream.flush()
+
+    def _emit(self, event: EventType, **fields: Any) -> None:
+        line = json.dumps(
+            {
+                "event": event.value,
+                "time": datetime.now(timezone.utc).isoformat(),
+                **fields,
+            }
+        )
+        with self._lock:
+            self._buffer.append(line + "\n")
+            due = (
+                len(self._buffer) >= self.buffer_size
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            )
+        if due:
+            self.flush()
+
+
+def reporter(output: OutputFormat, description: str) -> Reporter:
+    """Return a reporter for the given output format."""
+    if output == OutputFormat.jsonl:
+        return JsonlReporter(description)
+    return Reporter(description)
@@ -0,0 +1,82 @@
+import threading
+from typing import Any
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import tracing
+
+# Seconds to wait for a connection to be established, and for the server to respond once connected
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 30
+# The number of times a request is retried, and the backoff factor of the exponential delay between retries
+RETRIES = 3
+RETRY_BACKOFF = 0.5
+# Responses that indicate a transient failure, which idempotent requests are retried on
+RETRY_STATUSES = (429, 502, 503, 504)
+# The number of keep-alive connections kept per host
+POOL_SIZE = 16
+
+_session: requests.Session | None = None
+_lock = threading.Lock()
+
+
+def session() -> requests.Session:
+    """Return the HTTP session shared by all requests of this process.
+
+    The session keeps a pool of keep-alive connections per host, so only the first request to a host pays for the TCP
+    and TLS handshakes. Requests are retried with exponential backoff when the connection fails, and idempotent
+    requests are also retried on responses in `RETRY_STATUSES`, honouring any Retry-After header. Non-idempotent
+    requests, such as the POSTs of the token endpoint, are only retried if they were never sent.
+    """
+    global _session
+    with _lock:
+        if _session is None:
+            retry = Retry(
+                total=RETRIES,
+                backoff_factor=RETRY_BACKOFF,
+                status_forcelist=RETRY_STATUSES,
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(
+                max_retries=retry, pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE
+            )
+            _session = requests.Session()
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+def request(method: str, url: str, **kwargs: Any) -> requests.Response:
+    """Make an HTTP request with the shared session, recording it as a span of the trace.
+
+    Args:
+        method: The HTTP method, e.g. `GET`.
+        url: The URL to request.
+        kwargs: Passed on to `requests.Session.request`. Unless a `timeout` is given, the default timeouts are used.
+
+    Returns:
+        The response, whatever its status code.
+
+    Raises:
+        requests.RequestException: If the request failed, even after retrying.
+    """
+    kwargs.setdefault("timeout", (CONNECT_TIMEOUT, READ_TIMEOUT))
+    with tracing.span(f"{method} {url}", "http", url=url) as span:
+        response = session().request(method, url, **kwargs)
+        span["status"] = response.status_code
+        retries = getattr(response.raw, "retries", None)
+        if retries and retries.history:
+            span["retries"] = len(retries.history)
+    return response
+
+
+def get(url: str, **kwargs: Any) -> requests.Response:
+    """Make a GET request with the shared session. See `request`."""
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs: Any) -> requests.Response:
+    """Make a POST request with the shared session. See `request`."""
+    return request("POST", url, **kwargs)
@@ -0,0 +1,220 @@
+import base64
+import gzip
+import json
+import os
+import threading
+from collections import defaultdict
+from collections.abc import Mapping
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any
+
+import typer
+
+from . import kube
+from .utils import run
+
+# Magic header of gzip compressed helm release payloads
+GZIP_MAGIC = b"\x1f\x8b\x08"
+
+# The release states listed by `helm list` when no state filter is given
+LISTED_STATES = {"deployed", "failed"}
+
+# How long cached service details are trusted, even if their release revision is unchanged
+CACHE_TTL = timedelta(hours=24)
+
+
+def list_release_secrets(
+    namespace: str | None, verbose: bool = False
+) -> list[dict[str, Any]]:
+    """List the Helm v3 release secrets in a namespace, or in all namespaces if no namespace is given.
+
+    Secrets are listed page by page from the API server in-process, or with kubectl if the API server can not be
+    reached in-process.
+
+    Args:
+        namespace: The namespace to list release secrets in. If None, all namespaces are queried at once.
+        verbose: If True, prints executed commands to stdout.
+
+    Returns:
+        The raw kubernetes secret objects.
+
+    Raises:
+        ValueError: If the secrets could not be listed.
+    """
+    path = (
+        "/api/v1/secrets"
+        if namespace is None
+        else f"/api/v1/namespaces/{namespace}/secrets"
+    )
+    try:
+        return list(
+            kube.client().list(path, label_selector="owner=helm", verbose=verbose)
+        )
+    except kube.KubeUnavailable:
+        pass
+
+    scope = ["--all-namespaces"] if namespace is None else ["--namespace", namespace]
+    res = run(
+        [
+            "kubectl",
+            "get",
+            "secrets",
+            *scope,
+            "--selector",
+            "owner=helm",
+            "--output",
+            "json",
+        ],
+        verbose=verbose,
+    )
+    if res.returncode != 0:
+        raise ValueError(f"Could not list helm release secrets: {res.stderr}")
+
+    secrets: list[dict[str, Any]] = json.loads(res.stdout).get("items", [])
+    return secrets
+
+
+def decode_release(payload: str) -> dict[str, Any]:
+    """Decode the `release` field of a Helm v3 release secret.
+
+    The release is stored as base64 encoded, gzip compressed JSON, which kubernetes base64 encodes once more.
+    """
+    data = base64.b64decode(base64.b64decode(payload))
+    if data.startswith(GZIP_MAGIC):
+        data = gzip.decompress(data)
+
+    release: dict[str, Any] = json.loads(data)
+    return release
+
+
+def releases_from_secrets(
+    secrets: list[dict[str, Any]],
+    scaled_down: Mapping[tuple[str, str], datetime | None] | None = None,
+) -> list[dict[str, Any]]:
+    """Derive the current state of every helm release from its release secrets.
+
+    Each release has one secret per retained revision. The latest revision determines the current state, while the
+    oldest retained revision determines when the release was created, the same way `helm history` does. A release is
+    suspended if its values say so, or if its workloads have been scaled down.
+
+    Args:
+        secrets: Raw kubernetes secret objects, as returned by `list_release_secrets`.
+        scaled_down: When the releases whose workloads have been scaled down were suspended, keyed by their
+            namespace and name, as returned by `workloads.scaled_down_releases`.
+
+    Returns:
+        One dict per release with the same fields as `lab.Service`.
+    """
+    scaled_down = scaled_down or {}
+    revisions: dict[tuple[str, str], list[dict[str, Any]]] = defaultdict(list)
+    for secret in secrets:
+        payload = secret.get("data", {}).get("release")
+        if not payload:
+            continue
+        release = decode_release(payload)
+        revisions[(release["namespace"], release["name"])].append(release)
+
+    releases = []
+    for (namespace, name), history in revisions.items():
+        history.sort(key=lambda r: int(r["version"]))
+        latest = history[-1]
+        info = latest.get("info", {})
+        if info.get("status") not in LISTED_STATES:
+            continue
+
+        metadata = latest.get("chart", {}).get("metadata", {})
+        values = latest.get("config") or {}
+        releases.append(
+            {
+                "name": name,
+                "namespace": namespace,
+                "revision": str(latest["version"]),
+                "updated": info.get("last_deployed"),
+                "status": info.get("status"),
+                "chart": f"{metadata.get('name')}-{metadata.get('version')}",
+                "app_version": metadata.get("appVersion"),
+                "chart_version": metadata.get("version"),
+                "created": history[0].get("info", {}).get("last_deployed"),
+                "suspended": values.get("global", {}).get("suspend", False)
+                or (namespace, name) in scaled_down,
+                "scaled_down": (namespace, name) in scaled_down,
+                "suspended_at": scaled_down.get((namespace, name)),
+            }
+        )
+
+    return releases
+
+
+class InventoryCache:
+    """An on-disk cache of service details, keyed by namespace, release name and release revision.
+
+    The details of a helm release, such as its values, can only change with a new revision. Cached details are
+    therefore valid for as long as the revision and update time listed by `helm list` stay the same, so only releases
+    with a new revision need to be inspected further. Entries expire after a TTL regardless.
+    """
+
+    def __init__(self, path: Path, ttl: timedelta = CACHE_TTL) -> None:
+        """Load the cache from a file, starting out empty if it does not exist or cannot be read."""
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict[str, Any]] = {}
+        if path.exists():
+            try:
+                self._entries = json.loads(path.read_text())
+            except (OSError, ValueError):
+                pass  # A corrupt cache is as good as an empty one
+
+    @classmethod
+    def for_env(cls, env: str) -> "InventoryCache":
+        """Return the cache of an environment, stored under the dapla-cli app dir."""
+        cache_dir = Path(typer.get_app_dir("dapla-cli")) / "cache"
+        return cls(cache_dir / f"lab-services-{env}.json")
+
+    def get(self, release: dict[str, Any]) -> dict[str, Any] | None:
+        """Return the cached service details of a release, as listed by `helm list`, if they are still valid."""
+        with self._lock:
+            entry = self._entries.get(self._key(release))
+        if (
+            entry is None
+            or entry["revision"] != str(release.get("revision"))
+            or entry["updated"] != release.get("updated")
+            or self._expired(entry)
+        ):
+            return None
+
+        service: dict[str, Any] = entry["service"]
+        return service
+
+    def put(self, release: dict[str, Any], service: dict[str, Any]) -> None:
+        """Cache the service details of a release, as listed by `helm list`."""
+        with self._lock:
+            self._entries[self._key(release)] = {
+                "revision": str(release.get("revision")),
+                "updated": release.get("updated"),
+                "cached_at": datetime.now().isoformat(),
+                "service": service,
+            }
+
+    def save(self) -> None:
+        """Write the cache to disk, dropping expired entries."""
+        with self._lock:
+            self._entries = {
+                key: entry
+                for key, entry in self._entries.items()
+                if not self._expired(entry)
+            }
+            contents = json.dumps(self._entries)
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(contents)
+        os.replace(tmp_path, self.path)
+
+    def _expired(self, entry: dict[str, Any]) -> bool:
+        return datetime.now() - datetime.fromisoformat(entry["cached_at"]) > self.ttl
+
+    @staticmethod
+    def _key(release: dict[str, Any]) -> str:
+        return f"{release['namespace']}/{release['name']}"
@@ -0,0 +1,85 @@
+import hashlib
+import json
+import threading
+from datetime import datetime, timezone
+from enum import Enum
+from pathlib import Path
+
+import typer
+
+
+class Outcome(str, Enum):
+    """Denotes the outcome of an operation on a single service."""
+
+    processed = "processed"
+    retried = "retried"
+    failed = "failed"
+    skipped = "skipped"
+
+
+# Outcomes that need not be repeated when a sweep is resumed. Failed operations are attempted again.
+FINAL_OUTCOMES = {Outcome.processed, Outcome.retried, Outcome.skipped}
+
+
+class Journal:
+    """An append-only journal of the operations completed by a sweep, so that an interrupted sweep can be resumed.
+
+    Every completed operation is appended as a JSON line and flushed right away, so the journal survives the process
+    being killed. The journal is removed once a sweep has completed without failures.
+    """
+
+    def __init__(self, path: Path, resume: bool = False) -> None:
+        """Open a journal, continuing an existing one if resuming, and starting a new one otherwise."""
+        self.path = path
+        self.completed: set[tuple[str, str]] = set()
+        self._lock = threading.Lock()
+        if resume and path.exists():
+            for line in path.read_text().splitlines():
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # A line cut short by a crash
+                if entry["outcome"] in FINAL_OUTCOMES:
+                    self.completed.add((entry["namespace"], entry["name"]))
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text("")
+
+    @classmethod
+    def for_sweep(cls, sweep_id: str, resume: bool = False) -> "Journal":
+        """Open the journal of a sweep, stored under the dapla-cli app dir."""
+        journal_dir = Path(typer.get_app_dir("dapla-cli")) / "journal"
+        return cls(journal_dir / f"{sweep_id}.jsonl", resume)
+
+    def done(self, namespace: str, name: str) -> bool:
+        """Return whether the operation on a service was completed by an earlier run of the sweep."""
+        return (namespace, name) in self.completed
+
+    def record(
+        self, namespace: str, name: str, operation: str, outcome: Outcome
+    ) -> None:
+        """Append the outcome of an operation on a service to the journal."""
+        line = json.dumps(
+            {
+                "namespace": namespace,
+                "name": name,
+                "operation": operation,
+                "outcome": outcome.value,
+                "time": datetime.now(timezone.utc).isoformat(),
+            }
+        )
+        with self._lock, open(self.path, "a") as f:
+            f.write(line + "\n")
+
+    def close(self, failed: int) -> None:
+        """Remove the journal if the sweep completed without failures, and keep it for a later resume otherwise."""
+        if failed == 0:
+            self.path.unlink(missing_ok=True)
+
+
+def sweep_id(env: str, operation: str, namespace: str, namespace_pattern: str) -> str:
+    """Return an id that identifies a sweep across runs, derived from what it operates on."""
+    if namespace != "all":
+        return f"{env}-{operation}-{namespace}"
+    digest = hashlib.sha256(namespace_pattern.encode()).hexdigest()[:8]
+    return f"{env}-{operation}-all-{digest}"
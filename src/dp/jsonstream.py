@@ -0,0 +1,111 @@
+import codecs
+import json
+from collections.abc import Iterable, Iterator
+from typing import Any
+
+WHITESPACE = " \t\n\r"
+
+_decoder = json.JSONDecoder()
+
+
+def iter_elements(chunks: Iterable[bytes]) -> Iterator[Any]:
+    """Parse a UTF-8 encoded JSON document incrementally, yielding the elements of a top-level array one by one.
+
+    Every element is yielded as soon as it has been read, so a consumer can start on the first elements of a large
+    array before the rest has arrived, and only the element being parsed is held in memory. A document that is not
+    an array is yielded as a single element, once it has been read completely.
+
+    Args:
+        chunks: The document, in chunks of any size, e.g. from `requests.Response.iter_content`.
+
+    Yields:
+        The elements of the array, or the whole document if it is not an array.
+
+    Raises:
+        ValueError: If the document is not valid JSON.
+    """
+    buffer = _Buffer(chunks)
+    if buffer.peek() != "[":
+        yield buffer.value()
+    else:
+        buffer.pos += 1
+        if buffer.peek() == "]":
+            buffer.pos += 1
+        else:
+            while True:
+                yield buffer.value()
+                separator = buffer.peek()
+                buffer.pos += 1
+                if separator == "]":
+                    break
+                if separator != ",":
+                    raise ValueError(f"Expected ',' or ']' but found {separator!r}")
+
+    if buffer.peek():
+        raise ValueError("Extra data after the JSON document")
+
+
+def project(value: Any, fields: list[str]) -> Any:
+    """Select fields of an object by dotted paths, such as `manager.email`, leaving out all other fields.
+
+    Fields that are missing from the object are selected as None. Values other than objects are returned as is.
+    """
+    if not fields or not isinstance(value, dict):
+        return value
+    return {field: _lookup(value, field.split(".")) for field in fields}
+
+
+def _lookup(value: Any, keys: list[str]) -> Any:
+    for key in keys:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+class _Buffer:
+    """The part of a document that has been read, but not yet parsed."""
+
+    def __init__(self, chunks: Iterable[bytes]) -> None:
+        self.chunks = iter(chunks)
+        self.text = ""
+        self.pos = 0
+        self.exhausted = False
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+
+    def more(self) -> bool:
+        """Read the next chunk, dropping the text parsed so far, and return False if the document has ended."""
+        for chunk in self.chunks:
+            text = self._decoder.decode(chunk)
+            if text:
+                self.text = self.text[self.pos :] + text
+                self.pos = 0
+                return True
+        self._decoder.decode(b"", final=True)
+        self.exhausted = True
+        return False
+
+    def peek(self) -> str:
+        """Skip whitespace, and return the next character, or an empty string at the end of the document."""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.more():
+                return ""
+
+    def value(self) -> Any:
+        """Parse the next value, reading more chunks until it is complete."""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                if self.more():
+                    continue
+                raise
+            if end == len(self.text) and not self.exhausted and self.more():
+                continue  # A number at the end of a chunk may continue in the next one
+            self.pos = end
+            return value
@@ -0,0 +1,326 @@
+import atexit
+import base64
+import json
+import os
+import tempfile
+import threading
+from collections.abc import Iterator
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any
+
+import requests
+import yaml
+from pydantic import BaseModel
+from requests.adapters import HTTPAdapter
+
+from . import tracing
+from .utils import err, grey, run
+
+# The number of objects fetched per request when listing
+PAGE_SIZE = 500
+# Seconds to wait for the API server to respond
+REQUEST_TIMEOUT = 30
+# Refresh tokens from exec credential plugins this long before they expire
+TOKEN_EXPIRY_MARGIN = timedelta(minutes=1)
+
+
+class KubeUnavailable(Exception):
+    """The Kubernetes API can not be used in-process, and callers should fall back to kubectl."""
+
+
+class KubeConfig(BaseModel):
+    """The parts of a kubeconfig needed to talk to the API server of the current context."""
+
+    context: str
+    cluster: str
+    server: str
+    certificate_authority: str | None = None
+    certificate_authority_data: str | None = None
+    insecure_skip_tls_verify: bool = False
+    token: str | None = None
+    exec_command: list[str] | None = None
+    client_certificate: str | None = None
+    client_certificate_data: str | None = None
+    client_key: str | None = None
+    client_key_data: str | None = None
+
+
+_configs: dict[tuple[tuple[str, int], ...], KubeConfig] = {}
+_clients: dict[tuple[tuple[str, int], ...], "KubeClient"] = {}
+_lock = threading.Lock()
+
+
+def kubeconfig_paths() -> list[Path]:
+    """Return the kubeconfig files kubectl would read, in order of precedence."""
+    if os.getenv("KUBECONFIG"):
+        return [Path(p) for p in os.environ["KUBECONFIG"].split(os.pathsep) if p]
+    return [Path.home() / ".kube" / "config"]
+
+
+def load_config() -> KubeConfig:
+    """Load the current context from the kubeconfig files.
+
+    The parsed config is memoized on the paths and modification times of the files, so it is only parsed again when
+    a file changes, e.g. when the user switches context.
+
+    Raises:
+        KubeUnavailable: If the kubeconfig can not be read, or uses a feature not supported in-process.
+    """
+    key = _config_key()
+    with _lock:
+        if key not in _configs:
+            _configs[key] = _parse([Path(path) for path, _ in key])
+        return _configs[key]
+
+
+def current_cluster_name() -> str:
+    """Return the name of the cluster of the current context, as `kubectl config view --minify` would."""
+    return load_config().cluster
+
+
+def client() -> "KubeClient":
+    """Return a client for the API server of the current context.
+
+    Clients are reused for as long as the kubeconfig is unchanged, so requests share a pool of keep-alive connections.
+
+    Raises:
+        KubeUnavailable: If the kubeconfig can not be read, or uses a feature not supported in-process.
+    """
+    key = _config_key()
+    config = load_config()
+    with _lock:
+        if key not in _clients:
+            _clients[key] = KubeClient(config)
+        return _clients[key]
+
+
+class KubeClient:
+    """A minimal client for listing objects from the Kubernetes API server."""
+
+    def __init__(self, config: KubeConfig) -> None:
+        """Create a client with a pooled HTTP session for the API server of a kubeconfig context."""
+        self.config = config
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=32))
+        self.session.mount("http://", HTTPAdapter(pool_maxsize=32))
+        if config.insecure_skip_tls_verify:
+            self.session.verify = False
+        elif config.certificate_authority_data:
+            self.session.verify = _data_file(config.certificate_authority_data)
+        elif config.certificate_authority:
+            self.session.verify = config.certificate_authority
+
+        cert = config.client_certificate or (
+            config.client_certificate_data
+            and _data_file(config.client_certificate_data)
+        )
+        key = config.client_key or (
+            config.client_key_data and _data_file(config.client_key_data)
+        )
+        if cert and key:
+            self.session.cert = (cert, key)
+
+        self._token = config.token
+        self._token_expiry: datetime | None = None
+        self._token_lock = threading.Lock()
+
+    def list(
+        self,
+        path: str,
+        label_selector: str | None = None,
+        page_size: int = PAGE_SIZE,
+        verbose: bool = False,
+    ) -> Iterator[dict[str, Any]]:
+        """List the objects of a collection, such as `/api/v1/namespaces`, page by page.
+
+        Args:
+            path: The path of the collection.
+            label_selector: Only list objects matching this label selector, e.g. `owner=helm`.
+            page_size: The maximum number of objects fetched per request.
+            verbose: If True, prints the requests made to stdout.
+
+        Yields:
+            The objects of the collection.
+
+        Raises:
+            KubeUnavailable: If the API server can not be reached.
+            ValueError: If the API server refuses to list the objects.
+        """
+        params: dict[str, Any] = {"limit": page_size}
+        if label_selector:
+            params["labelSelector"] = label_selector
+
+        while True:
+            response = self._request("GET", path, verbose, params=params)
+            if response.status_code != 200:
+                raise ValueError(
+                    f"Could not list {path}: {response.status_code} {response.text}"
+                )
+
+            page = response.json()
+            yield from page.get("items", [])
+            params["continue"] = page.get("metadata", {}).get("continue")
+            if not params["continue"]:
+                return
+
+    def patch(
+        self,
+        path: str,
+        patch: dict[str, Any],
+        verbose: bool = False,
+        timeout: float | None = REQUEST_TIMEOUT,
+    ) -> dict[str, Any]:
+        """Apply a JSON merge patch to an object, such as `/apis/apps/v1/namespaces/a/deployments/b`.
+
+        Args:
+            path: The path of the object.
+            patch: The changes to merge into the object.
+            verbose: If True, prints the request made to stdout.
+            timeout: Seconds to wait for the API server to respond.
+
+        Returns:
+            The patched object.
+
+        Raises:
+            KubeUnavailable: If the API server can not be reached.
+            ValueError: If the API server refuses to patch the object.
+        """
+        response = self._request(
+            "PATCH",
+            path,
+            verbose,
+            data=json.dumps(patch),
+            headers={"Content-Type": "application/merge-patch+json"},
+            timeout=timeout,
+        )
+        if response.status_code != 200:
+            raise ValueError(
+                f"Could not patch {path}: {response.status_code} {response.text}"
+            )
+        patched: dict[str, Any] = response.json()
+        return patched
+
+    def _request(
+        self, method: str, path: str, verbose: bool, **kwargs: Any
+    ) -> requests.Response:
+        url = self.config.server.rstrip("/") + path
+        if verbose:
+            err.print(grey(f"{method} {url} {kwargs.get('params') or ''}"))
+        headers = {**self._headers(), **kwargs.pop("headers", {})}
+        kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+        with tracing.span(f"{method} {path}", "http", url=url) as span:
+            try:
+                response = self.session.request(method, url, headers=headers, **kwargs)
+            except requests.RequestException as e:
+                raise KubeUnavailable(f"Could not reach {url}: {e}") from e
+            span["status"] = response.status_code
+        return response
+
+    def _headers(self) -> dict[str, str]:
+        token = self._current_token()
+        return {"Authorization": f"Bearer {token}"} if token else {}
+
+    def _current_token(self) -> str | None:
+        if not self.config.exec_command:
+            return self._token
+
+        with self._token_lock:
+            expired = self._token_expiry is not None and (
+                datetime.now(timezone.utc) >= self._token_expiry - TOKEN_EXPIRY_MARGIN
+            )
+            if self._token is None or expired:
+                self._token, self._token_expiry = _exec_credential(
+                    self.config.exec_command
+                )
+            return self._token
+
+
+def _config_key() -> tuple[tuple[str, int], ...]:
+    key = tuple(
+        (str(path), path.stat().st_mtime_ns)
+        for path in kubeconfig_paths()
+        if path.is_file()
+    )
+    if not key:
+        raise KubeUnavailable("No kubeconfig found")
+    return key
+
+
+def _parse(paths: list[Path]) -> KubeConfig:
+    """Parse the current context from kubeconfig files, merged the way kubectl does: the first file to set a value wins."""
+    current_context = None
+    entries: dict[str, dict[str, dict[str, Any]]] = {
+        "contexts": {},
+        "clusters": {},
+        "users": {},
+    }
+    for path in paths:
+        try:
+            document = yaml.safe_load(path.read_text()) or {}
+        except (OSError, yaml.YAMLError) as e:
+            raise KubeUnavailable(f"Could not read {path}: {e}") from e
+        current_context = current_context or document.get("current-context")
+        for kind, named in entries.items():
+            for entry in document.get(kind) or []:
+                named.setdefault(entry["name"], entry.get(kind[:-1]) or {})
+
+    if not current_context or current_context not in entries["contexts"]:
+        raise KubeUnavailable("No current context")
+    context = entries["contexts"][current_context]
+    cluster = entries["clusters"].get(context.get("cluster", ""))
+    if cluster is None:
+        raise KubeUnavailable(f"Context {current_context} has no cluster")
+    user = entries["users"].get(context.get("user", ""), {})
+    if user.get("auth-provider") or user.get("tokenFile") or user.get("username"):
+        raise KubeUnavailable("Unsupported authentication method")
+
+    exec_config = user.get("exec")
+    if exec_config and exec_config.get("env"):
+        raise KubeUnavailable("Exec credential plugins with env are not supported")
+
+    return KubeConfig(
+        context=current_context,
+        cluster=context["cluster"],
+        server=cluster["server"],
+        certificate_authority=cluster.get("certificate-authority"),
+        certificate_authority_data=cluster.get("certificate-authority-data"),
+        insecure_skip_tls_verify=cluster.get("insecure-skip-tls-verify", False),
+        token=user.get("token"),
+        exec_command=(
+            [exec_config["command"], *(exec_config.get("args") or [])]
+            if exec_config
+            else None
+        ),
+        client_certificate=user.get("client-certificate"),
+        client_certificate_data=user.get("client-certificate-data"),
+        client_key=user.get("client-key"),
+        client_key_data=user.get("client-key-data"),
+    )
+
+
+def _exec_credential(command: list[str]) -> tuple[str, datetime | None]:
+    """Get a token from an exec credential plugin, such as `gke-gcloud-auth-plugin`."""
+    res = run(command)
+    if res.returncode != 0:
+        raise KubeUnavailable(f"Credential plugin failed: {res.stderr}")
+
+    try:
+        status = json.loads(res.stdout).get("status") or {}
+    except (ValueError, AttributeError) as e:
+        raise KubeUnavailable(f"Credential plugin returned invalid output: {e}") from e
+    if "token" not in status:
+        raise KubeUnavailable("Credential plugin returned no token")
+
+    expiry = status.get("expirationTimestamp")
+    return status["token"], (
+        datetime.fromisoformat(expiry.replace("Z", "+00:00")) if expiry else None
+    )
+
+
+def _data_file(data: str) -> str:
+    """Write base64 encoded kubeconfig data, such as a certificate, to a file that is removed on exit."""
+    with tempfile.NamedTemporaryFile("wb", suffix=".pem", delete=False) as f:
+        f.write(base64.b64decode(data))
+    atexit.register(os.unlink, f.name)
+    return f.name
@@ -1,9 +1,15 @@
 import json
 import logging
-from collections.abc import Callable
-from datetime import datetime
+import random
+import re
+import threading
+import time
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
 from enum import Enum
-from typing import Annotated, Any, cast
+from pathlib import Path
+from typing import Annotated, Any, TypeVar, cast
 
 import typer
 from pydantic import BaseModel
@@ -11,8 +17,26 @@ from rich import print as rich_print
 from rich.console import Console
 from typer import Typer
 
+from . import inventory, kube, limiter, tracing, workloads
 from .annotations import dryrunnable, ensure_helm_repos_updated
-from .utils import RunResult, green, hours_since, print_err, red, run
+from .events import OutputFormat, Reporter, reporter
+from .journal import Journal, Outcome, sweep_id
+from .utils import (
+    CANCELLED_RETURNCODE,
+    RunResult,
+    RunTimeout,
+    cancel_on_interrupt,
+    deadline,
+    green,
+    hours_since,
+    print_err,
+    red,
+    run,
+    run_many,
+    sleep,
+)
+
+_T = TypeVar("_T")
 
 app = Typer()
 err = Console(stderr=True, force_terminal=True)
@@ -20,6 +44,35 @@ logger = logging.getLogger(__name__)
 
 dt_format = "2006-01-02T15:04:05.999999999Z"
 
+# Namespaces affected when operating on 'all' namespaces
+DEFAULT_NAMESPACE_PATTERN = "^user-"
+# The number of helm reads run at once for the releases of a namespace, on top of the --parallel namespaces
+HELM_READS_PARALLEL = 4
+# The number of times an operation that failed transiently is retried
+RETRY_ATTEMPTS = 3
+# Seconds to wait before the first retry, doubled for every following retry
+RETRY_BACKOFF = 1.0
+# The longest wait between two retries, in seconds
+RETRY_BACKOFF_MAX = 30.0
+# Errors that are likely to go away by themselves, such as a release being locked by a concurrent helm operation,
+# or the API server being overloaded
+TRANSIENT_ERRORS = re.compile(
+    "|".join(
+        [
+            r"another operation \(install/upgrade/rollback\) is in progress",
+            r"context deadline exceeded",
+            r"i/o timeout",
+            r"TLS handshake timeout",
+            r"connection refused",
+            r"connection reset by peer",
+            r"the server is currently unable to handle the request",
+            r"Too Many Requests",
+            r"etcdserver: request timed out",
+        ]
+    ),
+    re.IGNORECASE,
+)
+
 
 class Env(str, Enum):
     """Denotes the environment to operate on."""
@@ -38,6 +91,20 @@ class OperationType(str, Enum):
     prune = "prune"
 
 
+class SuspendMode(str, Enum):
+    """Denotes how services are suspended and unsuspended."""
+
+    helm = "helm"
+    scale = "scale"
+
+
+class Inventory(str, Enum):
+    """Denotes the backend used to discover services and their details."""
+
+    helm = "helm"
+    secrets = "secrets"
+
+
 class Service(BaseModel):
     """A Dapla Lab service."""
 
@@ -47,12 +114,35 @@ class Service(BaseModel):
     updated: datetime | None = None
     status: str | None = None
     suspended: bool | None = None
+    # Whether the service was suspended by scaling its workloads down, see `workloads.scale_down`
+    scaled_down: bool | None = None
+    # When the workloads were scaled down, if they were. The update time of the helm release does not change then
+    suspended_at: datetime | None = None
     chart: str | None = None
     app_version: str | None = None
     chart_version: str | None = None
     created: datetime | None = None
 
 
+class PlanEntry(BaseModel):
+    """A planned operation on a Dapla Lab service."""
+
+    service: Service
+    operation: OperationType | None
+    reason: str
+    revision: str | None
+
+
+class Plan(BaseModel):
+    """A reviewable set of operations on Dapla Lab services, to be applied later."""
+
+    env: Env
+    namespace: str
+    namespace_pattern: str
+    created: datetime
+    entries: list[PlanEntry]
+
+
 # Common options
 env_option = Annotated[
     Env,
@@ -74,6 +164,90 @@ verbose_option = Annotated[
     bool,
     typer.Option("--verbose", "-v", help="Be verbose and print extra information"),
 ]
+parallel_option = Annotated[
+    int,
+    typer.Option(
+        "--parallel",
+        "-p",
+        min=1,
+        help="The number of namespaces and services to process concurrently",
+    ),
+]
+deadline_option = Annotated[
+    float | None,
+    typer.Option(
+        "--deadline",
+        min=0,
+        help="The maximum number of seconds the whole operation may take. Commands still running at the deadline are killed.",
+    ),
+]
+no_cache_option = Annotated[
+    bool,
+    typer.Option(
+        "--no-cache",
+        help="Inspect every service from scratch instead of reusing cached details of unchanged helm releases",
+    ),
+]
+output_option = Annotated[
+    OutputFormat,
+    typer.Option(
+        "--output",
+        case_sensitive=False,
+        help="How to report progress. `jsonl` writes one JSON object per event to stdout.",
+    ),
+]
+mode_option = Annotated[
+    SuspendMode,
+    typer.Option(
+        "--mode",
+        case_sensitive=False,
+        help="How to suspend services. `scale` scales their workloads to zero replicas directly instead of upgrading their helm release. Services suspended this way are scaled up again when unsuspended, in either mode, or by any later helm upgrade.",
+    ),
+]
+adaptive_option = Annotated[
+    bool,
+    typer.Option(
+        "--adaptive",
+        help="Adapt the number of concurrent helm upgrades and deletes to how well the API server copes, up to --parallel",
+    ),
+]
+resume_option = Annotated[
+    bool,
+    typer.Option(
+        "--resume",
+        help="Resume an earlier, interrupted or partly failed run of the same sweep, skipping the services it already completed",
+    ),
+]
+
+
+def _validate_namespace_pattern(pattern: str) -> str:
+    try:
+        re.compile(pattern)
+    except re.error as e:
+        raise typer.BadParameter(f"Invalid regular expression: {e}") from e
+    return pattern
+
+
+namespace_pattern_option = Annotated[
+    str,
+    typer.Option(
+        "--namespace-pattern",
+        callback=_validate_namespace_pattern,
+        help="A regular expression that namespaces must match (from the start of their name) when the namespace is set to 'all'.",
+    ),
+]
+inventory_option = Annotated[
+    Inventory,
+    typer.Option(
+        "--inventory",
+        case_sensitive=False,
+        help="How to discover services. `secrets` decodes all helm release secrets in a single query instead of querying helm per release.",
+    ),
+]
+
+# Guards against more than one in-flight mutation of the same helm release
+_release_locks: dict[tuple[str, str], threading.Lock] = {}
+_release_locks_guard = threading.Lock()
 
 
 @app.command()
@@ -90,7 +264,7 @@ def add_chart_repos(
     }
 
     for name, url in chart_repos.items():
-        res = run(f"helm repo add {name} {url}", verbose=verbose)
+        res = run(["helm", "repo", "add", name, url], verbose=verbose)
         if res.returncode != 0:
             print_err(res.stderr)
 
@@ -100,9 +274,9 @@ def doctor() -> None:
     """Check if required tooling and environment is ok."""
     try:
         _assert_successful_command(
-            "which kubectl", "kubectl is not installed", "kubectl"
+            ["kubectl", "version", "--client"], "kubectl is not installed", "kubectl"
         )
-        _assert_successful_command("which helm", "helm is not installed", "helm")
+        _assert_successful_command(["helm", "version"], "helm is not installed", "helm")
     except ValueError as e:
         rich_print(red(e))
 
@@ -117,7 +291,7 @@ def list_services(
 ) -> None:
     """List all services in the specified namespace."""
     _validate_env(env)
-    res = run(f"helm list --namespace {namespace}", verbose=verbose)
+    res = run(["helm", "list", "--namespace", namespace], verbose=verbose)
     rich_print(res.stdout)
 
 
@@ -143,15 +317,20 @@ def suspend_service(
     namespace: namespace_option,
     dryrun: dryrun_option = False,
     verbose: verbose_option = False,
+    no_cache: no_cache_option = False,
+    mode: mode_option = SuspendMode.helm,
 ) -> None:
     """Suspend a service in the specified namespace."""
     _validate_env(env)
-    service = _find_service(service_name, namespace, verbose)
+    cache = None if no_cache else inventory.InventoryCache.for_env(env.value)
+    service = _find_service(service_name, namespace, verbose, cache=cache)
+    if cache:
+        cache.save()
     if not service:
         print_err(f"Service {service_name} not found in namespace {namespace}")
         raise typer.Exit(code=1)
     else:
-        _suspend(service, dryrun, verbose)
+        _suspend(service, dryrun, verbose, mode)
 
 
 @app.command()
@@ -161,12 +340,32 @@ def kill_services(
     namespace: namespace_option,
     dryrun: dryrun_option = False,
     verbose: verbose_option = False,
+    parallel: parallel_option = 1,
+    inventory_backend: inventory_option = Inventory.helm,
+    namespace_pattern: namespace_pattern_option = DEFAULT_NAMESPACE_PATTERN,
+    deadline_seconds: deadline_option = None,
+    output: output_option = OutputFormat.text,
+    adaptive: adaptive_option = False,
+    resume: resume_option = False,
 ) -> None:
     """Kill all services in the specified namespace.
 
     If the namespace is set to 'all', all user namespaces will be affected.
     """
-    _process_services(env, namespace, OperationType.kill, dryrun, verbose)
+    _process_services(
+        env,
+        namespace,
+        OperationType.kill,
+        dryrun,
+        verbose,
+        parallel,
+        inventory_backend,
+        namespace_pattern,
+        deadline_seconds,
+        output=output,
+        adaptive=adaptive,
+        resume=resume,
+    )
 
 
 @app.command()
@@ -176,13 +375,37 @@ def suspend_services(
     namespace: namespace_option,
     dryrun: dryrun_option = False,
     verbose: verbose_option = False,
+    parallel: parallel_option = 1,
+    inventory_backend: inventory_option = Inventory.helm,
+    namespace_pattern: namespace_pattern_option = DEFAULT_NAMESPACE_PATTERN,
+    deadline_seconds: deadline_option = None,
+    output: output_option = OutputFormat.text,
+    no_cache: no_cache_option = False,
+    adaptive: adaptive_option = False,
+    mode: mode_option = SuspendMode.helm,
+    resume: resume_option = False,
 ) -> None:
     """Suspend user services.
 
     All services in the specified namespace will be suspended or unsuspended. If the namespace is set to 'all', all
     user namespaces will be affected.
     """
-    _process_services(env, namespace, OperationType.suspend, dryrun, verbose)
+    _process_services(
+        env,
+        namespace,
+        OperationType.suspend,
+        dryrun,
+        verbose,
+        parallel,
+        inventory_backend,
+        namespace_pattern,
+        deadline_seconds,
+        no_cache,
+        output=output,
+        adaptive=adaptive,
+        mode=mode,
+        resume=resume,
+    )
 
 
 @app.command()
@@ -192,13 +415,37 @@ def unsuspend_services(
     namespace: namespace_option,
     dryrun: dryrun_option = False,
     verbose: verbose_option = False,
+    parallel: parallel_option = 1,
+    inventory_backend: inventory_option = Inventory.helm,
+    namespace_pattern: namespace_pattern_option = DEFAULT_NAMESPACE_PATTERN,
+    deadline_seconds: deadline_option = None,
+    output: output_option = OutputFormat.text,
+    no_cache: no_cache_option = False,
+    adaptive: adaptive_option = False,
+    mode: mode_option = SuspendMode.helm,
+    resume: resume_option = False,
 ) -> None:
     """Unsuspend user services.
 
     All services in the specified namespace will be unsuspended. If the namespace is set to 'all', all user namespaces
     will be affected.
     """
-    _process_services(env, namespace, OperationType.unsuspend, dryrun, verbose)
+    _process_services(
+        env,
+        namespace,
+        OperationType.unsuspend,
+        dryrun,
+        verbose,
+        parallel,
+        inventory_backend,
+        namespace_pattern,
+        deadline_seconds,
+        no_cache,
+        output=output,
+        adaptive=adaptive,
+        mode=mode,
+        resume=resume,
+    )
 
 
 @app.command()
@@ -208,13 +455,182 @@ def prune_services(
     namespace: namespace_option,
     dryrun: dryrun_option = False,
     verbose: verbose_option = False,
+    parallel: parallel_option = 1,
+    inventory_backend: inventory_option = Inventory.helm,
+    namespace_pattern: namespace_pattern_option = DEFAULT_NAMESPACE_PATTERN,
+    deadline_seconds: deadline_option = None,
+    output: output_option = OutputFormat.text,
+    no_cache: no_cache_option = False,
+    adaptive: adaptive_option = False,
+    resume: resume_option = False,
 ) -> None:
     """Prune services."""
-    _process_services(env, namespace, OperationType.prune, dryrun, verbose)
+    _process_services(
+        env,
+        namespace,
+        OperationType.prune,
+        dryrun,
+        verbose,
+        parallel,
+        inventory_backend,
+        namespace_pattern,
+        deadline_seconds,
+        no_cache,
+        output=output,
+        adaptive=adaptive,
+        resume=resume,
+    )
+
+
+@app.command()
+def plan_prune(
+    env: env_option,
+    namespace: namespace_option,
+    plan_file: Annotated[
+        Path,
+        typer.Option("--plan", help="The file to write the plan to, or - for stdout"),
+    ] = Path("-"),
+    verbose: verbose_option = False,
+    parallel: parallel_option = 1,
+    inventory_backend: inventory_option = Inventory.helm,
+    namespace_pattern: namespace_pattern_option = DEFAULT_NAMESPACE_PATTERN,
+    no_cache: no_cache_option = False,
+) -> None:
+    """Plan how services would be pruned, without mutating any state.
+
+    The plan lists every service with the operation chosen for it, the reason why, and the helm release revision the
+    decision was based on. Review it, and execute it with `dp lab apply`.
+    """
+    _validate_env(env)
+    cache = None if no_cache else inventory.InventoryCache.for_env(env.value)
+    entries = []
+
+    with ThreadPoolExecutor(max_workers=parallel) as pool, cancel_on_interrupt(pool):
+        namespaces, discovered = _discover_services(
+            pool, namespace, verbose, True, inventory_backend, namespace_pattern, cache
+        )
+        for _, services, _ in discovered:
+            for service in services:
+                operation, reason = _plan_prune(service)
+                entries.append(
+                    PlanEntry(
+                        service=service,
+                        operation=operation,
+                        reason=reason,
+                        revision=service.revision,
+                    )
+                )
+
+    if cache:
+        cache.save()
+
+    plan = Plan(
+        env=env,
+        namespace=namespace,
+        namespace_pattern=namespace_pattern,
+        created=datetime.now(timezone.utc),
+        entries=sorted(entries, key=lambda e: (e.service.namespace, e.service.name)),
+    )
+    if str(plan_file) == "-":
+        print(plan.model_dump_json(indent=2))
+    else:
+        plan_file.write_text(plan.model_dump_json(indent=2))
+
+    planned_count = len([e for e in entries if e.operation])
+    err.print(
+        f"Planned {planned_count} operations for {len(entries)} services from {len(namespaces)} namespaces"
+    )
+
+
+@app.command()
+@dryrunnable
+def apply(
+    plan_file: Annotated[
+        Path, typer.Argument(help="A plan, as written by `dp lab plan-prune`")
+    ],
+    env: env_option,
+    dryrun: dryrun_option = False,
+    verbose: verbose_option = False,
+    parallel: parallel_option = 1,
+    deadline_seconds: deadline_option = None,
+    output: output_option = OutputFormat.text,
+    adaptive: adaptive_option = False,
+) -> None:
+    """Apply a previously made plan.
+
+    Services whose helm release has changed since the plan was made are skipped, since the planned operation might no
+    longer be appropriate. Checking this costs a single listing of helm releases, instead of a full discovery.
+    """
+    plan = Plan.model_validate_json(plan_file.read_text())
+    if plan.env != env:
+        print_err(f"The plan was made for {plan.env.value}, not {env.value}")
+        raise typer.Exit(code=1)
+    _validate_env(env)
+
+    revisions = _list_revisions(plan.namespace, plan.namespace_pattern, verbose)
+    outcomes = dict.fromkeys(Outcome, 0)
+    outdated_count = 0
+    concurrency = limiter.AdaptiveLimiter(maximum=parallel) if adaptive else None
+
+    with (
+        reporter(output, "Apply plan") as report,
+        deadline(deadline_seconds),
+        limiter.limiting(concurrency),
+        ThreadPoolExecutor(max_workers=parallel) as pool,
+        cancel_on_interrupt(pool),
+    ):
+        entries = [e for e in plan.entries if e.operation is not None]
+        report.discovered(plan.namespace, len(entries), 0)
+
+        actions = []
+        for entry in entries:
+            service = entry.service
+            operation = cast(OperationType, entry.operation)
+            if revisions.get((service.namespace, service.name)) != entry.revision:
+                report.skipped(
+                    service.namespace,
+                    service.name,
+                    operation.value,
+                    f"Skipping service {service.name} in namespace {service.namespace} as it has changed since the plan was made",
+                )
+                outdated_count += 1
+                continue
+
+            report.planned(service.namespace, service.name, operation.value)
+            actions.append(
+                pool.submit(
+                    _process_service, service, operation, dryrun, verbose, report
+                )
+            )
+
+        for action in as_completed(actions):
+            outcomes[action.result()] += 1
+
+    outcomes[Outcome.skipped] += outdated_count
+    _summarize(
+        report,
+        f"Applied {_describe_outcomes(outcomes)}, of which {outdated_count} had changed since the plan was made",
+        concurrency,
+        **_count_outcomes(outcomes),
+        outdated=outdated_count,
+    )
 
 
 def _process_services(
-    env: Env, namespace: str, operation: OperationType, dryrun: bool, verbose: bool
+    env: Env,
+    namespace: str,
+    operation: OperationType,
+    dryrun: bool,
+    verbose: bool,
+    parallel: int = 1,
+    inventory_backend: Inventory = Inventory.helm,
+    namespace_pattern: str = DEFAULT_NAMESPACE_PATTERN,
+    deadline_seconds: float | None = None,
+    no_cache: bool = False,
+    output: OutputFormat = OutputFormat.text,
+    adaptive: bool = False,
+    mode: SuspendMode = SuspendMode.helm,
+    resume: bool = False,
 ) -> None:
     """Process user services.
 
@@ -222,62 +638,380 @@ def _process_services(
     The supplied operation type determines what action to take.
 
     All services in the specified namespace will be processed. If the namespace is set to 'all', all
-    user namespaces will be affected.
+    namespaces matching the namespace pattern will be affected. Their releases are listed with a single
+    `helm list --all-namespaces` call and grouped by namespace.
+
+    Discovery and actions are dispatched to a pool of `parallel` workers, so that a single slow namespace or
+    helm release does not hold up the rest of the sweep. Counting happens on the calling thread only. If a deadline is
+    given, commands still running when it passes are killed, and commands not yet started are not run at all.
+
+    Unless disabled, details of services whose helm release revision is unchanged since the previous run are taken
+    from the inventory cache instead of being fetched with helm again.
+
+    Progress is reported as it happens, either as a live progress view or as a stream of JSON lines.
+
+    Services are suspended and unsuspended according to the mode, see `_suspend` and `_unsuspend`.
+
+    If adaptive, the number of concurrent helm upgrades and deletes starts at one and adapts to how well the API server
+    copes, up to `parallel`. See `limiter.AdaptiveLimiter`.
+
+    With the `secrets` inventory backend, all services are discovered up front with a single query.
+
+    Operations that fail transiently, e.g. because another helm operation on the same release is in progress, are
+    retried with exponential backoff. Every completed operation is recorded in a journal of the sweep, which is kept
+    if any operation failed. If resuming, services the journal records as completed are not processed again.
     """
     _validate_env(env)
-    processed_count = 0
-    skipped_count = 0
-    namespaces = _get_all_user_namespaces() if namespace == "all" else [namespace]
-
-    for ns in namespaces:
-        # We don't need detailed info such as history for kill operations
-        comprehensive_search = operation not in [OperationType.kill]
-        services = _find_services(ns, verbose, comprehensive=comprehensive_search)
-        if not services:
-            logger.info(f"No services found in {ns} namespace")
-
-        for service in services:
-            try:
-                action = _actions(service, dryrun, verbose)[operation]
-                res = action()
-                if res.returncode != 0:
-                    skipped_count += 1
-                    rich_print(
-                        red(
-                            f"Error: Could not {operation.value} service {service.name} in namespace {ns}. {res.stderr}"
-                        )
+    outcomes = dict.fromkeys(Outcome, 0)
+    resumed_count = 0
+    # We don't need detailed info such as history for kill operations
+    comprehensive_search = operation not in [OperationType.kill]
+    cache = (
+        inventory.InventoryCache.for_env(env.value)
+        if comprehensive_search and not no_cache
+        else None
+    )
+    concurrency = limiter.AdaptiveLimiter(maximum=parallel) if adaptive else None
+    # A dry run completes nothing, so it neither resumes nor records a sweep
+    journal = (
+        None
+        if dryrun
+        else Journal.for_sweep(
+            sweep_id(env.value, operation.value, namespace, namespace_pattern), resume
+        )
+    )
+
+    with (
+        reporter(output, f"{operation.value.capitalize()} services") as report,
+        deadline(deadline_seconds),
+        limiter.limiting(concurrency),
+        ThreadPoolExecutor(max_workers=parallel) as pool,
+        cancel_on_interrupt(pool),
+    ):
+        namespaces, discovered = _discover_services(
+            pool,
+            namespace,
+            verbose,
+            comprehensive_search,
+            inventory_backend,
+            namespace_pattern,
+            cache,
+        )
+
+        actions = []
+        for ns, services, duration in discovered:
+            report.discovered(ns, len(services), duration)
+            if not services:
+                logger.info(f"No services found in {ns} namespace")
+
+            for service in services:
+                if journal and journal.done(service.namespace, service.name):
+                    logger.info(
+                        f"Skipping {service.name} in namespace {service.namespace} as it was completed by an earlier run"
                     )
-                else:
-                    processed_count += 1
+                    resumed_count += 1
+                    continue
+                report.planned(service.namespace, service.name, operation.value)
+                actions.append(
+                    pool.submit(
+                        _process_service,
+                        service,
+                        operation,
+                        dryrun,
+                        verbose,
+                        report,
+                        mode,
+                        journal,
+                    )
+                )
+
+        for action in as_completed(actions):
+            outcomes[action.result()] += 1
+
+    if cache:
+        cache.save()
+    if journal:
+        journal.close(failed=outcomes[Outcome.failed])
+
+    message = f"{_conjugate(operation, capitalize=True)} {_describe_outcomes(outcomes)} from {len(namespaces)} namespaces"
+    if resumed_count:
+        message += f". {resumed_count} services were completed by an earlier run"
+    elif journal and outcomes[Outcome.failed]:
+        message += ". Run again with --resume to retry the failed services only"
+    _summarize(
+        report,
+        message,
+        concurrency,
+        **_count_outcomes(outcomes),
+        resumed=resumed_count,
+        namespaces=len(namespaces),
+    )
+
+
+def _describe_outcomes(outcomes: dict[Outcome, int]) -> str:
+    """Describe how many operations succeeded, failed and were skipped, e.g. for a summary."""
+    processed = outcomes[Outcome.processed] + outcomes[Outcome.retried]
+    retried = (
+        f" ({outcomes[Outcome.retried]} after retrying)"
+        if outcomes[Outcome.retried]
+        else ""
+    )
+    total = sum(outcomes.values())
+    return f"{processed} services{retried}, failed {outcomes[Outcome.failed]}, skipped {outcomes[Outcome.skipped]} (total: {total})"
+
+
+def _count_outcomes(outcomes: dict[Outcome, int]) -> dict[str, int]:
+    """Count outcomes for a summary event. Services processed after retrying count as processed too."""
+    return {
+        "processed": outcomes[Outcome.processed] + outcomes[Outcome.retried],
+        "retried": outcomes[Outcome.retried],
+        "failed": outcomes[Outcome.failed],
+        "skipped": outcomes[Outcome.skipped],
+    }
+
+
+def _summarize(
+    report: Reporter,
+    message: str,
+    concurrency: limiter.AdaptiveLimiter | None,
+    **counts: int,
+) -> None:
+    """Report the outcome of an operation, including how the concurrency limit adapted if it was adaptive."""
+    if concurrency:
+        message += f". Concurrency limit: {concurrency.limit:.0f} (ranged from {concurrency.lowest:.0f} to {concurrency.highest:.0f})"
+        counts["concurrency_limit"] = int(concurrency.limit)
+        counts["concurrency_limit_lowest"] = int(concurrency.lowest)
+        counts["concurrency_limit_highest"] = int(concurrency.highest)
+    report.summary(message, **counts)
+
+
+def _discover_services(
+    pool: ThreadPoolExecutor,
+    namespace: str,
+    verbose: bool,
+    comprehensive: bool,
+    inventory_backend: Inventory,
+    namespace_pattern: str,
+    cache: inventory.InventoryCache | None,
+) -> tuple[list[str], Iterator[tuple[str, list[Service], float]]]:
+    """Discover the services of a namespace, or of all matching namespaces if the namespace is 'all'.
+
+    Services are described on the worker pool, namespace by namespace.
 
+    A namespace whose services could not be found, e.g. because the deadline passed, is reported and skipped. If the
+    services of all namespaces are listed up front and that fails, the command exits.
+
+    Returns:
+        The namespaces to be searched, and an iterator over the services found in each namespace and how many
+        seconds it took to find them, in order of completion.
+
+    Raises:
+        Exit: If the services could not be listed up front.
+    """
+    if inventory_backend == Inventory.secrets:
+        start = time.monotonic()
+        services_by_namespace = _exit_on_error(
+            _find_services_from_release_secrets, namespace, verbose, namespace_pattern
+        )
+        duration = time.monotonic() - start
+        return list(services_by_namespace), (
+            (ns, services, duration) for ns, services in services_by_namespace.items()
+        )
+
+    if namespace == "all":
+        releases_by_namespace = _exit_on_error(
+            _list_releases_in_all_namespaces, namespace_pattern, verbose
+        )
+        # Workloads are listed once for the whole cluster, like the releases
+        scaled_down = _scaled_down_releases(None, verbose) if comprehensive else {}
+        discoveries = {
+            pool.submit(
+                _timed,
+                _describe_releases,
+                releases,
+                verbose,
+                comprehensive,
+                cache,
+                scaled_down,
+            ): ns
+            for ns, releases in releases_by_namespace.items()
+        }
+    else:
+        discoveries = {
+            pool.submit(
+                _timed, _find_services, namespace, verbose, comprehensive, cache
+            ): namespace
+        }
+
+    def discovered() -> Iterator[tuple[str, list[Service], float]]:
+        for discovery in as_completed(discoveries):
+            ns = discoveries[discovery]
+            try:
+                services, duration = discovery.result()
             except ValueError as e:
-                rich_print(red(f"{e}. Skipping this service."))
-                skipped_count += 1
+                print_err(f"{e}. Skipping namespace {ns}.")
                 continue
+            yield ns, services, duration
+
+    return list(discoveries.values()), discovered()
+
+
+def _exit_on_error(list_services: Callable[..., _T], *args: Any, **kwargs: Any) -> _T:
+    """List services up front, exiting if they could not be listed, as there is nothing to continue with."""
+    try:
+        return list_services(*args, **kwargs)
+    except ValueError as e:
+        print_err(e)
+        raise typer.Exit(code=1) from e
+
+
+def _timed(
+    find: Callable[..., list[Service]], *args: Any
+) -> tuple[list[Service], float]:
+    """Find services, and measure how many seconds it took."""
+    start = time.monotonic()
+    with tracing.span("discover services", "discovery"):
+        services = find(*args)
+    return services, time.monotonic() - start
+
+
+def _process_service(
+    service: Service,
+    operation: OperationType,
+    dryrun: bool,
+    verbose: bool,
+    report: Reporter,
+    mode: SuspendMode = SuspendMode.helm,
+    journal: Journal | None = None,
+) -> Outcome:
+    """Perform an operation on a single service, retrying it if it fails transiently.
+
+    Transient failures are retried up to `RETRY_ATTEMPTS` times, after a randomized delay that grows exponentially
+    ("full jitter"), so that workers colliding on a busy release or API server do not retry in lockstep.
+
+    Returns:
+        The outcome of the operation, which is also recorded in the journal if one is given.
+    """
+    outcome = _attempt(service, operation, dryrun, verbose, report, mode)
+    if journal:
+        journal.record(service.namespace, service.name, operation.value, outcome)
+    return outcome
+
+
+def _attempt(
+    service: Service,
+    operation: OperationType,
+    dryrun: bool,
+    verbose: bool,
+    report: Reporter,
+    mode: SuspendMode,
+) -> Outcome:
+    report.started(service.namespace, service.name, operation.value)
+    start = time.monotonic()
+    attempt = 0
+    try:
+        action = _actions(service, dryrun, verbose, mode)[operation]
+        while True:
+            with (
+                _release_lock(service),
+                tracing.span(
+                    f"{operation.value} {service.namespace}/{service.name}",
+                    "operation",
+                    attempt=attempt,
+                ) as span,
+            ):
+                res = action()
+                span["returncode"] = res.returncode
+            if attempt == RETRY_ATTEMPTS or not _is_transient(res):
+                break
+
+            attempt += 1
+            delay = random.uniform(
+                0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF * 2 ** (attempt - 1))
+            )
+            report.retrying(
+                service.namespace,
+                service.name,
+                operation.value,
+                attempt,
+                delay,
+                res.stderr,
+            )
+            if not sleep(delay):
+                break
+    except ValueError as e:
+        report.skipped(
+            service.namespace,
+            service.name,
+            operation.value,
+            f"{e}. Skipping this service.",
+        )
+        return Outcome.skipped
+
+    if res.returncode != 0:
+        report.failed(
+            service.namespace,
+            service.name,
+            operation.value,
+            time.monotonic() - start,
+            f"Error: Could not {operation.value} service {service.name} in namespace {service.namespace}. {res.stderr}",
+        )
+        return Outcome.failed
 
-    rich_print(
-        f"{_conjugate(operation, capitalize=True)} {processed_count} services, skipped {skipped_count} (total: {processed_count+skipped_count}) from {len(namespaces)} namespaces"
+    report.finished(
+        service.namespace, service.name, operation.value, time.monotonic() - start
     )
+    return Outcome.retried if attempt else Outcome.processed
+
+
+def _is_transient(res: RunResult) -> bool:
+    """Return whether a command failed in a way that is likely to go away when retried.
+
+    Commands killed at the deadline, or cancelled, are never retried.
+    """
+    if res.returncode in (0, CANCELLED_RETURNCODE) or isinstance(res, RunTimeout):
+        return False
+    return TRANSIENT_ERRORS.search(res.stderr) is not None
+
+
+def _release_lock(service: Service) -> threading.Lock:
+    """Return the lock that serializes mutations of the helm release backing a service."""
+    with _release_locks_guard:
+        return _release_locks.setdefault(
+            (service.namespace, service.name), threading.Lock()
+        )
 
 
 def _actions(
-    service: Service, dryrun: bool, verbose: bool
+    service: Service, dryrun: bool, verbose: bool, mode: SuspendMode
 ) -> dict[OperationType, Callable[[], RunResult]]:
     return {
-        OperationType.suspend: lambda: _suspend(service, dryrun, verbose),
-        OperationType.unsuspend: lambda: _unsuspend(service, dryrun, verbose),
+        OperationType.suspend: lambda: _suspend(service, dryrun, verbose, mode),
+        OperationType.unsuspend: lambda: _unsuspend(service, dryrun, verbose, mode),
         OperationType.kill: lambda: _kill(service, dryrun, verbose),
         OperationType.prune: lambda: _prune(service, dryrun, verbose),
     }
 
 
-def _suspend(service: Service, dryrun: bool, verbose: bool) -> RunResult:
+def _suspend(
+    service: Service,
+    dryrun: bool,
+    verbose: bool,
+    mode: SuspendMode = SuspendMode.helm,
+) -> RunResult:
+    """Suspend a service, either by upgrading its helm release, or by scaling its workloads to zero replicas."""
     logger.info(f"Suspend {service.name} in namespace {service.namespace}")
-    chart_name = _determine_chart_name(service.name)
 
-    if not service.suspended:
-        return run(
-            f"helm upgrade {service.name} {chart_name} --namespace {service.namespace} --reuse-values --set global.suspend=True --version {service.chart_version} --history-max 0 --timeout 10m",
+    if not service.suspended and mode == SuspendMode.scale:
+        return _limited(
+            lambda: workloads.scale_down(
+                service.namespace, service.name, dryrun, verbose
+            )
+        )
+    elif not service.suspended:
+        chart_name = _determine_chart_name(service.name)
+        return _mutate(
+            _upgrade_command(service, chart_name, suspend=True),
             dryrun=dryrun,
             verbose=verbose,
         )
@@ -288,16 +1022,37 @@ def _suspend(service: Service, dryrun: bool, verbose: bool) -> RunResult:
         return RunResult(stdout="Not suspended", stderr="", returncode=0)
 
 
-def _unsuspend(service: Service, dryrun: bool, verbose: bool) -> RunResult:
+def _unsuspend(
+    service: Service,
+    dryrun: bool,
+    verbose: bool,
+    mode: SuspendMode = SuspendMode.helm,
+) -> RunResult:
+    """Unsuspend a service.
+
+    A service that was suspended by scaling down its workloads is scaled up again, restoring the recorded replica
+    counts. A service that was suspended through its helm release is unsuspended through its helm release, and in
+    scale mode, any replica counts recorded by an earlier scale down are then discarded, since helm has already scaled
+    the workloads up. Other services are only scaled up in scale mode, in case their workloads could not be listed.
+    """
     logger.info(f"Unsuspend {service.name} in namespace {service.namespace}")
-    chart_name = _determine_chart_name(service.name)
 
-    if service.suspended:
-        return run(
-            f"helm upgrade {service.name} {chart_name} --namespace {service.namespace} --reuse-values --set global.suspend=False --version {service.chart_version} --history-max 0 --timeout 10m",
+    if service.scaled_down or (not service.suspended and mode == SuspendMode.scale):
+        return _limited(
+            lambda: workloads.scale_up(service.namespace, service.name, dryrun, verbose)
+        )
+    elif service.suspended:
+        chart_name = _determine_chart_name(service.name)
+        res = _mutate(
+            _upgrade_command(service, chart_name, suspend=False),
             dryrun=dryrun,
             verbose=verbose,
         )
+        if res.returncode != 0 or mode != SuspendMode.scale:
+            return res
+        return workloads.clear_annotations(
+            service.namespace, service.name, dryrun, verbose
+        )
     else:
         logger.info(
             f"Ignoring {service.name} in namespace {service.namespace} as it is not suspended"
@@ -307,13 +1062,46 @@ def _unsuspend(service: Service, dryrun: bool, verbose: bool) -> RunResult:
 
 def _kill(service: Service, dryrun: bool, verbose: bool) -> RunResult:
     logger.info(f"Kill service {service.name} in namespace {service.namespace}")
-    return run(
-        f"helm delete {service.name} --namespace {service.namespace}",
+    return _mutate(
+        ["helm", "delete", service.name, "--namespace", service.namespace],
         dryrun=dryrun,
         verbose=verbose,
     )
 
 
+def _upgrade_command(service: Service, chart_name: str, suspend: bool) -> list[str]:
+    return [
+        "helm",
+        "upgrade",
+        service.name,
+        chart_name,
+        "--namespace",
+        service.namespace,
+        "--reuse-values",
+        "--set",
+        f"global.suspend={suspend}",
+        "--version",
+        str(service.chart_version),
+        "--history-max",
+        "0",
+        "--timeout",
+        "10m",
+    ]
+
+
+def _mutate(command: list[str], dryrun: bool, verbose: bool) -> RunResult:
+    """Run a helm command that mutates a release, within the concurrency limit of the sweep (if any)."""
+    return _limited(lambda: run(command, dryrun=dryrun, verbose=verbose))
+
+
+def _limited(mutation: Callable[[], RunResult]) -> RunResult:
+    """Mutate a release within the concurrency limit of the sweep (if any)."""
+    with limiter.slot() as call:
+        res = mutation()
+        call.failed = res.returncode != 0
+    return res
+
+
 def _prune(
     service: Service,
     dryrun: bool,
@@ -324,38 +1112,67 @@ def _prune(
 ) -> RunResult:
     """Prune services based on a time threshold.
 
+    See `_plan_prune` for the rules that decide whether a service is killed, suspended or left alone.
+    """
+    operation, reason = _plan_prune(
+        service, kill_threshold, kill_suspended_threshold, suspend_threshold
+    )
+    if operation == OperationType.kill:
+        logger.info(
+            f"Service {service.name} in namespace {service.namespace} {reason}. Terminating..."
+        )
+        return _kill(service, dryrun, verbose)
+
+    elif operation == OperationType.suspend:
+        return _suspend(service, dryrun, verbose)
+
+    else:
+        logger.info(
+            f"Ignoring service {service.name} in namespace {service.namespace} as it {reason}"
+        )
+        return RunResult(stdout="Ignored", stderr="", returncode=0)
+
+
+def _plan_prune(
+    service: Service,
+    kill_threshold: int = 168,
+    kill_suspended_threshold: int = 48,
+    suspend_threshold: int = 0,
+) -> tuple[OperationType | None, str]:
+    """Decide how to prune a service based on a time threshold.
+
     * Kill a service if it has been running for more than kill_threshold hours (defaults to 1 week).
     * Kill a service if it has been suspended for more than kill_suspended_threshold hours (defaults to 2 days).
     * Kill a service if its status is failed.
     * Suspend a service if it has not been updated in the last suspend_threshold hours (defaults to immediately).
+
+    Returns:
+        The operation to perform, or None if the service should be left alone, and the reason why.
     """
     hours_since_started = hours_since(service.created) if service.created else 0
     hours_since_updated = hours_since(service.updated) if service.updated else 0
+    # Scaling down leaves the helm release untouched, so its update time is not when the service was suspended
+    suspended_at = (
+        service.suspended_at if service.scaled_down and service.suspended_at else None
+    )
+    hours_since_suspended = (
+        hours_since(suspended_at) if suspended_at else hours_since_updated
+    )
     if service.status == "failed":
-        logger.info(
-            f"Service {service.name} in namespace {service.namespace} has status failed. Terminating..."
-        )
-        return _kill(service, dryrun, verbose)
+        return OperationType.kill, "has status failed"
 
     if hours_since_started >= kill_threshold:
-        logger.info(
-            f"Service {service.name} in namespace {service.namespace} was started {hours_since_started} hours ago. Terminating..."
-        )
-        return _kill(service, dryrun, verbose)
-    elif service.suspended and hours_since_updated >= kill_suspended_threshold:
-        logger.info(
-            f"Service {service.name} in namespace {service.namespace} was suspended {hours_since_updated} hours ago. Terminating..."
-        )
-        return _kill(service, dryrun, verbose)
+        return OperationType.kill, f"was started {hours_since_started} hours ago"
+    elif service.suspended and hours_since_suspended >= kill_suspended_threshold:
+        return OperationType.kill, f"was suspended {hours_since_suspended} hours ago"
 
     elif hours_since_updated >= suspend_threshold:
-        return _suspend(service, dryrun, verbose)
+        if service.suspended:
+            return None, "has already been suspended"
+        return OperationType.suspend, f"was updated {hours_since_updated} hours ago"
 
     else:
-        logger.info(
-            f"Ignoring service {service.name} in namespace {service.namespace} as it was updated less than {suspend_threshold} hours ago"
-        )
-        return RunResult(stdout="Ignored", stderr="", returncode=0)
+        return None, f"was updated less than {suspend_threshold} hours ago"
 
 
 def _validate_env(env: Env) -> None:
@@ -374,18 +1191,12 @@ def _validate_env(env: Env) -> None:
         raise typer.Exit(code=1)
 
 
-def _get_all_user_namespaces() -> list[str]:
-    res = run(
-        "kubectl get namespaces --no-headers -o custom-columns=':metadata.name' | grep '^user-'"
-    )
-    return res.stdout.strip().split("\n")
-
-
 def _find_service(
     service_name: str,
     namespace: str = "all",
     verbose: bool = False,
     comprehensive: bool = True,
+    cache: inventory.InventoryCache | None = None,
 ) -> Service | None:
     """Find a specific service by name.
 
@@ -394,11 +1205,17 @@ def _find_service(
         namespace: The namespace to search in. Defaults to 'all' if not specified.
         verbose: If True, prints executed commands to stdout.
         comprehensive: If True, also fetches helm history and additional values.
+        cache: If given, reuse cached details of services whose helm release is unchanged.
 
     Returns:
         The service if found, otherwise None.
+
+    Raises:
+        Exit: If the services of the namespace could not be listed.
     """
-    for service in _find_services(namespace, verbose, comprehensive):
+    for service in _exit_on_error(
+        _find_services, namespace, verbose, comprehensive, cache
+    ):
         if service.name == service_name:
             return cast(Service, service)
 
@@ -407,63 +1224,278 @@ def _find_service(
 
 @ensure_helm_repos_updated
 def _find_services(
-    namespace: str, verbose: bool, comprehensive: bool = True
+    namespace: str,
+    verbose: bool,
+    comprehensive: bool = True,
+    cache: inventory.InventoryCache | None = None,
 ) -> list[Service]:
     """Find Dapla Lab user services in the specified namespace.
 
     :param namespace: the k8s namespace to search for services in
     :param verbose: if True, prints executed commands to stdout
     :param comprehensive: if True, fetches history and values for each service
+    :param cache: if given, reuse cached details of services whose helm release is unchanged
     :return: a list of Service objects
+    :raises ValueError: if the releases or their details could not be listed
     """
     res = run(
-        f"helm list --namespace {namespace} --time-format {dt_format} --output json",
+        [
+            "helm",
+            "list",
+            "--namespace",
+            namespace,
+            "--time-format",
+            dt_format,
+            "--output",
+            "json",
+        ],
         verbose=verbose,
     )
-    helm_releases: list[dict[str, Any]] = json.loads(res.stdout)
+    helm_releases: list[dict[str, Any]] = _parse_output(
+        res, f"list helm releases in namespace {namespace}"
+    )
+
+    return _describe_releases(helm_releases, verbose, comprehensive, cache)
+
+
+@ensure_helm_repos_updated
+def _list_releases_in_all_namespaces(
+    namespace_pattern: str, verbose: bool
+) -> dict[str, list[dict[str, Any]]]:
+    """List the helm releases of all matching namespaces with a single helm call.
+
+    :param namespace_pattern: a regular expression that namespace names must match from the start
+    :param verbose: if True, prints executed commands to stdout
+    :return: the raw helm releases, grouped by namespace
+    :raises ValueError: if the releases could not be listed
+    """
+    res = run(
+        [
+            "helm",
+            "list",
+            "--all-namespaces",
+            "--max",
+            "0",
+            "--time-format",
+            dt_format,
+            "--output",
+            "json",
+        ],
+        verbose=verbose,
+    )
+    releases_by_namespace: dict[str, list[dict[str, Any]]] = {}
+    for release in _parse_output(res, "list helm releases in all namespaces"):
+        if re.match(namespace_pattern, release["namespace"]):
+            releases_by_namespace.setdefault(release["namespace"], []).append(release)
+
+    return releases_by_namespace
+
+
+def _describe_releases(
+    helm_releases: list[dict[str, Any]],
+    verbose: bool,
+    comprehensive: bool = True,
+    cache: inventory.InventoryCache | None = None,
+    scaled_down: dict[tuple[str, str], datetime | None] | None = None,
+) -> list[Service]:
+    """Turn helm releases, as listed by `helm list`, into services.
 
+    :param helm_releases: the raw helm releases
+    :param verbose: if True, prints executed commands to stdout
+    :param comprehensive: if True, fetches history and values for each service
+    :param cache: if given, reuse cached details of services whose helm release is unchanged
+    :param scaled_down: the releases suspended by scaling down, as found by `_scaled_down_releases`. If not given, the
+        workloads of the namespace of the releases are listed when comprehensive
+    :return: a list of Service objects
+    """
+    services: list[Service] = []
+    if scaled_down is None:
+        scaled_down = (
+            _scaled_down_releases(helm_releases[0]["namespace"], verbose)
+            if comprehensive and helm_releases
+            else {}
+        )
+    uncached = []
     for release in helm_releases:
-        release_name = release["name"]
+        cached = cache.get(release) if cache and comprehensive else None
+        if cached:
+            services.append(_mark_scaled_down(Service(**cached), scaled_down))
+        else:
+            uncached.append(release)
+
+    details = (
+        _get_helm_release_details(uncached, verbose)
+        if comprehensive
+        else [None] * len(uncached)
+    )
+    for release, detail in zip(uncached, details, strict=True):
         version = release.get("chart", "").split("-")[-1]
         release["chart_version"] = version
 
-        if comprehensive:
-            history = _get_helm_release_history(release_name, namespace)
+        if detail:
+            history, values = detail
             release["created"] = history[0]["updated"]
-
-            values = _get_helm_release_values(release_name, namespace)
             release["suspended"] = values.get("global", {}).get("suspend", False)
 
-    services: list[Service] = [Service(**data) for data in helm_releases]
+        service = Service(**release)
+        if cache and comprehensive:
+            cache.put(release, service.model_dump(mode="json"))
+        services.append(_mark_scaled_down(service, scaled_down))
 
     return services
 
 
-def _get_helm_release_values(
-    helm_release_name: str, namespace: str, verbose: bool = False
-) -> dict[str, Any]:
-    res = run(
-        f"helm get values {helm_release_name} --namespace {namespace} --output json",
-        verbose=verbose,
+def _scaled_down_releases(
+    namespace: str | None, verbose: bool
+) -> dict[tuple[str, str], datetime | None]:
+    """Find the releases suspended by scaling down their workloads, or none if the workloads could not be listed.
+
+    Returns:
+        When every scaled down release was suspended, if known, keyed by its namespace and name.
+    """
+    try:
+        return workloads.scaled_down_releases(namespace, verbose)
+    except ValueError as e:
+        logger.warning(f"Could not find services suspended by scaling down: {e}")
+        return {}
+
+
+def _mark_scaled_down(
+    service: Service, scaled_down: dict[tuple[str, str], datetime | None]
+) -> Service:
+    """Mark a service as suspended if its workloads have been scaled down.
+
+    Whether workloads are scaled down is not part of the helm release, so it is not cached with the other details.
+    """
+    key = (service.namespace, service.name)
+    if key not in scaled_down:
+        return service.model_copy(update={"scaled_down": False, "suspended_at": None})
+    return service.model_copy(
+        update={
+            "suspended": True,
+            "scaled_down": True,
+            "suspended_at": scaled_down[key],
+        }
     )
-    values: dict[str, Any] = json.loads(res.stdout)
-    return values
 
 
-def _get_helm_release_history(
-    release_name: str, namespace: str, verbose: bool = False
-) -> list[dict[str, Any]]:
-    res = run(
-        f"helm history {release_name} --namespace {namespace} --output json",
-        verbose=verbose,
+@ensure_helm_repos_updated
+def _find_services_from_release_secrets(
+    namespace: str, verbose: bool, namespace_pattern: str = DEFAULT_NAMESPACE_PATTERN
+) -> dict[str, list[Service]]:
+    """Find Dapla Lab user services by decoding helm release secrets.
+
+    A single query fetches the release secrets of the specified namespace, or of the whole cluster if the namespace
+    is 'all', and every release is decoded in-process. This yields the same details as a comprehensive
+    `_find_services`, without running `helm history` and `helm get values` for every release.
+
+    :param namespace: the k8s namespace to search for services in, or 'all' for all user namespaces
+    :param verbose: if True, prints executed commands to stdout
+    :param namespace_pattern: a regular expression that namespace names must match when the namespace is 'all'
+    :return: the services found, grouped by namespace
+    """
+    secrets = inventory.list_release_secrets(
+        None if namespace == "all" else namespace, verbose=verbose
+    )
+
+    services_by_namespace: dict[str, list[Service]] = (
+        {} if namespace == "all" else {namespace: []}
     )
-    values: list[dict[str, Any]] = json.loads(res.stdout)
-    return values
+    scaled_down = _scaled_down_releases(
+        None if namespace == "all" else namespace, verbose
+    )
+    for release in inventory.releases_from_secrets(secrets, scaled_down):
+        if namespace == "all" and not re.match(namespace_pattern, release["namespace"]):
+            continue
+        services_by_namespace.setdefault(release["namespace"], []).append(
+            Service(**release)
+        )
+
+    return services_by_namespace
+
+
+def _list_revisions(
+    namespace: str, namespace_pattern: str, verbose: bool
+) -> dict[tuple[str, str], str | None]:
+    """Return the current revision of every helm release, keyed by namespace and release name.
+
+    :param namespace: the k8s namespace to list releases in, or 'all' for all matching namespaces
+    :param namespace_pattern: a regular expression that namespace names must match when the namespace is 'all'
+    :param verbose: if True, prints executed commands to stdout
+    :raises Exit: if the releases could not be listed
+    """
+    if namespace == "all":
+        releases_by_namespace = _exit_on_error(
+            _list_releases_in_all_namespaces, namespace_pattern, verbose
+        )
+        services = [
+            service
+            for releases in releases_by_namespace.values()
+            for service in _describe_releases(releases, verbose, comprehensive=False)
+        ]
+    else:
+        services = _exit_on_error(
+            _find_services, namespace, verbose, comprehensive=False
+        )
+
+    return {(service.namespace, service.name): service.revision for service in services}
+
+
+def _get_helm_release_details(
+    releases: list[dict[str, Any]], verbose: bool = False
+) -> list[tuple[list[dict[str, Any]], dict[str, Any]]]:
+    """Fetch the history and values of helm releases, running up to `HELM_READS_PARALLEL` helm commands at once.
+
+    Returns:
+        The history and values of every release, in the same order as the releases.
+
+    Raises:
+        ValueError: If the history or values of a release could not be fetched.
+    """
+    commands = []
+    for release in releases:
+        scope = [release["name"], "--namespace", release["namespace"]]
+        commands.append(["helm", "history", *scope, "--output", "json"])
+        commands.append(["helm", "get", "values", *scope, "--output", "json"])
+
+    results = run_many(commands, HELM_READS_PARALLEL, verbose=verbose)
+    return [
+        (
+            _parse_output(history, f"get the history of {release['name']}"),
+            _parse_output(values, f"get the values of {release['name']}"),
+        )
+        for release, history, values in zip(
+            releases, results[::2], results[1::2], strict=True
+        )
+    ]
+
+
+def _parse_output(res: RunResult, action: str) -> Any:
+    """Parse the JSON output of a helm command.
+
+    Raises:
+        ValueError: If the command failed, e.g. because it was cancelled or the deadline had passed.
+    """
+    if res.returncode != 0:
+        raise ValueError(f"Could not {action}: {res.stderr.strip()}")
+    return json.loads(res.stdout)
 
 
 def _get_current_cluster_name() -> str:
-    res = run("kubectl config view --minify -o jsonpath='{.clusters[0].name}'")
-    return res.stdout
+    try:
+        return kube.current_cluster_name()
+    except kube.KubeUnavailable:
+        res = run(
+            [
+                "kubectl",
+                "config",
+                "view",
+                "--minify",
+                "--output",
+                "jsonpath={.clusters[0].name}",
+            ]
+        )
+        return res.stdout
 
 
 # TODO: We should retrieve the chart name from the release values/annotations instead of guessing.
@@ -488,8 +1520,10 @@ def _determine_chart_name(helm_release_name: str) -> str:
     )
 
 
-def _assert_successful_command(cmd: str, err_msg: str, success_msg: str | None) -> None:
-    res = run(f"eval {cmd} > /dev/null")
+def _assert_successful_command(
+    cmd: list[str], err_msg: str, success_msg: str | None
+) -> None:
+    res = run(cmd)
     if res.returncode != 0:
         err.print(f"❌  {red(err_msg)}")
         raise typer.Exit(code=res.returncode)
@@ -0,0 +1,129 @@
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+# How much slower than the fastest observed call a call may be before it is considered a sign of overload
+LATENCY_TOLERANCE = 2.0
+# The factor the limit is multiplied with when backing off
+BACKOFF_RATIO = 0.5
+# Calls faster than this are never considered slow, however much faster other calls have been
+LATENCY_FLOOR = 0.1
+
+
+class AdaptiveLimiter:
+    """Limits the number of concurrent calls to a shared backend, such as the Kubernetes API server, adaptively.
+
+    The limit follows an additive increase, multiplicative decrease (AIMD) scheme, like TCP congestion control. Every
+    healthy call raises the limit by 1/limit, so the limit grows by one for every `limit` healthy calls. A failed
+    call, or a call that took more than `latency_tolerance` times as long as the fastest successful call so far (and
+    longer than `latency_floor`), halves it.
+
+    Calls that were started before the limit was last lowered do not lower it again, so a burst of failures from the
+    same round of calls only backs off once.
+    """
+
+    def __init__(
+        self,
+        maximum: int,
+        initial: int = 1,
+        minimum: int = 1,
+        latency_tolerance: float = LATENCY_TOLERANCE,
+        backoff_ratio: float = BACKOFF_RATIO,
+        latency_floor: float = LATENCY_FLOOR,
+    ) -> None:
+        """Create a limiter that allows between `minimum` and `maximum` concurrent calls."""
+        self.maximum = maximum
+        self.minimum = minimum
+        self.latency_tolerance = latency_tolerance
+        self.backoff_ratio = backoff_ratio
+        self.latency_floor = latency_floor
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.lowest = self.limit
+        self.highest = self.limit
+        self.in_flight = 0
+        self._fastest: float | None = None
+        self._backed_off_at = 0.0
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def slot(self) -> Iterator["Call"]:
+        """Wait until a call may start, and hold a slot for it for the duration of the context.
+
+        Yields:
+            The call, which must be marked as failed within the context if it did not succeed.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+        call = Call()
+        try:
+            yield call
+        finally:
+            self._complete(call)
+
+    def _complete(self, call: "Call") -> None:
+        duration = time.monotonic() - call.started
+        with self._condition:
+            self.in_flight -= 1
+            slow = self._fastest is not None and duration > max(
+                self._fastest * self.latency_tolerance, self.latency_floor
+            )
+            if not call.failed:
+                self._fastest = min(self._fastest or duration, duration)
+
+            if call.failed or slow:
+                if call.started > self._backed_off_at:
+                    self.limit = max(self.minimum, self.limit * self.backoff_ratio)
+                    self._backed_off_at = time.monotonic()
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+            self.lowest = min(self.lowest, self.limit)
+            self.highest = max(self.highest, self.limit)
+            self._condition.notify_all()
+
+
+class Call:
+    """A call made within a slot of an `AdaptiveLimiter`."""
+
+    def __init__(self) -> None:
+        """Start timing the call."""
+        self.started = time.monotonic()
+        self.failed = False
+
+
+_active: AdaptiveLimiter | None = None
+
+
+@contextmanager
+def limiting(limiter: AdaptiveLimiter | None) -> Iterator[None]:
+    """Limit the concurrency of calls made with `slot` within the context, or leave it unlimited if limiter is None.
+
+    Yields:
+        None
+    """
+    global _active
+    previous = _active
+    _active = limiter
+    try:
+        yield
+    finally:
+        _active = previous
+
+
+@contextmanager
+def slot() -> Iterator[Call]:
+    """Hold a slot of the active limiter, if any, for a call made within the context.
+
+    Yields:
+        The call, which must be marked as failed within the context if it did not succeed.
+    """
+    limiter = _active
+    if limiter is None:
+        yield Call()
+        return
+
+    with limiter.slot() as call:
+        yield call
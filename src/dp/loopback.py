@@ -0,0 +1,88 @@
+import html
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Any
+from urllib.parse import parse_qs, urlsplit
+
+# The path of the redirect URI, on a port chosen by the OS
+CALLBACK_PATH = "/callback"
+
+RESPONSE_PAGE = """<!DOCTYPE html>
+<html><head><title>Dapla CLI</title></head>
+<body><p>{message}</p></body></html>
+"""
+
+
+class RedirectReceiver(HTTPServer):
+    """Receives the redirect of an OAuth 2.0 authorization code flow, on a loopback address of this machine.
+
+    As in RFC 8252, the server listens on 127.0.0.1 on a port chosen by the OS, so the redirect URI needs no fixed port,
+    and can not be received by other machines. The `state` of the redirect must match the state of the authorization
+    request, so a redirect forged by a page in the browser is rejected.
+    """
+
+    def __init__(self, state: str) -> None:
+        """Start listening for a redirect with the given state."""
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.state = state
+        self.code: str | None = None
+        self.error: str | None = None
+
+    @property
+    def redirect_uri(self) -> str:
+        """The URI the authorization server should redirect the browser to."""
+        return f"http://127.0.0.1:{self.server_port}{CALLBACK_PATH}"
+
+    def wait(self, timeout: float) -> str:
+        """Handle requests until the browser is redirected back, and return the authorization code.
+
+        Raises:
+            ValueError: If the authorization failed, or no redirect was received in time.
+        """
+        deadline = time.monotonic() + timeout
+        while self.code is None and self.error is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise ValueError(f"No redirect was received within {timeout:.0f}s")
+            self.timeout = remaining
+            self.handle_request()
+        if self.code is None:
+            raise ValueError(self.error)
+        return self.code
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Records the authorization code or error of the redirect, and tells the user to return to the terminal."""
+
+    server: RedirectReceiver
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        if url.path != CALLBACK_PATH:
+            self.send_error(404)
+            return
+
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if query.get("state") != self.server.state:
+            self._respond(400, "Unexpected login response. Please log in again.")
+            return
+
+        if "error" in query:
+            self.server.error = query.get("error_description") or query["error"]
+            self._respond(400, f"Login failed: {self.server.error}")
+        elif "code" in query:
+            self.server.code = query["code"]
+            self._respond(200, "Logged in. You may close this window.")
+        else:
+            self._respond(400, "No authorization code was received.")
+
+    def _respond(self, status: int, message: str) -> None:
+        body = RESPONSE_PAGE.format(message=html.escape(message)).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt: str, *args: Any) -> None:
+        pass  # Keep the terminal clean, and the authorization code out of it
@@ -1,36 +1,109 @@
+import importlib
+import importlib.metadata
 import logging
-from typing import Annotated
+from pathlib import Path
+from typing import Annotated, Any
 
 import typer
+from typer.core import TyperGroup
 
-from . import auth, lab, team_api
+from . import tracing
 from .annotations import check_version
-from .utils import get_current_version
 
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
-)
+# Sub-commands by name, with the module that defines their Typer app and their help text. A module is only imported
+# once its sub-command is invoked, so that e.g. `dp auth show-access-token` does not pay for importing `dp.lab`.
+SUBCOMMANDS = {
+    "auth": ("dp.auth", "Authenticate dp with Keycloak"),
+    "lab": ("dp.lab", "Interact with Dapla Lab services"),
+    "team-api": ("dp.team_api", "Interact with Dapla Team API"),
+}
 
-app = typer.Typer()
-app.add_typer(auth.app, name="auth", help="Authenticate dp with Keycloak")
-app.add_typer(lab.app, name="lab", help="Interact with Dapla Lab services")
-app.add_typer(team_api.app, name="team-api", help="Interact with Dapla Team API")
+
+class LazyGroup(TyperGroup):
+    """A command group that imports the modules of its sub-commands only when they are invoked.
+
+    Listing the sub-commands in the help text does not import them, since their names and help texts are known up
+    front.
+
+    Click types are not named in signatures, since newer versions of Typer vendor their own copy of click.
+    """
+
+    _listing = False
+
+    def list_commands(self, ctx: Any) -> list[str]:
+        """Return the names of all sub-commands, without importing them."""
+        return [*super().list_commands(ctx), *SUBCOMMANDS]
+
+    def get_command(self, ctx: Any, cmd_name: str) -> Any:
+        """Return a sub-command, importing its module if it is about to be invoked."""
+        if cmd_name not in SUBCOMMANDS:
+            return super().get_command(ctx, cmd_name)
+
+        module_name, help_text = SUBCOMMANDS[cmd_name]
+        if self._listing:
+            return TyperGroup(name=cmd_name, help=help_text)
+
+        module = importlib.import_module(module_name)
+        command = typer.main.get_group(module.app)
+        command.name = cmd_name
+        command.help = help_text
+        return command
+
+    def format_help(self, ctx: Any, formatter: Any) -> None:
+        """Format the help text, listing sub-commands by their placeholders."""
+        self._listing = True
+        try:
+            super().format_help(ctx, formatter)
+        finally:
+            self._listing = False
+
+
+app = typer.Typer(cls=LazyGroup)
 
 
 def version_callback(value: bool) -> None:
     """Print the version."""
     if value:
-        version = get_current_version() or "dev"
+        # Read as is, since parsing it would import packaging, which --version does not need
+        try:
+            version = importlib.metadata.version("dapla-cli")
+        except importlib.metadata.PackageNotFoundError:
+            version = "dev"
         print(f"Dapla CLI {version}")
         raise typer.Exit()
 
 
+def trace_callback(ctx: typer.Context, path: Path | None) -> None:
+    """Trace the invocation, writing the trace to a file once it completes."""
+    if path:
+        tracing.start(path, operation="dp")
+        ctx.call_on_close(tracing.stop)
+
+
 @app.callback()
 @check_version
 def main(
     version: Annotated[
         bool | None, typer.Option("--version", callback=version_callback)
     ] = None,
+    trace: Annotated[
+        Path | None,
+        typer.Option(
+            "--trace",
+            callback=trace_callback,
+            is_eager=True,
+            dir_okay=False,
+            writable=True,
+            help="Write a Chrome trace of commands, HTTP requests and config access to a file",
+        ),
+    ] = None,
 ) -> None:
     """Entrypoint for the Dapla CLI."""
-    pass
+    configure_logging()
+
+
+def configure_logging() -> None:
+    """Configure logging once a command runs, rather than when dp is imported."""
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
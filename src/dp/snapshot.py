@@ -0,0 +1,138 @@
+import json
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+import typer
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS teams (name TEXT PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS groups (name TEXT PRIMARY KEY, team TEXT NOT NULL, data TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS groups_by_team ON groups (team);
+CREATE TABLE IF NOT EXISTS members (
+    group_name TEXT NOT NULL,
+    user TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (group_name, user)
+);
+CREATE INDEX IF NOT EXISTS members_by_user ON members (user);
+CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+
+class Snapshot:
+    """A local SQLite snapshot of the teams, groups and group members of the Team API.
+
+    Lookups, such as the teams a user is a member of, are answered from indexes, without contacting the Team API. A
+    sync replaces the whole snapshot in a single transaction, so lookups never see a partly synced snapshot.
+    """
+
+    def __init__(self, path: Path) -> None:
+        """Open a snapshot stored in a database file, creating it if it does not exist."""
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        # Lookups read the last synced snapshot while a sync is writing the next one
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+
+    @classmethod
+    def for_env(cls, env: str) -> "Snapshot":
+        """Return the snapshot of an environment, stored under the dapla-cli app dir."""
+        return cls(Path(typer.get_app_dir("dapla-cli")) / f"team-api-{env}.sqlite")
+
+    def close(self) -> None:
+        """Close the database."""
+        self.connection.close()
+
+    def replace(
+        self,
+        teams: dict[str, dict[str, Any]],
+        groups: dict[str, tuple[str, dict[str, Any]]],
+        members: dict[str, dict[str, dict[str, Any]]],
+    ) -> None:
+        """Replace the contents of the snapshot.
+
+        Args:
+            teams: Teams by name.
+            groups: Groups by name, with the name of their team.
+            members: The members of each group by name, by the name of the group.
+        """
+        with self.connection:
+            self.connection.execute("DELETE FROM members")
+            self.connection.execute("DELETE FROM groups")
+            self.connection.execute("DELETE FROM teams")
+            self.connection.executemany(
+                "INSERT INTO teams VALUES (?, ?)",
+                ((name, json.dumps(team)) for name, team in teams.items()),
+            )
+            self.connection.executemany(
+                "INSERT INTO groups VALUES (?, ?, ?)",
+                (
+                    (name, team, json.dumps(group))
+                    for name, (team, group) in groups.items()
+                ),
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO members VALUES (?, ?, ?)",
+                (
+                    (group, user, json.dumps(member))
+                    for group, users in members.items()
+                    for user, member in users.items()
+                ),
+            )
+            self.connection.execute(
+                "INSERT OR REPLACE INTO metadata VALUES ('synced_at', ?)",
+                (datetime.now(timezone.utc).isoformat(),),
+            )
+
+    def synced_at(self) -> str | None:
+        """Return when the snapshot was last synced, or None if it never was."""
+        row = self.connection.execute(
+            "SELECT value FROM metadata WHERE key = 'synced_at'"
+        ).fetchone()
+        return row["value"] if row else None
+
+    def teams(self) -> list[dict[str, Any]]:
+        """Return all teams."""
+        return self._query("SELECT name AS team, data FROM teams ORDER BY name")
+
+    def groups_of_team(self, team: str) -> list[dict[str, Any]]:
+        """Return the groups of a team."""
+        return self._query(
+            "SELECT name AS 'group', data FROM groups WHERE team = ? ORDER BY name",
+            team,
+        )
+
+    def members_of_team(self, team: str) -> list[dict[str, Any]]:
+        """Return the members of all groups of a team, with the group they are a member of."""
+        return self._query(
+            "SELECT m.user, m.group_name AS 'group', m.data FROM groups g"
+            " JOIN members m ON m.group_name = g.name WHERE g.team = ? ORDER BY m.user, m.group_name",
+            team,
+        )
+
+    def members_of_group(self, group: str) -> list[dict[str, Any]]:
+        """Return the members of a group."""
+        return self._query(
+            "SELECT user, data FROM members WHERE group_name = ? ORDER BY user", group
+        )
+
+    def teams_of_user(self, user: str) -> list[dict[str, Any]]:
+        """Return the teams a user is a member of, with the groups of the team they are a member of."""
+        return self._query(
+            "SELECT g.team, m.group_name AS 'group' FROM members m"
+            " JOIN groups g ON g.name = m.group_name WHERE m.user = ? ORDER BY g.team, m.group_name",
+            user,
+        )
+
+    def _query(self, sql: str, *parameters: str) -> list[dict[str, Any]]:
+        rows = []
+        for row in self.connection.execute(sql, parameters):
+            result = dict(row)
+            if "data" in result:
+                result["data"] = json.loads(result["data"])
+            rows.append(result)
+        return rows
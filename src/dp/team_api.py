@@ -1,12 +1,32 @@
+import contextlib
+import gzip
+import hashlib
+import json
 import logging
-from typing import Annotated
+import os
+import string
+import sys
+import tempfile
+import threading
+import time
+from collections.abc import Iterable, Iterator, Mapping
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from enum import Enum
+from pathlib import Path
+from typing import Annotated, Any
+from urllib.parse import quote, urljoin, urlsplit
 
 import requests
 import typer
+from rich.console import Console
 
+from . import http, jsonstream
 from .auth import DAPLA_CLI_CLIENT_ID, Env, local_access_token
+from .snapshot import Snapshot
+from .utils import green, grey, red
 
 app = typer.Typer()
+err = Console(stderr=True)
 logger = logging.getLogger(__name__)
 
 env_config = {
@@ -14,25 +34,643 @@ env_config = {
     Env.test: {"team_api_url": "https://dapla-team-api.intern.test.ssb.no/"},
 }
 
+# The maximum number of pages followed per path, guarding against pagination links that never end
+MAX_PAGES = 1000
+# Bytes read from a response at a time, when streaming it
+CHUNK_SIZE = 64 * 1024
+# The paths synced to the local snapshot, and the keys that identify their items
+TEAMS_PATH = "/teams"
+TEAM_GROUPS_PATH = "/teams/{team}/groups"
+GROUP_USERS_PATH = "/groups/{group}/users"
+TEAM_KEY = GROUP_KEY = "uniform_name"
+USER_KEY = "principal_name"
+# Response headers kept in the response cache: the validators used to revalidate, and what pagination needs
+CACHED_HEADERS = ("ETag", "Last-Modified", "Link", "Content-Type")
+
+
+class Order(str, Enum):
+    """Denotes the order in which the results of a bulk fetch are written."""
+
+    input = "input"
+    completion = "completion"
+
+
 env_option = Annotated[
     Env,
     typer.Option("--env", "-e", case_sensitive=False),
 ]
+parallel_option = Annotated[
+    int,
+    typer.Option(
+        "--parallel",
+        "-p",
+        min=1,
+        max=http.POOL_SIZE,
+        help="The number of paths to request concurrently",
+    ),
+]
+verbose_option = Annotated[
+    bool,
+    typer.Option("--verbose", "-v", help="Print cache hits and misses to stderr"),
+]
+
+
+class AuthorizationHeaders(Mapping[str, str]):
+    """The headers of requests to the Team API, with an access token that is only looked up once they are sent.
+
+    Responses served from the cache within their max age make no request, so they need no token, and work offline even
+    if the token would have to be refreshed first.
+    """
+
+    def __init__(self, env: Env) -> None:
+        """Create the headers of requests to the Team API of an environment."""
+        self.env = env
+        self._headers: dict[str, str] | None = None
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key: str) -> str:
+        """Return a header, looking up the access token first if needed."""
+        return self._resolve()[key]
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the header names, looking up the access token first if needed."""
+        return iter(self._resolve())
+
+    def __len__(self) -> int:
+        """Return the number of headers, looking up the access token first if needed."""
+        return len(self._resolve())
+
+    def _resolve(self) -> dict[str, str]:
+        with self._lock:
+            if self._headers is None:
+                token = local_access_token(self.env, client=DAPLA_CLI_CLIENT_ID)
+                self._headers = {"Authorization": f"Bearer {token}"}
+            return self._headers
+
+
+class ResponseCache:
+    """An on-disk cache of Team API responses, keyed by the path and query of the URL, and compressed with gzip.
+
+    Cached responses are revalidated with a conditional request, using their ETag or Last-Modified header, so an
+    unchanged response costs a 304 without a body. Within `max_age` seconds of being stored or last revalidated, they
+    are served without contacting the API at all. Every response is stored in a file of its own, replaced atomically,
+    so concurrent requests and dp processes can share the cache.
+
+    Responses are streamed both from the API and from the cache, and a response is stored while it is being read, so
+    caching does not hold bodies in memory.
+    """
+
+    def __init__(self, path: Path, max_age: float | None = None) -> None:
+        """Create a cache stored in a directory, serving responses younger than `max_age` seconds without requests."""
+        self.path = path
+        self.max_age = max_age
+
+    @classmethod
+    def for_env(cls, env: Env, max_age: float | None = None) -> "ResponseCache":
+        """Return the cache of an environment, stored under the dapla-cli app dir."""
+        cache_dir = Path(typer.get_app_dir("dapla-cli")) / "cache"
+        return cls(cache_dir / f"team-api-{env.value}", max_age)
+
+    def get(
+        self, url: str, headers: Mapping[str, str], verbose: bool = False
+    ) -> requests.Response:
+        """Make a streamed GET request, answering it from the cache if possible.
+
+        Args:
+            url: The URL to request.
+            headers: Headers of the request, such as its authorization.
+            verbose: If True, print whether the cache was hit, revalidated or missed to stderr.
+
+        Returns:
+            The response, either from the API or from the cache. Its body has not been read yet.
+        """
+        file = self._file(url)
+        cached = self._open(file)
+        if cached and self.max_age is not None:
+            cached_headers, stored_at, body = cached
+            if time.time() - stored_at <= self.max_age:
+                self._report(verbose, "hit", url)
+                return self._response(url, cached_headers, body)
+
+        conditional = dict(headers)
+        if cached and "ETag" in cached[0]:
+            conditional["If-None-Match"] = cached[0]["ETag"]
+        if cached and "Last-Modified" in cached[0]:
+            conditional["If-Modified-Since"] = cached[0]["Last-Modified"]
+        try:
+            response = http.get(url, headers=conditional, stream=True)
+        except requests.RequestException:
+            if cached:
+                cached[2].close()
+            raise
+
+        if response.status_code == 304 and cached:
+            response.close()
+            self._report(verbose, "revalidated", url)
+            with contextlib.suppress(OSError):
+                os.utime(file)  # Restarts the max age
+            return self._response(url, cached[0], cached[2])
+
+        if cached:
+            cached[2].close()
+        self._report(verbose, "miss", url)
+        if response.status_code == 200:
+            keep = {
+                h: response.headers[h] for h in CACHED_HEADERS if h in response.headers
+            }
+            response.raw = _CachingReader(response.raw, file, keep)
+        return response
+
+    def _file(self, url: str) -> Path:
+        parts = urlsplit(url)
+        key = hashlib.sha256(f"{parts.path}?{parts.query}".encode()).hexdigest()
+        return self.path / f"{key}.gz"
+
+    @staticmethod
+    def _open(file: Path) -> tuple[dict[str, str], float, gzip.GzipFile] | None:
+        """Open a cached response, returning its headers, when it was stored or revalidated, and its unread body."""
+        try:
+            body = gzip.open(file, "rb")
+        except OSError:
+            return None
+        try:
+            headers: dict[str, str] = json.loads(body.readline())
+            stored_at = os.fstat(body.fileno()).st_mtime
+        except (OSError, ValueError):
+            body.close()
+            return None  # A corrupt entry is as good as none
+        return headers, stored_at, body
+
+    @staticmethod
+    def _response(
+        url: str, headers: Mapping[str, str], body: gzip.GzipFile
+    ) -> requests.Response:
+        response = requests.Response()
+        response.url = url
+        response.status_code = 200
+        response.headers.update(headers)
+        response.encoding = "utf-8"
+        response.raw = _CachedBody(body)
+        return response
+
+    @staticmethod
+    def _report(verbose: bool, outcome: str, url: str) -> None:
+        if verbose:
+            err.print(grey(f"Cache {outcome}: {url}"))
+
+
+class _CachedBody:
+    """Reads the body of a cached response, closing the cache file once it has been read to the end."""
+
+    def __init__(self, file: gzip.GzipFile) -> None:
+        self.file = file
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.file.read(size)
+        if not chunk:
+            self.file.close()
+        return chunk
+
+    def close(self) -> None:
+        self.file.close()
+
+    release_conn = close
+
+
+class _CachingReader:
+    """Reads the body of a response from the API, while writing it to a cache file.
+
+    The file is only put in place once the body has been read to the end, so a body that is read partly, e.g. because
+    the consumer stopped early, is not cached.
+    """
+
+    def __init__(self, raw: Any, file: Path, headers: dict[str, str]) -> None:
+        self.raw = raw
+        self.file = file
+        file.parent.mkdir(parents=True, exist_ok=True)
+        self._tmp = tempfile.NamedTemporaryFile(
+            dir=file.parent, suffix=".tmp", delete=False
+        )
+        self._gzip: gzip.GzipFile | None = gzip.GzipFile(fileobj=self._tmp, mode="wb")
+        self._gzip.write(json.dumps(headers).encode() + b"\n")
+
+    def read(self, size: int = -1) -> bytes:
+        chunk: bytes = self.raw.read(size, decode_content=True)
+        if self._gzip:
+            if chunk:
+                self._gzip.write(chunk)
+            else:
+                self._finish(store=True)
+        return chunk
+
+    def close(self) -> None:
+        self.raw.close()
+        self._finish(store=False)
+
+    def release_conn(self) -> None:
+        self.raw.release_conn()
+
+    def _finish(self, store: bool) -> None:
+        if self._gzip is None:
+            return
+        self._gzip.close()
+        self._tmp.close()
+        self._gzip = None
+        if store:
+            os.replace(self._tmp.name, self.file)
+        else:
+            Path(self._tmp.name).unlink(missing_ok=True)
 
 
 @app.command()
 def get(
-    path: Annotated[
-        str,
-        typer.Argument(help="The api path to request i.e. /teams/play-enhjoern-a"),
-    ],
+    paths: Annotated[
+        list[str] | None,
+        typer.Argument(
+            help="The api paths to request i.e. /teams/play-enhjoern-a",
+            show_default=False,
+        ),
+    ] = None,
+    env: env_option = Env.prod,
+    template: Annotated[
+        str | None,
+        typer.Option(
+            "--template",
+            "-t",
+            help="A path with placeholders, e.g. /teams/{name}/users, requested once per line read from stdin. A line is either a value for all placeholders, or a JSON object with a value per placeholder.",
+        ),
+    ] = None,
+    parallel: parallel_option = 8,
+    order: Annotated[
+        Order,
+        typer.Option(
+            "--order",
+            case_sensitive=False,
+            help="Write results in the order of the paths, or as soon as they complete",
+        ),
+    ] = Order.input,
+    max_age: Annotated[
+        float | None,
+        typer.Option(
+            "--max-age",
+            min=0,
+            help="Serve responses cached less than this many seconds ago without contacting the API",
+        ),
+    ] = None,
+    no_cache: Annotated[
+        bool,
+        typer.Option(
+            "--no-cache",
+            help="Neither use nor update the on-disk response cache",
+        ),
+    ] = False,
+    verbose: verbose_option = False,
+    jsonl: Annotated[
+        bool,
+        typer.Option(
+            "--jsonl",
+            help="Write the elements of a JSON array response as JSON lines, as soon as each has been received",
+        ),
+    ] = False,
+    select: Annotated[
+        list[str] | None,
+        typer.Option(
+            "--select",
+            "-s",
+            help="Only write these fields of each element, e.g. name or manager.email. May be repeated or comma separated, and implies --jsonl.",
+            show_default=False,
+        ),
+    ] = None,
+) -> None:
+    """Make authenticated GET requests to the dapla-team-api.
+
+    A single path is requested as is, and its response streamed to stdout. Several paths, or a template, are requested
+    concurrently, following pagination links, and every page is written to stdout as a JSON line with the path, url,
+    status and body of the response.
+
+    Responses are cached on disk, and revalidated with conditional requests, so unchanged responses are not downloaded
+    again.
+    """
+    if template:
+        paths = [*(paths or []), *expand_template(template, sys.stdin)]
+    if not paths:
+        raise typer.BadParameter("Give at least one path, or a --template")
+
+    headers = AuthorizationHeaders(env)
+    fields = [field for value in select or [] for field in value.split(",") if field]
+    cache = None if no_cache else ResponseCache.for_env(env, max_age)
+    if len(paths) == 1 and not template:
+        with _get(_url(env, paths[0]), headers, cache, verbose) as resp:
+            if jsonl or fields:
+                for element in jsonstream.iter_elements(resp.iter_content(CHUNK_SIZE)):
+                    print(json.dumps(jsonstream.project(element, fields)), flush=True)
+            else:
+                stream_to_stdout(resp.iter_content(CHUNK_SIZE))
+        return
+
+    failed = False
+    for pages in fetch_all(env, paths, headers, parallel, order, cache, verbose):
+        for page in pages:
+            failed |= "error" in page or page["status"] >= 400
+            if fields and "body" in page:
+                page["body"] = _project(page["body"], fields)
+            print(json.dumps(page), flush=True)
+    if failed:
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def sync(
     env: env_option = Env.prod,
+    parallel: parallel_option = 8,
+    verbose: verbose_option = False,
 ) -> None:
-    """Make an authenticated GET request to the dapla-team-api."""
-    resp = requests.get(
-        env_config[env]["team_api_url"] + path,
-        headers={
-            "Authorization": f"Bearer {local_access_token(env, client=DAPLA_CLI_CLIENT_ID)}"
-        },
+    """Mirror the teams, groups and group members of the dapla-team-api into a local snapshot, for `dp team-api query`.
+
+    Requests go through the response cache, so resources that have not changed since the last sync are revalidated
+    with conditional requests rather than downloaded again.
+    """
+    headers = AuthorizationHeaders(env)
+    start = time.perf_counter()
+    try:
+        teams, groups, members = fetch_snapshot(
+            env, headers, parallel, ResponseCache.for_env(env), verbose
+        )
+    except ValueError as e:
+        err.print(red(f"Could not sync: {e}"))
+        raise typer.Exit(code=1) from e
+
+    snapshot = Snapshot.for_env(env.value)
+    try:
+        snapshot.replace(teams, groups, members)
+    finally:
+        snapshot.close()
+    users = sum(len(users) for users in members.values())
+    err.print(
+        green(
+            f"Synced {len(teams)} teams, {len(groups)} groups and {users} group members "
+            f"in {time.perf_counter() - start:.1f}s"
+        )
     )
-    print(resp.text)
+
+
+@app.command()
+def query(
+    env: env_option = Env.prod,
+    user: Annotated[
+        str | None,
+        typer.Option(
+            "--user", "-u", help="List the teams and groups a user is a member of"
+        ),
+    ] = None,
+    team: Annotated[
+        str | None,
+        typer.Option(
+            "--team",
+            "-t",
+            help="List the members of a team, or its groups with --groups",
+        ),
+    ] = None,
+    group: Annotated[
+        str | None,
+        typer.Option("--group", "-g", help="List the members of a group"),
+    ] = None,
+    groups: Annotated[
+        bool, typer.Option("--groups", help="List the groups of --team")
+    ] = False,
+) -> None:
+    """Look up teams, groups and members in the local snapshot, without contacting the dapla-team-api.
+
+    Without any options, all teams are listed. Results are written as JSON lines. Run `dp team-api sync` first, and
+    again to refresh the snapshot.
+    """
+    snapshot = Snapshot.for_env(env.value)
+    try:
+        if snapshot.synced_at() is None:
+            err.print(red("No snapshot found. Run `dp team-api sync` first."))
+            raise typer.Exit(code=1)
+        if user:
+            rows = snapshot.teams_of_user(user)
+        elif team and groups:
+            rows = snapshot.groups_of_team(team)
+        elif team:
+            rows = snapshot.members_of_team(team)
+        elif group:
+            rows = snapshot.members_of_group(group)
+        else:
+            rows = snapshot.teams()
+    finally:
+        snapshot.close()
+    for row in rows:
+        print(json.dumps(row))
+
+
+def fetch_snapshot(
+    env: Env,
+    headers: Mapping[str, str],
+    parallel: int,
+    cache: ResponseCache | None = None,
+    verbose: bool = False,
+) -> tuple[
+    dict[str, dict[str, Any]],
+    dict[str, tuple[str, dict[str, Any]]],
+    dict[str, dict[str, dict[str, Any]]],
+]:
+    """Fetch all teams, then the groups of every team, then the members of every group, concurrently.
+
+    Returns:
+        Teams by name, groups by name with the name of their team, and the members of each group by name.
+
+    Raises:
+        ValueError: If any of the resources could not be fetched.
+    """
+
+    def collection(path: str) -> list[dict[str, Any]]:
+        return fetch_items(env, path, headers, cache, verbose)
+
+    teams = {team[TEAM_KEY]: team for team in collection(TEAMS_PATH)}
+    with ThreadPoolExecutor(max_workers=parallel) as pool:
+        team_groups = pool.map(
+            lambda team: collection(TEAM_GROUPS_PATH.format(team=quote(team, safe=""))),
+            teams,
+        )
+        groups = {
+            group[GROUP_KEY]: (team, group)
+            for team, items in zip(teams, team_groups, strict=True)
+            for group in items
+        }
+        group_users = pool.map(
+            lambda group: collection(
+                GROUP_USERS_PATH.format(group=quote(group, safe=""))
+            ),
+            groups,
+        )
+        members = {
+            group: {user[USER_KEY]: user for user in users}
+            for group, users in zip(groups, group_users, strict=True)
+        }
+    return teams, groups, members
+
+
+def fetch_items(
+    env: Env,
+    path: str,
+    headers: Mapping[str, str],
+    cache: ResponseCache | None = None,
+    verbose: bool = False,
+) -> list[dict[str, Any]]:
+    """Fetch all items of a collection, from all of its pages.
+
+    The items of a page are either the page itself, if it is an array, or the arrays embedded in a HAL page.
+
+    Raises:
+        ValueError: If a page could not be fetched.
+    """
+    items: list[dict[str, Any]] = []
+    for page in fetch_pages(env, path, headers, cache, verbose):
+        if page.get("status") != 200:
+            raise ValueError(f"{page['url']}: {page.get('error') or page['status']}")
+        body = page["body"]
+        if isinstance(body, dict):
+            embedded = body.get("_embedded", {})
+            body = [
+                item
+                for value in embedded.values()
+                if isinstance(value, list)
+                for item in value
+            ]
+        items.extend(item for item in body if isinstance(item, dict))
+    return items
+
+
+def stream_to_stdout(chunks: Iterable[bytes]) -> None:
+    """Write chunks of a response to stdout as they arrive, ending with a newline like `print`."""
+    out = sys.stdout.buffer
+    for chunk in chunks:
+        out.write(chunk)
+        out.flush()
+    out.write(b"\n")
+    out.flush()
+
+
+def expand_template(template: str, lines: Iterable[str]) -> Iterator[str]:
+    """Fill in the placeholders of a path template once for every non-empty line.
+
+    Values are URL encoded, so they can not change the structure of the path.
+
+    Raises:
+        BadParameter: If a line does not have a value for every placeholder.
+    """
+    fields = {field for _, field, _, _ in string.Formatter().parse(template) if field}
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        values: Any = json.loads(line) if line.startswith("{") else None
+        if not isinstance(values, dict):
+            values = dict.fromkeys(fields, line)
+        try:
+            yield template.format_map(
+                {field: quote(str(values[field]), safe="") for field in fields}
+            )
+        except KeyError as e:
+            raise typer.BadParameter(f"No value for {e} in {line}") from e
+
+
+def fetch_all(
+    env: Env,
+    paths: list[str],
+    headers: Mapping[str, str],
+    parallel: int,
+    order: Order,
+    cache: ResponseCache | None = None,
+    verbose: bool = False,
+) -> Iterator[list[dict[str, Any]]]:
+    """Fetch every path concurrently, with all its pages, over the shared HTTP session and through the cache, if any.
+
+    Yields:
+        The pages of each path, in the order of the paths or as each path completes.
+    """
+    with ThreadPoolExecutor(max_workers=parallel) as pool:
+        futures = [
+            pool.submit(
+                lambda path: list(fetch_pages(env, path, headers, cache, verbose)),
+                path,
+            )
+            for path in paths
+        ]
+        try:
+            yield from (
+                future.result()
+                for future in (
+                    futures if order == Order.input else as_completed(futures)
+                )
+            )
+        finally:
+            for future in futures:
+                future.cancel()  # The consumer stopped early, e.g. on a broken pipe
+
+
+def fetch_pages(
+    env: Env,
+    path: str,
+    headers: Mapping[str, str],
+    cache: ResponseCache | None = None,
+    verbose: bool = False,
+) -> Iterator[dict[str, Any]]:
+    """Fetch a path, following its pagination links.
+
+    The next page is found in an RFC 8288 `Link: <...>; rel="next"` header, or in the `_links.next.href` of a HAL
+    body.
+
+    Yields:
+        A record of every page, with the `error` that prevented the request if it failed.
+    """
+    url: str | None = _url(env, path)
+    seen: set[str] = set()
+    while url and url not in seen and len(seen) < MAX_PAGES:
+        seen.add(url)
+        try:
+            response = _get(url, headers, cache, verbose)
+        except requests.RequestException as e:
+            yield {"path": path, "url": url, "error": str(e)}
+            return
+
+        body = _body(response)
+        yield {"path": path, "url": url, "status": response.status_code, "body": body}
+        url = _next_page(response, body) if response.ok else None
+
+
+def _get(
+    url: str, headers: Mapping[str, str], cache: ResponseCache | None, verbose: bool
+) -> requests.Response:
+    if cache:
+        return cache.get(url, headers, verbose)
+    return http.get(url, headers=headers, stream=True)
+
+
+def _project(body: Any, fields: list[str]) -> Any:
+    if isinstance(body, list):
+        return [jsonstream.project(element, fields) for element in body]
+    return jsonstream.project(body, fields)
+
+
+def _url(env: Env, path: str) -> str:
+    return env_config[env]["team_api_url"].rstrip("/") + "/" + path.lstrip("/")
+
+
+def _body(response: requests.Response) -> Any:
+    try:
+        return response.json()
+    except ValueError:
+        return response.text
+
+
+def _next_page(response: requests.Response, body: Any) -> str | None:
+    if "next" in response.links:
+        return urljoin(response.url, response.links["next"]["url"])
+    if isinstance(body, dict):
+        href = body.get("_links", {}).get("next", {}).get("href")
+        if isinstance(href, str):
+            return urljoin(response.url, href)
+    return None
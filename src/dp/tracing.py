@@ -0,0 +1,135 @@
+import json
+import os
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from rich.table import Table
+
+# The number of slowest spans listed in the summary printed when tracing stops
+SUMMARY_SIZE = 10
+
+
+class Tracer:
+    """Records spans of work, such as commands, HTTP requests and config file access, for a single dp invocation.
+
+    Spans are nested per thread. A span started on a thread without an open span, such as a worker thread of a sweep,
+    is attributed to the root span of the invocation.
+    """
+
+    def __init__(self, path: Path, operation: str) -> None:
+        """Create a tracer that writes a Chrome trace to a file when stopped."""
+        self.path = path
+        self.operation = operation
+        self.events: list[dict[str, Any]] = []
+        self._start = time.perf_counter_ns()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def span(self, name: str, category: str, **args: Any) -> Iterator[dict[str, Any]]:
+        """Record a span around the context. Arguments added to the yielded dict are recorded with the span."""
+        stack: list[str] = self._local.__dict__.setdefault("stack", [])
+        args["parent"] = stack[-1] if stack else self.operation
+        stack.append(name)
+        start = time.perf_counter_ns()
+        try:
+            yield args
+        finally:
+            end = time.perf_counter_ns()
+            stack.pop()
+            self._record(name, category, start, end, args)
+
+    def stop(self) -> None:
+        """Write the trace as Chrome trace event JSON, which can be opened in Perfetto or chrome://tracing."""
+        self._record(self.operation, "dp", self._start, time.perf_counter_ns(), {})
+        with self._lock:
+            trace = {"traceEvents": self.events, "displayTimeUnit": "ms"}
+        self.path.write_text(json.dumps(trace))
+
+    def slowest(self, n: int = SUMMARY_SIZE) -> list[dict[str, Any]]:
+        """Return the n slowest spans, not counting the root span."""
+        with self._lock:
+            spans = [e for e in self.events if e["cat"] != "dp"]
+        return sorted(spans, key=lambda e: e["dur"], reverse=True)[:n]
+
+    def _record(
+        self, name: str, category: str, start: int, end: int, args: dict[str, Any]
+    ) -> None:
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": (start - self._start) / 1000,
+            "dur": (end - start) / 1000,
+            "pid": os.getpid(),
+            "tid": threading.get_native_id(),
+            "args": args,
+        }
+        with self._lock:
+            self.events.append(event)
+
+
+_tracer: Tracer | None = None
+
+
+def start(path: Path, operation: str) -> None:
+    """Start tracing the current dp invocation, writing the trace to a file once `stop` is called."""
+    global _tracer
+    _tracer = Tracer(path, operation)
+
+
+def stop() -> None:
+    """Stop tracing, write the trace file and print a summary of the slowest spans to stderr."""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is None:
+        return
+
+    from rich.console import Console
+
+    tracer.stop()
+    err = Console(stderr=True)
+    slowest = tracer.slowest()
+    if slowest:
+        err.print(_summary(slowest))
+    err.print(f"Trace written to {tracer.path}")
+
+
+def _summary(spans: list[dict[str, Any]]) -> "Table":
+    from rich.table import Table
+
+    table = Table("Span", "Category", "Duration (ms)", "Parent", title="Slowest spans")
+    for event in spans:
+        table.add_row(
+            event["name"],
+            event["cat"],
+            f"{event['dur'] / 1000:.1f}",
+            event["args"]["parent"],
+        )
+    return table
+
+
+@contextmanager
+def span(name: str, category: str, **args: Any) -> Iterator[dict[str, Any]]:
+    """Record a span around the context, if tracing is enabled.
+
+    Args:
+        name: A short name of the work, e.g. `helm upgrade`.
+        category: The kind of work, e.g. `subprocess` or `http`.
+        args: Details recorded with the span, such as the full command.
+
+    Yields:
+        A dict of details recorded with the span, which may be extended within the context (e.g. with an exit code).
+    """
+    tracer = _tracer
+    if tracer is None:
+        yield args
+        return
+
+    with tracer.span(name, category, **args) as details:
+        yield details
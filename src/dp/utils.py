@@ -1,30 +1,86 @@
 import importlib.metadata
+import os
 import re
+import shlex
+import signal
 import subprocess
+import threading
+import time
+from collections.abc import Iterator
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
-import requests
 import typer
-from packaging.version import Version
-from pydantic import BaseModel
 from rich import print as rich_print
-from rich.console import Console
 from typer import Typer
 
-err = Console(stderr=True)
+from . import tracing
+
+if TYPE_CHECKING:
+    from packaging.version import Version
+    from rich.console import Console
+
 ansi_escape = re.compile(r"\x1B[@-_][0-?]*[ -/]*[@-~]")
 app = Typer()
 
+# Per-call timeout in seconds, generous enough for `helm upgrade --timeout 10m`
+DEFAULT_TIMEOUT = 15 * 60
+# Return codes mimicking coreutils `timeout`, and a shell that could not find a command or was interrupted by SIGINT
+TIMEOUT_RETURNCODE = 124
+COMMAND_NOT_FOUND_RETURNCODE = 127
+CANCELLED_RETURNCODE = 130
+
+_running: set[subprocess.Popen[str]] = set()
+_running_lock = threading.Lock()
+_cancelled = threading.Event()
+# The number of `cancel_on_interrupt` contexts entered, so only the outermost one resets a cancellation
+_interrupt_depth = 0
+_deadline: float | None = None
+
+
+class _LazyConsole:
+    """A rich console that is only created once it prints something.
+
+    Importing rich.console takes a noticeable part of the startup time of dp, which commands like `dp --help` never
+    print with.
+    """
+
+    def __init__(self, **kwargs: Any) -> None:
+        """Create a console with the given rich.console.Console arguments on first use."""
+        self._kwargs = kwargs
+        self._console: Console | None = None
+
+    def print(self, *objects: Any, **kwargs: Any) -> None:
+        """Print objects, see rich.console.Console.print."""
+        if self._console is None:
+            from rich.console import Console
+
+            self._console = Console(**self._kwargs)
+        self._console.print(*objects, **kwargs)
 
-class RunResult(BaseModel):
-    """The result of running a shell command."""
+
+err = _LazyConsole(stderr=True)
+
+
+@dataclass
+class RunResult:
+    """The result of running a command."""
 
     stdout: str
     stderr: str
     returncode: int
 
 
+@dataclass
+class RunTimeout(RunResult):
+    """The result of a command that was killed because it did not finish within its time limit."""
+
+    timeout: float
+
+
 def red(text: Any) -> str:
     """Returns text colored in red."""
     return f"[bold red]{text}[/bold red]"
@@ -57,41 +113,252 @@ def hours_since(dt: datetime) -> int:
     return int(delta.total_seconds() // 3600)
 
 
-def run(command: str, dryrun: bool = False, verbose: bool = False) -> RunResult:
-    """Run a shell command.
+def run(
+    command: list[str],
+    dryrun: bool = False,
+    verbose: bool = False,
+    timeout: float | None = DEFAULT_TIMEOUT,
+) -> RunResult:
+    """Run a command.
+
+    The command is executed directly, without a shell, so arguments need no quoting. It is started in its own process
+    group, so that the whole group (e.g. helm and any plugin it spawned) can be killed if the command times out or the
+    CLI is interrupted.
 
     Args:
-        command (str): The shell command to run.
+        command (list[str]): The command to run, as a list of arguments starting with the executable.
         dryrun (bool): Whether to perform a dry run.
         verbose (bool): Whether to print the command.
+        timeout (float): The maximum number of seconds the command may run, or None to only be bound by the global
+            deadline (if any).
 
     Returns:
-        RunResult: The result of the command.
+        RunResult: The result of the command. A RunTimeout if the command was killed because it timed out.
     """
     if verbose:
-        rich_print(grey(f"{'DRYRUN: ' if dryrun else ''}{command}"))
+        err.print(grey(f"{'DRYRUN: ' if dryrun else ''}{shlex.join(command)}"))
 
     if dryrun:
         return RunResult(stdout="", stderr="", returncode=0)
 
-    result = subprocess.run(command, shell=True, text=True, capture_output=True)
-    return RunResult(
-        stdout=result.stdout, stderr=result.stderr, returncode=result.returncode
+    if _cancelled.is_set():
+        return _cancelled_result()
+
+    with tracing.span(
+        " ".join(command[:2]), "subprocess", command=shlex.join(command)
+    ) as span:
+        result = _run(command, timeout)
+        span["returncode"] = result.returncode
+    return result
+
+
+def _run(command: list[str], timeout: float | None) -> RunResult:
+    timeout = remaining_time(timeout)
+    if timeout is not None and timeout <= 0:
+        return _deadline_exceeded()
+
+    try:
+        process = subprocess.Popen(
+            command,
+            text=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=True,
+        )
+    except FileNotFoundError:
+        return RunResult(
+            stdout="",
+            stderr=f"{command[0]}: command not found",
+            returncode=COMMAND_NOT_FOUND_RETURNCODE,
+        )
+    with _running_lock:
+        _running.add(process)
+    try:
+        stdout, stderr = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired as e:
+        _kill_process_group(process)
+        stdout, stderr = process.communicate()
+        return RunTimeout(
+            stdout=stdout,
+            stderr=stderr or f"Timed out after {e.timeout:.0f} seconds",
+            returncode=TIMEOUT_RETURNCODE,
+            timeout=e.timeout,
+        )
+    except BaseException:
+        # Most likely a KeyboardInterrupt. Don't leave orphaned processes behind.
+        _kill_process_group(process)
+        process.wait()
+        raise
+    finally:
+        with _running_lock:
+            _running.discard(process)
+
+    return RunResult(stdout=stdout, stderr=stderr, returncode=process.returncode)
+
+
+def run_many(
+    commands: list[list[str]],
+    parallel: int,
+    dryrun: bool = False,
+    verbose: bool = False,
+    timeout: float | None = DEFAULT_TIMEOUT,
+) -> list[RunResult]:
+    """Run commands concurrently.
+
+    Args:
+        commands (list[list[str]]): The commands to run, each as a list of arguments.
+        parallel (int): The maximum number of commands to run at the same time.
+        dryrun (bool): Whether to perform a dry run.
+        verbose (bool): Whether to print the commands.
+        timeout (float): The maximum number of seconds each command may run.
+
+    Returns:
+        list[RunResult]: The results of the commands, in the same order as the commands.
+    """
+    with ThreadPoolExecutor(max_workers=parallel) as pool, cancel_on_interrupt(pool):
+        return list(
+            pool.map(lambda command: run(command, dryrun, verbose, timeout), commands)
+        )
+
+
+@contextmanager
+def deadline(seconds: float | None) -> Iterator[None]:
+    """Bound the total time that commands run within the context may take.
+
+    Commands started after the deadline has passed are not run at all, and report a timeout.
+
+    Args:
+        seconds (float): The number of seconds from now until the deadline, or None for no deadline.
+
+    Yields:
+        None
+    """
+    global _deadline
+    previous = _deadline
+    if seconds is not None:
+        _deadline = time.monotonic() + seconds
+    try:
+        yield
+    finally:
+        _deadline = previous
+
+
+@contextmanager
+def cancel_on_interrupt(*pools: Executor) -> Iterator[None]:
+    """Kill all running commands, and refuse to start new ones, if the context is interrupted (e.g. by Ctrl-C).
+
+    Contexts may be nested. Only entering the outermost context allows commands to start again, so a nested context
+    does not undo the cancellation of an interrupt that is still being handled.
+
+    Args:
+        pools (Executor): Pools whose pending jobs are cancelled too, rather than run when the pool shuts down.
+
+    Yields:
+        None
+    """
+    global _interrupt_depth
+    with _running_lock:
+        if _interrupt_depth == 0:
+            _cancelled.clear()
+        _interrupt_depth += 1
+    try:
+        yield
+    except KeyboardInterrupt:
+        cancel_all()
+        for pool in pools:
+            pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    finally:
+        with _running_lock:
+            _interrupt_depth -= 1
+
+
+def cancel_all() -> None:
+    """Kill the process groups of all running commands and prevent new commands from starting."""
+    _cancelled.set()
+    with _running_lock:
+        running = list(_running)
+    for process in running:
+        _kill_process_group(process)
+
+
+def sleep(seconds: float) -> bool:
+    """Sleep, unless commands are cancelled in the meantime or the global deadline (if any) passes first.
+
+    Returns:
+        bool: True if the full time was slept, False if it was cut short.
+    """
+    remaining = remaining_time(seconds)
+    if remaining is not None and remaining < seconds:
+        return False
+    return not _cancelled.wait(seconds)
+
+
+def preempt(timeout: float | None = DEFAULT_TIMEOUT) -> RunResult | None:
+    """Check whether work that is not run as a command, such as an API request, may still start.
+
+    Such work is bound by cancellation and the global deadline just like commands started with `run`.
+
+    Args:
+        timeout (float): The maximum number of seconds the work may take, or None for no limit of its own.
+
+    Returns:
+        RunResult: The result to report instead of starting the work, if commands are cancelled or the global deadline
+            has passed. None if the work may start.
+    """
+    if _cancelled.is_set():
+        return _cancelled_result()
+    remaining = remaining_time(timeout)
+    if remaining is not None and remaining <= 0:
+        return _deadline_exceeded()
+    return None
+
+
+def remaining_time(timeout: float | None) -> float | None:
+    """Return the time a command may run, considering both its own timeout and the global deadline."""
+    if _deadline is None:
+        return timeout
+    remaining = _deadline - time.monotonic()
+    return remaining if timeout is None else min(timeout, remaining)
+
+
+def _cancelled_result() -> RunResult:
+    return RunResult(stdout="", stderr="Cancelled", returncode=CANCELLED_RETURNCODE)
+
+
+def _deadline_exceeded() -> RunTimeout:
+    return RunTimeout(
+        stdout="",
+        stderr="Deadline exceeded",
+        returncode=TIMEOUT_RETURNCODE,
+        timeout=0,
     )
 
 
-def assert_successful_command(cmd: str, err_msg: str, success_msg: str | None) -> None:
-    """Run a shell command and assert its success.
+def _kill_process_group(process: subprocess.Popen[str]) -> None:
+    try:
+        if hasattr(os, "killpg"):
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except ProcessLookupError:
+        pass  # Already exited
+
+
+def assert_successful_command(
+    cmd: list[str], err_msg: str, success_msg: str | None
+) -> None:
+    """Run a command and assert its success. Its output is discarded.
 
     Args:
-        cmd (str): The shell command to run.
+        cmd (list[str]): The command to run, as a list of arguments.
         err_msg (str): The error message to display if the command fails.
         success_msg (str): The success message to display if the command succeeds.
 
     Raises:
         Exit: If the command fails.
     """
-    res = run(f"eval {cmd} > /dev/null")
+    res = run(cmd)
     if res.returncode != 0:
         err.print(f"❌  {red(err_msg)}")
         raise typer.Exit(code=res.returncode)
@@ -99,23 +366,36 @@ def assert_successful_command(cmd: str, err_msg: str, success_msg: str | None) -
         rich_print(f"✔️ {success_msg}")
 
 
-def get_current_version() -> Version | None:
+def get_current_version() -> "Version | None":
     """Return the app version."""
+    from packaging.version import Version
+
+    installed_version = get_installed_version()
+    return Version(installed_version) if installed_version else None
+
+
+def get_installed_version() -> str | None:
+    """Return the app version as installed, without parsing it, which would need packaging to be imported."""
     try:
-        return Version(importlib.metadata.version("dapla-cli"))
+        return importlib.metadata.version("dapla-cli")
     except importlib.metadata.PackageNotFoundError:
         return None
 
 
-def get_latest_pypi_version() -> Version | None:
+def get_latest_pypi_version() -> "Version | None":
     """Fetches the latest version of a package from PyPI.
 
     Returns:
         str: The latest version of the package, or None if there is an error.
     """
+    import requests
+    from packaging.version import Version
+
     url = "https://pypi.org/pypi/dapla-cli/json"
     try:
-        response = requests.get(url, timeout=5)
+        with tracing.span(f"GET {url}", "http", url=url) as span:
+            response = requests.get(url, timeout=5)
+            span["status"] = response.status_code
         response.raise_for_status()
 
         # Parse the response as JSON and return the latest version
@@ -0,0 +1,252 @@
+import functools
+import json
+from collections.abc import Callable
+from datetime import datetime, timezone
+from typing import Any
+
+from . import kube
+from .utils import RunResult, err, grey, preempt, remaining_time, run
+
+# Annotation recording how many replicas a workload had before it was scaled down to suspend it
+SUSPENDED_REPLICAS_ANNOTATION = "dapla.ssb.no/suspended-replicas"
+# Annotation recording when a workload was scaled down to suspend it, as helm does not know about it
+SUSPENDED_AT_ANNOTATION = "dapla.ssb.no/suspended-at"
+# Annotation set by helm on every resource of a release
+RELEASE_NAME_ANNOTATION = "meta.helm.sh/release-name"
+# Merge patch of the annotations that `scale_down` records, removing them
+_CLEARED_ANNOTATIONS = {
+    SUSPENDED_REPLICAS_ANNOTATION: None,
+    SUSPENDED_AT_ANNOTATION: None,
+}
+# The workload kinds that are scaled, by their resource name in the apps/v1 API
+WORKLOAD_KINDS = {"deployments": "Deployment", "statefulsets": "StatefulSet"}
+
+
+def _failing_on_error(
+    operation: Callable[..., RunResult],
+) -> Callable[..., RunResult]:
+    """Return a failed result if the workloads of a release could not be listed, instead of raising.
+
+    The operation then fails like a failed command, so that callers count it as failed, and retry it if the error is
+    transient, such as an overloaded API server.
+    """
+
+    @functools.wraps(operation)
+    def wrapper(*args: Any, **kwargs: Any) -> RunResult:
+        try:
+            return operation(*args, **kwargs)
+        except ValueError as e:
+            return RunResult(stdout="", stderr=str(e), returncode=1)
+
+    return wrapper
+
+
+def release_workloads(
+    namespace: str, release: str, verbose: bool = False
+) -> list[dict[str, Any]]:
+    """List the Deployments and StatefulSets of a helm release.
+
+    Raises:
+        ValueError: If the workloads could not be listed.
+    """
+    return [
+        workload
+        for workload in _list_workloads(namespace, verbose)
+        if _annotations(workload).get(RELEASE_NAME_ANNOTATION) == release
+    ]
+
+
+def scaled_down_releases(
+    namespace: str | None, verbose: bool = False
+) -> dict[tuple[str, str], datetime | None]:
+    """Find the helm releases that were suspended by `scale_down`, and have not been scaled up since.
+
+    A release counts as scaled down if any of its workloads has a recorded replica count and no replicas. A helm
+    upgrade restores the replica counts of the chart, but leaves the annotation in place, so the annotation alone is
+    not enough.
+
+    Args:
+        namespace: The namespace to search, or None for all namespaces.
+        verbose: Whether to print the requests and commands.
+
+    Returns:
+        When every scaled down release was suspended, keyed by its namespace and name. None if the workloads of the
+        release were scaled down without recording when.
+
+    Raises:
+        ValueError: If the workloads could not be listed.
+    """
+    releases: dict[tuple[str, str], datetime | None] = {}
+    for workload in _list_workloads(namespace, verbose):
+        annotations = _annotations(workload)
+        release = annotations.get(RELEASE_NAME_ANNOTATION)
+        replicas = workload.get("spec", {}).get("replicas", 1)
+        if release and SUSPENDED_REPLICAS_ANNOTATION in annotations and replicas == 0:
+            key = (workload["metadata"].get("namespace", namespace), release)
+            # The workloads of a release are scaled down at once, but take the latest in case some were scaled later
+            releases[key] = max(
+                filter(None, [releases.get(key), _suspended_at(annotations)]),
+                default=None,
+            )
+    return releases
+
+
+@_failing_on_error
+def scale_down(
+    namespace: str, release: str, dryrun: bool = False, verbose: bool = False
+) -> RunResult:
+    """Suspend a helm release by scaling its workloads to zero replicas.
+
+    The replica count of every workload is recorded in an annotation, which `scale_up` restores, along with the time it
+    was suspended, as the update time of the helm release does not change. The release itself is left as is, so a later
+    `helm upgrade` of the release scales the workloads up again, as helm restores fields that were changed outside of
+    helm. The annotations are left in place then, see `scaled_down_releases`.
+    """
+    suspended_at = datetime.now(timezone.utc).isoformat()
+    patches = {}
+    for workload in release_workloads(namespace, release, verbose):
+        replicas = workload.get("spec", {}).get("replicas", 1)
+        if replicas == 0:
+            continue  # Already scaled down
+        patches[_path(namespace, workload)] = {
+            "metadata": {
+                "annotations": {
+                    SUSPENDED_REPLICAS_ANNOTATION: str(replicas),
+                    SUSPENDED_AT_ANNOTATION: suspended_at,
+                }
+            },
+            "spec": {"replicas": 0},
+        }
+
+    return _apply(patches, dryrun, verbose)
+
+
+@_failing_on_error
+def scale_up(
+    namespace: str, release: str, dryrun: bool = False, verbose: bool = False
+) -> RunResult:
+    """Unsuspend a helm release that was suspended by `scale_down`, restoring the recorded replica counts.
+
+    Workloads without a recorded replica count, such as those of a release that is not suspended, are left alone.
+    """
+    patches = {}
+    for workload in release_workloads(namespace, release, verbose):
+        replicas = _annotations(workload).get(SUSPENDED_REPLICAS_ANNOTATION)
+        if replicas is None:
+            continue
+        patches[_path(namespace, workload)] = {
+            "metadata": {"annotations": _CLEARED_ANNOTATIONS},
+            "spec": {"replicas": int(replicas)},
+        }
+
+    return _apply(patches, dryrun, verbose)
+
+
+@_failing_on_error
+def clear_annotations(
+    namespace: str, release: str, dryrun: bool = False, verbose: bool = False
+) -> RunResult:
+    """Remove recorded replica counts from the workloads of a release, once helm has scaled them up again."""
+    patches = {
+        _path(namespace, workload): {"metadata": {"annotations": _CLEARED_ANNOTATIONS}}
+        for workload in release_workloads(namespace, release, verbose)
+        if SUSPENDED_REPLICAS_ANNOTATION in _annotations(workload)
+    }
+    return _apply(patches, dryrun, verbose)
+
+
+def _list_workloads(namespace: str | None, verbose: bool) -> list[dict[str, Any]]:
+    """List all workloads of a namespace, or of all namespaces if None, with their kind.
+
+    Workloads are listed from the API server in-process, or with kubectl if the API server can not be reached
+    in-process.
+    """
+    prefix = f"/apis/apps/v1/namespaces/{namespace}" if namespace else "/apis/apps/v1"
+    try:
+        return [
+            {**workload, "kind": kind}
+            for resource, kind in WORKLOAD_KINDS.items()
+            for workload in kube.client().list(f"{prefix}/{resource}", verbose=verbose)
+        ]
+    except kube.KubeUnavailable:
+        pass
+
+    scope = ["--namespace", namespace] if namespace else ["--all-namespaces"]
+    res = run(
+        ["kubectl", "get", ",".join(WORKLOAD_KINDS), *scope, "--output", "json"],
+        verbose=verbose,
+    )
+    if res.returncode != 0:
+        raise ValueError(f"Could not list workloads: {res.stderr}")
+    workloads: list[dict[str, Any]] = json.loads(res.stdout).get("items", [])
+    return workloads
+
+
+def _apply(
+    patches: dict[str, dict[str, Any]], dryrun: bool, verbose: bool
+) -> RunResult:
+    """Apply merge patches to workloads, stopping at the first failure.
+
+    Like commands, patches are not applied once commands are cancelled or the global deadline has passed, and each
+    request may take no longer than the time left until the deadline.
+    """
+    for path, patch in patches.items():
+        if dryrun:
+            if verbose:
+                err.print(grey(f"DRYRUN: PATCH {path} {json.dumps(patch)}"))
+            continue
+        res = preempt(kube.REQUEST_TIMEOUT) or _patch(
+            path, patch, verbose, remaining_time(kube.REQUEST_TIMEOUT)
+        )
+        if res.returncode != 0:
+            return res
+
+    return RunResult(
+        stdout=f"Patched {len(patches)} workloads", stderr="", returncode=0
+    )
+
+
+def _patch(
+    path: str, patch: dict[str, Any], verbose: bool, timeout: float | None
+) -> RunResult:
+    try:
+        kube.client().patch(path, patch, verbose=verbose, timeout=timeout)
+        return RunResult(stdout="", stderr="", returncode=0)
+    except kube.KubeUnavailable:
+        pass
+    except ValueError as e:
+        return RunResult(stdout="", stderr=str(e), returncode=1)
+
+    *_, namespace, resource, name = path.split("/")
+    return run(
+        [
+            "kubectl",
+            "patch",
+            f"{resource}/{name}",
+            "--namespace",
+            namespace,
+            "--type",
+            "merge",
+            "--patch",
+            json.dumps(patch),
+        ],
+        verbose=verbose,
+        timeout=timeout,
+    )
+
+
+def _path(namespace: str, workload: dict[str, Any]) -> str:
+    resource = next(r for r, kind in WORKLOAD_KINDS.items() if kind == workload["kind"])
+    return f"/apis/apps/v1/namespaces/{namespace}/{resource}/{workload['metadata']['name']}"
+
+
+def _suspended_at(annotations: dict[str, str]) -> datetime | None:
+    try:
+        return datetime.fromisoformat(annotations[SUSPENDED_AT_ANNOTATION])
+    except (KeyError, ValueError):
+        return None
+
+
+def _annotations(workload: dict[str, Any]) -> dict[str, str]:
+    annotations: dict[str, str] = workload.get("metadata", {}).get("annotations") or {}
+    return annotations
@@ -0,0 +1,50 @@
+import threading
+from collections.abc import Callable, Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def app_dir(tmp_path, monkeypatch) -> Path:
+    """Keep tests from reading or writing the dapla-cli app dir of the user running them."""
+    monkeypatch.setattr(
+        "typer.get_app_dir", lambda app_name, **kwargs: str(tmp_path / app_name)
+    )
+    return tmp_path / "dapla-cli"
+
+
+@pytest.fixture(autouse=True)
+def kubeconfig(tmp_path, monkeypatch) -> Path:
+    """Keep tests from talking to the kubernetes cluster of the user running them."""
+    path = tmp_path / "kubeconfig"
+    monkeypatch.setenv("KUBECONFIG", str(path))
+    return path
+
+
+@pytest.fixture(autouse=True)
+def no_version_check(monkeypatch) -> None:
+    """Keep tests from starting the background process that fetches the latest version from PyPI."""
+    monkeypatch.setenv("DAPLA_CLI_NO_VERSION_CHECK", "1")
+
+
+@pytest.fixture
+def http_server() -> Iterator[Callable[[type[BaseHTTPRequestHandler]], str]]:
+    """Start local HTTP servers that handle requests on background threads, and shut them down after the test.
+
+    Yields:
+        A function that starts a server for a request handler class, and returns the URL of the server.
+    """
+    servers: list[ThreadingHTTPServer] = []
+
+    def start(handler: type[BaseHTTPRequestHandler]) -> str:
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,39 @@
+import base64
+import gzip
+import json
+import time
+
+
+def release_secret(
+    name, namespace, version, status="deployed", suspend=None, deployed=None
+):
+    """Return a helm release secret, as stored by helm for each revision of a release."""
+    release = {
+        "name": name,
+        "namespace": namespace,
+        "version": version,
+        "info": {
+            "first_deployed": "2024-10-01T08:00:00.123456789Z",
+            "last_deployed": deployed or f"2024-10-0{version}T08:00:00.123456789Z",
+            "status": status,
+        },
+        "chart": {
+            "metadata": {"name": "jupyter", "version": "4.2.1", "appVersion": "1.0"}
+        },
+        "config": {} if suspend is None else {"global": {"suspend": suspend}},
+    }
+    payload = base64.b64encode(gzip.compress(json.dumps(release).encode()))
+    return {
+        "metadata": {
+            "name": f"sh.helm.release.v1.{name}.v{version}",
+            "namespace": namespace,
+            "labels": {"owner": "helm", "name": name, "version": str(version)},
+        },
+        "data": {"release": base64.b64encode(payload).decode()},
+    }
+
+
+def make_token(expires_in: float) -> str:
+    """Return an unsigned JWT that expires in the given number of seconds."""
+    claims = json.dumps({"exp": time.time() + expires_in}).encode()
+    return f"e30.{base64.urlsafe_b64encode(claims).decode().rstrip('=')}.signature"
@@ -0,0 +1,165 @@
+import sys
+import tempfile
+import threading
+import time
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+import requests
+
+from dp import agent, auth, config
+from dp.auth import DAPLA_CLI_CLIENT_ID, Env
+from tests.helpers import make_token
+
+pytestmark = pytest.mark.skipif(
+    sys.platform == "win32", reason="Unix sockets are not supported on Windows"
+)
+
+
+@pytest.fixture
+def socket_file(monkeypatch) -> Iterator[Path]:
+    # Unix socket paths are limited to about 100 characters, which a pytest tmp_path may exceed
+    with tempfile.TemporaryDirectory() as socket_dir:
+        path = Path(socket_dir) / "agent.sock"
+        monkeypatch.setenv(agent.SOCKET_ENV_VARIABLE, str(path))
+        yield path
+
+
+@pytest.fixture
+def server(socket_file: Path) -> Iterator["agent.AgentServer"]:
+    server = agent.listen(socket_file)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def test_agent_serves_tokens_from_memory(server, mocker):
+    token = make_token(expires_in=3600)
+    config.put("auth", "access_token", token, namespace="dapla-cli-prod")
+    stored = mocker.spy(agent, "stored_access_token")
+
+    assert agent.request_token(Env.prod, DAPLA_CLI_CLIENT_ID) == token
+    assert agent.request_token(Env.prod, DAPLA_CLI_CLIENT_ID) == token
+    stored.assert_called_once()
+
+
+def test_agent_stops_serving_replaced_tokens(server):
+    config.put("auth", "access_token", make_token(3600), namespace="dapla-cli-prod")
+    agent.request_token(Env.prod, DAPLA_CLI_CLIENT_ID)
+    config.remove("auth", namespace="dapla-cli-prod")
+
+    assert agent.request_token(Env.prod, DAPLA_CLI_CLIENT_ID) is None
+
+
+def test_agent_refreshes_tokens_before_they_expire(server, mocker):
+    config.put("auth", "access_token", make_token(3600), namespace="dapla-cli-prod")
+    agent.request_token(Env.prod, DAPLA_CLI_CLIENT_ID)
+    expiring = make_token(expires_in=auth.TOKEN_REFRESH_MARGIN + 1)
+    server.agent.tokens[(Env.prod, DAPLA_CLI_CLIENT_ID)] = (
+        expiring,
+        time.time() + auth.TOKEN_REFRESH_MARGIN + 1,
+    )
+    config.put("auth", "access_token", expiring, namespace="dapla-cli-prod")
+    refreshed = make_token(expires_in=3600)
+    refresh = mocker.patch("dp.auth._refresh_token", return_value=refreshed)
+
+    server.agent.refresh()
+
+    refresh.assert_called_once_with(
+        Env.prod,
+        DAPLA_CLI_CLIENT_ID,
+        auth.TOKEN_REFRESH_MARGIN + agent.REFRESH_INTERVAL,
+    )
+    assert server.agent.tokens[(Env.prod, DAPLA_CLI_CLIENT_ID)][0] == refreshed
+
+
+def test_agent_keeps_tokens_it_could_not_refresh(server, mocker):
+    expiring = make_token(expires_in=auth.TOKEN_REFRESH_MARGIN + 1)
+    config.put("auth", "access_token", expiring, namespace="dapla-cli-prod")
+    server.agent.tokens[(Env.prod, DAPLA_CLI_CLIENT_ID)] = (
+        expiring,
+        time.time() + auth.TOKEN_REFRESH_MARGIN + 1,
+    )
+    refreshed = make_token(expires_in=3600)
+    mocker.patch(
+        "dp.auth._refresh_token",
+        side_effect=[
+            requests.ReadTimeout("Keycloak is slow"),
+            KeyError,
+            auth.TokenRefreshFailed("Error refreshing token: 503", rejected=False),
+            refreshed,
+        ],
+    )
+
+    server.agent.refresh()
+    server.agent.refresh()
+    server.agent.refresh()
+    assert server.agent.tokens[(Env.prod, DAPLA_CLI_CLIENT_ID)][0] == expiring
+
+    server.agent.refresh()
+    assert server.agent.tokens[(Env.prod, DAPLA_CLI_CLIENT_ID)][0] == refreshed
+
+
+def test_agent_drops_tokens_whose_refresh_is_rejected(server, mocker):
+    expiring = make_token(expires_in=auth.TOKEN_REFRESH_MARGIN + 1)
+    config.put("auth", "access_token", expiring, namespace="dapla-cli-prod")
+    server.agent.tokens[(Env.prod, DAPLA_CLI_CLIENT_ID)] = (
+        expiring,
+        time.time() + auth.TOKEN_REFRESH_MARGIN + 1,
+    )
+    mocker.patch(
+        "dp.auth._refresh_token",
+        side_effect=auth.TokenRefreshFailed(
+            "Error refreshing token: 400 - invalid_grant", rejected=True
+        ),
+    )
+
+    server.agent.refresh()
+
+    assert (Env.prod, DAPLA_CLI_CLIENT_ID) not in server.agent.tokens
+
+
+def test_refresh_periodically_survives_failed_refresh(mocker):
+    mocker.patch("dp.agent.REFRESH_INTERVAL", 0.01)
+    stopped = threading.Event()
+    token_agent = mocker.Mock(spec=agent.TokenAgent)
+
+    def refresh() -> None:
+        if token_agent.refresh.call_count == 1:
+            raise requests.ConnectionError("Keycloak is down")
+        stopped.set()
+
+    token_agent.refresh.side_effect = refresh
+
+    agent.refresh_periodically(token_agent, stopped)
+
+    assert token_agent.refresh.call_count == 2
+
+
+def test_local_access_token_uses_running_agent(server, mocker):
+    token = make_token(expires_in=3600)
+    config.put("auth", "access_token", token, namespace="dapla-cli-prod")
+    stored = mocker.patch("dp.auth.stored_access_token")
+
+    assert auth.local_access_token(Env.prod, DAPLA_CLI_CLIENT_ID) == token
+    stored.assert_not_called()
+
+
+def test_request_token_without_agent(socket_file):
+    assert agent.request_token(Env.prod, DAPLA_CLI_CLIENT_ID) is None
+    socket_file.touch()  # Left behind by an agent that was killed
+    assert agent.request_token(Env.prod, DAPLA_CLI_CLIENT_ID) is None
+
+
+def test_listen_replaces_stale_socket_but_not_running_agent(socket_file):
+    socket_file.touch()
+    server = agent.listen(socket_file)
+    try:
+        with pytest.raises(ValueError, match="already running"):
+            agent.listen(socket_file)
+    finally:
+        server.server_close()
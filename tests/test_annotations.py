@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+
+import pytest
+from packaging.version import Version
+
+from dp import annotations, config
+
+
+@pytest.fixture
+def popen(mocker, monkeypatch):
+    monkeypatch.delenv("DAPLA_CLI_NO_VERSION_CHECK")
+    return mocker.patch("dp.annotations.subprocess.Popen")
+
+
+def test_check_version_refreshes_in_background_once_a_day(popen, mocker):
+    mocker.patch("dp.annotations.get_latest_pypi_version")
+    command = annotations.check_version(lambda: "result")
+
+    assert command() == "result"
+    assert command() == "result"
+
+    popen.assert_called_once()
+    assert popen.call_args.args[0] == annotations.REFRESH_LATEST_VERSION_COMMAND
+    annotations.get_latest_pypi_version.assert_not_called()
+
+
+def test_check_version_notifies_of_cached_newer_version(popen, mocker, capsys):
+    mocker.patch("dp.annotations.get_installed_version", return_value="1.0.0")
+    config.put("general", "latest_version", "1.1.0", namespace=None)
+
+    annotations.check_version(lambda: None)()
+
+    popen.assert_called_once()
+    captured = capsys.readouterr()
+    assert "A new version is available: 1.1.0 (Installed: 1.0.0)" in captured.err
+    assert captured.out == ""
+
+
+def test_check_version_notifies_once_a_day(popen, mocker, capsys):
+    mocker.patch("dp.annotations.get_installed_version", return_value="1.0.0")
+    config.put("general", "latest_version", "1.1.0", namespace=None)
+    config.put(
+        "general",
+        "last_checked_version",
+        (datetime.now() - timedelta(hours=1)).isoformat(),
+        namespace=None,
+    )
+
+    annotations.check_version(lambda: None)()
+
+    popen.assert_not_called()
+    assert capsys.readouterr().err == ""
+
+
+@pytest.mark.parametrize("latest_version", ["1.0.0", "0.9.0", "not-a-version"])
+def test_check_version_is_quiet_when_up_to_date(popen, mocker, capsys, latest_version):
+    mocker.patch("dp.annotations.get_installed_version", return_value="1.0.0")
+    config.put("general", "latest_version", latest_version, namespace=None)
+
+    annotations.check_version(lambda: None)()
+
+    assert capsys.readouterr().err == ""
+
+
+def test_check_version_ignores_failure_to_start_refresh(popen):
+    popen.side_effect = OSError("No such file or directory")
+
+    assert annotations.check_version(lambda: "result")() == "result"
+
+
+def test_refresh_latest_version(mocker):
+    mocker.patch(
+        "dp.annotations.get_latest_pypi_version", return_value=Version("2.0.0")
+    )
+
+    annotations.refresh_latest_version()
+
+    assert config.get("general", "latest_version", namespace=None) == "2.0.0"
@@ -1,5 +1,10 @@
+import os
+import subprocess
+import sys
 from configparser import ConfigParser
 
+import pytest
+
 from dp import config
 
 
@@ -52,3 +57,63 @@ def test_remove_does_nothing_if_section_not_exists(mocker):
     mocker.patch("dp.config._save_config")
     config.remove("non_existent_section", None)
     config._save_config.assert_not_called()
+
+
+def test_update_sets_several_keys_with_a_single_write(mocker):
+    save = mocker.spy(config, "_save_config")
+    config.update("auth", {"access_token": "a", "refresh_token": "r"}, "ns")
+    save.assert_called_once()
+    assert config.get("auth", "access_token", "ns") == "a"
+    assert config.get("auth", "refresh_token", "ns") == "r"
+
+
+def test_get_parses_config_file_once(mocker):
+    config.put("section", "key", "value", None)
+    read = mocker.spy(ConfigParser, "read")
+    for _ in range(3):
+        assert config.get("section", "key", None) == "value"
+    read.assert_not_called()
+
+
+def test_get_sees_changes_made_by_other_processes(app_dir):
+    config.put("section", "key", "value", None)
+    (app_dir / "config.ini").write_text("[section]\nkey = changed elsewhere\n")
+    assert config.get("section", "key", None) == "changed elsewhere"
+
+
+def test_transaction_saves_nothing_if_it_fails(app_dir):
+    config.put("section", "key", "value", None)
+    with pytest.raises(RuntimeError), config.transaction(None) as configparser:
+        configparser["section"]["key"] = "partial"
+        raise RuntimeError("Interrupted")
+    assert config.get("section", "key", None) == "value"
+
+
+def test_concurrent_processes_do_not_lose_updates(app_dir):
+    code = f"""
+import sys
+import typer
+typer.get_app_dir = lambda app_name, **kwargs: {str(app_dir)!r}
+from dp import config
+for i in range(10):
+    config.put("process-" + sys.argv[1], "count", str(i), None)
+"""
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+    processes = [
+        subprocess.Popen([sys.executable, "-c", code, str(p)], env=env)
+        for p in range(8)
+    ]
+    assert all(process.wait() == 0 for process in processes)
+    for p in range(8):
+        assert config.get(f"process-{p}", "count", None) == "9"
+
+
+def test_transaction_without_waiting_raises_if_locked(app_dir):
+    with config._file_lock(config._config_file("test")):
+        with pytest.raises(config.ConfigLocked):
+            with config.transaction("test", wait=False):
+                pass
+
+    with config.transaction("test", wait=False) as c:
+        c["section"] = {"key": "value"}
+    assert config.get("section", "key", "test") == "value"
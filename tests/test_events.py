@@ -0,0 +1,54 @@
+import io
+import json
+
+from rich.console import Console
+
+from dp import events
+from dp.events import JsonlReporter, OutputFormat, Reporter
+
+
+def test_jsonl_reporter_buffers_events():
+    stream = io.StringIO()
+    with JsonlReporter("Test", stream=stream, buffer_size=3, flush_interval=60) as r:
+        r.planned("some-ns", "jupyter", "kill")
+        r.started("some-ns", "jupyter", "kill")
+        assert stream.getvalue() == ""
+        r.finished("some-ns", "jupyter", "kill", 0.5)
+        assert len(stream.getvalue().splitlines()) == 3
+        r.failed("some-ns", "rstudio", "kill", 0.1, "error")
+        r.skipped("some-ns", "vscode", "kill", "changed")
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [line["event"] for line in lines] == [
+        "planned",
+        "started",
+        "finished",
+        "failed",
+        "skipped",
+    ]
+    assert lines[2]["duration"] == 0.5
+    assert lines[3]["error"] == "error"
+    assert lines[4]["reason"] == "changed"
+
+
+def test_jsonl_reporter_summary_is_flushed():
+    stream = io.StringIO()
+    r = JsonlReporter("Test", stream=stream, flush_interval=60)
+    r.summary("Killed 1 services", processed=1)
+    summary = json.loads(stream.getvalue())
+    assert summary["event"] == "summary"
+    assert summary["processed"] == 1
+
+
+def test_text_reporter_prints_failures_and_summary():
+    stream = io.StringIO()
+    console = Console(file=stream, force_terminal=False)
+    with Reporter("Test", console=console) as r:
+        r.discovered("some-ns", 2, 0.1)
+        r.finished("some-ns", "jupyter", "kill", 0.5)
+        r.failed("some-ns", "rstudio", "kill", 0.1, "Could not kill rstudio")
+    assert "Could not kill rstudio" in stream.getvalue()
+
+
+def test_reporter_for_output_format():
+    assert isinstance(events.reporter(OutputFormat.jsonl, "Test"), JsonlReporter)
+    assert not isinstance(events.reporter(OutputFormat.text, "Test"), JsonlReporter)
@@ -0,0 +1,87 @@
+from http.server import BaseHTTPRequestHandler
+from pathlib import Path
+from typing import Any, ClassVar
+
+import pytest
+
+from dp import http, tracing
+
+
+class FlakyServer(BaseHTTPRequestHandler):
+    """Responds 503 to the first requests to a path, and 200 afterwards, over keep-alive connections."""
+
+    protocol_version = "HTTP/1.1"
+    failures: ClassVar[int] = 0
+    requests: ClassVar[list[tuple[str, int]]] = []
+
+    def do_GET(self) -> None:
+        self._respond()
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self._respond()
+
+    def _respond(self) -> None:
+        FlakyServer.requests.append((self.command, self.client_address[1]))
+        status = 503 if len(self.requests) <= self.failures else 200
+        self.send_response(status)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, fmt: str, *args: Any) -> None:
+        pass
+
+
+@pytest.fixture
+def server(http_server) -> str:
+    FlakyServer.failures = 0
+    FlakyServer.requests = []
+    return http_server(FlakyServer)
+
+
+def test_requests_reuse_connections(server):
+    assert http.get(f"{server}/a").status_code == 200
+    assert http.post(f"{server}/b", data={"key": "value"}).status_code == 200
+
+    ports = {port for _, port in FlakyServer.requests}
+    assert len(FlakyServer.requests) == 2
+    assert len(ports) == 1
+
+
+def test_get_is_retried_on_transient_failures(server, tmp_path: Path):
+    FlakyServer.failures = 2
+    tracing.start(tmp_path / "trace.json", operation="dp")
+    tracer = tracing._tracer
+    try:
+        response = http.get(f"{server}/a")
+    finally:
+        tracing.stop()
+
+    [span, _] = tracer.events
+
+    assert response.status_code == 200
+    assert len(FlakyServer.requests) == 3
+    assert span["cat"] == "http"
+    assert span["args"]["status"] == 200
+    assert span["args"]["retries"] == 2
+
+
+def test_post_is_not_retried_once_sent(server):
+    FlakyServer.failures = 1
+
+    assert http.post(f"{server}/token", data={"key": "value"}).status_code == 503
+    assert FlakyServer.requests == [("POST", FlakyServer.requests[0][1])]
+
+
+def test_request_uses_default_timeouts(mocker):
+    request = mocker.patch.object(http.session(), "request")
+
+    http.get("https://example.com")
+    http.get("https://example.com", timeout=1)
+
+    assert request.call_args_list[0].kwargs["timeout"] == (
+        http.CONNECT_TIMEOUT,
+        http.READ_TIMEOUT,
+    )
+    assert request.call_args_list[1].kwargs["timeout"] == 1
@@ -0,0 +1,121 @@
+import base64
+import json
+from datetime import timedelta
+
+import pytest
+
+from dp import inventory
+from dp.utils import RunResult
+from tests.helpers import release_secret
+
+
+@pytest.fixture
+def release_secrets():
+    return [
+        release_secret("jupyter-abc", "user-ssb-a", 1, status="superseded"),
+        release_secret("jupyter-abc", "user-ssb-a", 2, suspend=True),
+        release_secret("vscode-python-def", "user-ssb-b", 1, status="failed"),
+        release_secret("rstudio-ghi", "user-ssb-b", 1, status="uninstalled"),
+    ]
+
+
+def test_decode_release(release_secrets):
+    release = inventory.decode_release(release_secrets[0]["data"]["release"])
+    assert release["name"] == "jupyter-abc"
+    assert release["version"] == 1
+
+
+def test_decode_release_uncompressed():
+    payload = base64.b64encode(base64.b64encode(b'{"name": "jupyter"}')).decode()
+    assert inventory.decode_release(payload) == {"name": "jupyter"}
+
+
+def test_releases_from_secrets(release_secrets):
+    releases = {r["name"]: r for r in inventory.releases_from_secrets(release_secrets)}
+    assert set(releases) == {"jupyter-abc", "vscode-python-def"}
+
+    jupyter = releases["jupyter-abc"]
+    assert jupyter["revision"] == "2"
+    assert jupyter["status"] == "deployed"
+    assert jupyter["chart"] == "jupyter-4.2.1"
+    assert jupyter["chart_version"] == "4.2.1"
+    assert jupyter["created"] == "2024-10-01T08:00:00.123456789Z"
+    assert jupyter["updated"] == "2024-10-02T08:00:00.123456789Z"
+    assert jupyter["suspended"] is True
+
+    vscode = releases["vscode-python-def"]
+    assert vscode["status"] == "failed"
+    assert vscode["suspended"] is False
+
+
+def test_list_release_secrets_all_namespaces(mocker, release_secrets):
+    mocker.patch(
+        "dp.inventory.run",
+        return_value=RunResult(
+            stdout=json.dumps({"items": release_secrets}), stderr="", returncode=0
+        ),
+    )
+    assert inventory.list_release_secrets(None) == release_secrets
+    inventory.run.assert_called_once_with(
+        [
+            "kubectl",
+            "get",
+            "secrets",
+            "--all-namespaces",
+            "--selector",
+            "owner=helm",
+            "--output",
+            "json",
+        ],
+        verbose=False,
+    )
+
+
+def test_list_release_secrets_error(mocker):
+    mocker.patch(
+        "dp.inventory.run",
+        return_value=RunResult(stdout="", stderr="forbidden", returncode=1),
+    )
+    with pytest.raises(ValueError, match="forbidden"):
+        inventory.list_release_secrets("user-ssb-a")
+
+
+def listed_release(name="jupyter-abc", revision="1", updated="2024-10-01T08:00:00Z"):
+    return {
+        "name": name,
+        "namespace": "user-ssb-a",
+        "revision": revision,
+        "updated": updated,
+    }
+
+
+def test_inventory_cache_round_trip(app_dir):
+    cache = inventory.InventoryCache.for_env("dev")
+    cache.put(listed_release(), {"name": "jupyter-abc", "suspended": True})
+    cache.save()
+
+    reloaded = inventory.InventoryCache.for_env("dev")
+    assert reloaded.path.parent == app_dir / "cache"
+    assert reloaded.get(listed_release()) == {"name": "jupyter-abc", "suspended": True}
+    assert reloaded.get(listed_release(name="jupyter-def")) is None
+
+
+def test_inventory_cache_miss_on_new_revision(tmp_path):
+    cache = inventory.InventoryCache(tmp_path / "cache.json")
+    cache.put(listed_release(), {"name": "jupyter-abc"})
+    assert cache.get(listed_release(revision="2")) is None
+    assert cache.get(listed_release(updated="2024-10-02T08:00:00Z")) is None
+
+
+def test_inventory_cache_expiry(tmp_path):
+    cache = inventory.InventoryCache(tmp_path / "cache.json", ttl=timedelta(0))
+    cache.put(listed_release(), {"name": "jupyter-abc"})
+    assert cache.get(listed_release()) is None
+    cache.save()
+    assert json.loads((tmp_path / "cache.json").read_text()) == {}
+
+
+def test_inventory_cache_corrupt_file(tmp_path):
+    (tmp_path / "cache.json").write_text("{not json")
+    cache = inventory.InventoryCache(tmp_path / "cache.json")
+    assert cache.get(listed_release()) is None
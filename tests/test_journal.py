@@ -0,0 +1,50 @@
+from dp.journal import Journal, Outcome, sweep_id
+
+
+def test_journal_resumes_completed_services(tmp_path):
+    path = tmp_path / "sweep.jsonl"
+    journal = Journal(path)
+    journal.record("user-a", "jupyter", "kill", Outcome.processed)
+    journal.record("user-a", "vscode", "kill", Outcome.failed)
+    journal.record("user-b", "rstudio", "kill", Outcome.retried)
+
+    resumed = Journal(path, resume=True)
+
+    assert resumed.done("user-a", "jupyter")
+    assert resumed.done("user-b", "rstudio")
+    assert not resumed.done("user-a", "vscode")
+
+
+def test_journal_ignores_truncated_lines(tmp_path):
+    path = tmp_path / "sweep.jsonl"
+    Journal(path).record("user-a", "jupyter", "kill", Outcome.processed)
+    with open(path, "a") as f:
+        f.write('{"namespace": "user-a", "na')
+
+    assert Journal(path, resume=True).done("user-a", "jupyter")
+
+
+def test_journal_starts_over_unless_resuming(tmp_path):
+    path = tmp_path / "sweep.jsonl"
+    Journal(path).record("user-a", "jupyter", "kill", Outcome.processed)
+
+    assert not Journal(path).done("user-a", "jupyter")
+    assert path.read_text() == ""
+
+
+def test_journal_is_kept_only_after_failures(tmp_path):
+    kept = Journal(tmp_path / "kept.jsonl")
+    kept.close(failed=1)
+    removed = Journal(tmp_path / "removed.jsonl")
+    removed.close(failed=0)
+
+    assert kept.path.exists()
+    assert not removed.path.exists()
+
+
+def test_sweep_id():
+    assert sweep_id("dev", "kill", "user-a", "^user-") == "dev-kill-user-a"
+    assert sweep_id("dev", "kill", "all", "^user-").startswith("dev-kill-all-")
+    assert sweep_id("dev", "kill", "all", "^user-") != sweep_id(
+        "dev", "kill", "all", "^user-ssb-"
+    )
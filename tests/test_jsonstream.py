@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+from dp import jsonstream
+
+DOCUMENT = [
+    {"name": "play-enhjoern-a", "manager": {"email": "a@ssb.no"}, "size": 12345},
+    {"name": "dapla-felles", "tags": ["ø", "æ"]},
+    12345,
+    "[not, an, array]",
+]
+
+
+def chunked(data: bytes, size: int) -> list[bytes]:
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 7, 1 << 20])
+def test_iter_elements_yields_elements_of_any_chunking(size: int):
+    data = json.dumps(DOCUMENT, ensure_ascii=False, indent=2).encode()
+
+    assert list(jsonstream.iter_elements(chunked(data, size))) == DOCUMENT
+
+
+def test_iter_elements_yields_elements_before_the_document_ends():
+    def chunks():
+        yield b'[{"name": "a"}, '
+        raise AssertionError("Read past the first element")
+
+    assert next(jsonstream.iter_elements(chunks())) == {"name": "a"}
+
+
+@pytest.mark.parametrize(
+    ("data", "elements"),
+    [(b"[]", []), (b' {"a": 1} ', [{"a": 1}]), (b"42", [42]), (b"[1 ,2]", [1, 2])],
+)
+def test_iter_elements_handles_any_document(data: bytes, elements: list):
+    assert list(jsonstream.iter_elements(chunked(data, 1))) == elements
+
+
+@pytest.mark.parametrize("data", [b"", b"[1, 2", b"[1 2]", b"[1,]", b"{} {}"])
+def test_iter_elements_rejects_invalid_json(data: bytes):
+    with pytest.raises(ValueError):
+        list(jsonstream.iter_elements(chunked(data, 1)))
+
+
+def test_project_selects_dotted_fields():
+    assert jsonstream.project(DOCUMENT[0], ["name", "manager.email", "missing.x"]) == {
+        "name": "play-enhjoern-a",
+        "manager.email": "a@ssb.no",
+        "missing.x": None,
+    }
+    assert jsonstream.project(12345, ["name"]) == 12345
@@ -0,0 +1,192 @@
+import json
+import os
+from http.server import BaseHTTPRequestHandler
+from pathlib import Path
+from typing import Any, ClassVar
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+
+from dp import inventory, kube, lab
+from dp.utils import RunResult
+
+
+class FakeApiServer(BaseHTTPRequestHandler):
+    """A stand-in for the Kubernetes API server, serving secrets two per page."""
+
+    protocol_version = "HTTP/1.1"
+    secrets: ClassVar[list[dict[str, Any]]] = []
+    requests: ClassVar[list[dict[str, Any]]] = []
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        self.requests.append(
+            {
+                "path": url.path,
+                "query": query,
+                "authorization": self.headers.get("Authorization"),
+                "client": self.client_address,
+            }
+        )
+        start = int(query.get("continue", 0))
+        end = start + int(query["limit"])
+        body = json.dumps(
+            {
+                "items": self.secrets[start:end],
+                "metadata": {"continue": str(end) if end < len(self.secrets) else ""},
+            }
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt: str, *args: Any) -> None:
+        pass
+
+
+@pytest.fixture
+def api_server(http_server) -> str:
+    FakeApiServer.secrets = [{"metadata": {"name": f"secret-{i}"}} for i in range(5)]
+    FakeApiServer.requests = []
+    return http_server(FakeApiServer)
+
+
+def write_kubeconfig(path: Path, server: str, cluster: str, **user: Any) -> None:
+    path.write_text(
+        json.dumps(
+            {
+                "current-context": "lab",
+                "contexts": [
+                    {"name": "lab", "context": {"cluster": cluster, "user": "me"}}
+                ],
+                "clusters": [{"name": cluster, "cluster": {"server": server}}],
+                "users": [{"name": "me", "user": user}],
+            }
+        )
+    )
+
+
+def test_load_config_is_memoized_on_mtime(kubeconfig: Path) -> None:
+    write_kubeconfig(kubeconfig, "https://a", "gke_dapla-lab-dev", token="t")
+    config = kube.load_config()
+
+    assert config.cluster == "gke_dapla-lab-dev"
+    assert config.token == "t"
+    assert kube.load_config() is config
+
+    write_kubeconfig(kubeconfig, "https://a", "gke_dapla-lab-prod", token="t")
+    os.utime(kubeconfig, ns=(0, kubeconfig.stat().st_mtime_ns + 1))
+
+    assert kube.current_cluster_name() == "gke_dapla-lab-prod"
+
+
+def test_load_config_rejects_unsupported_auth(kubeconfig: Path) -> None:
+    write_kubeconfig(kubeconfig, "https://a", "c", **{"auth-provider": {"name": "gcp"}})
+
+    with pytest.raises(kube.KubeUnavailable):
+        kube.load_config()
+
+
+def test_list_paginates_over_one_connection(kubeconfig: Path, api_server: str) -> None:
+    write_kubeconfig(kubeconfig, api_server, "c", token="secret-token")
+
+    secrets = list(
+        kube.client().list("/api/v1/secrets", label_selector="owner=helm", page_size=2)
+    )
+
+    assert [s["metadata"]["name"] for s in secrets] == [f"secret-{i}" for i in range(5)]
+    requests = FakeApiServer.requests
+    assert [r["query"].get("continue") for r in requests] == [None, "2", "4"]
+    assert all(r["query"]["labelSelector"] == "owner=helm" for r in requests)
+    assert all(r["authorization"] == "Bearer secret-token" for r in requests)
+    assert len({r["client"] for r in requests}) == 1
+
+
+def test_exec_credential_plugin_token_is_reused(
+    kubeconfig: Path, api_server: str, mocker
+) -> None:
+    write_kubeconfig(
+        kubeconfig, api_server, "c", exec={"command": "gke-gcloud-auth-plugin"}
+    )
+    mock_run = mocker.patch(
+        "dp.kube.run",
+        return_value=RunResult(
+            stdout=json.dumps(
+                {
+                    "status": {
+                        "token": "plugin-token",
+                        "expirationTimestamp": "2999-01-01T00:00:00Z",
+                    }
+                }
+            ),
+            stderr="",
+            returncode=0,
+        ),
+    )
+
+    list(kube.client().list("/api/v1/secrets", page_size=2))
+
+    mock_run.assert_called_once_with(["gke-gcloud-auth-plugin"])
+    assert FakeApiServer.requests[-1]["authorization"] == "Bearer plugin-token"
+
+
+def test_exec_credential_plugin_invalid_output(
+    kubeconfig: Path, api_server: str, mocker
+) -> None:
+    write_kubeconfig(
+        kubeconfig, api_server, "c", exec={"command": "gke-gcloud-auth-plugin"}
+    )
+    mocker.patch(
+        "dp.kube.run",
+        return_value=RunResult(stdout="Not JSON", stderr="", returncode=0),
+    )
+
+    with pytest.raises(kube.KubeUnavailable, match="invalid output"):
+        list(kube.client().list("/api/v1/secrets"))
+
+
+def test_request_timeout_is_unavailable(kubeconfig: Path, mocker) -> None:
+    write_kubeconfig(kubeconfig, "https://a", "c", token="t")
+    client = kube.client()
+    mocker.patch.object(client.session, "request", side_effect=requests.ReadTimeout)
+
+    with pytest.raises(kube.KubeUnavailable):
+        list(client.list("/api/v1/secrets"))
+
+
+def test_list_release_secrets_uses_api_server(
+    kubeconfig: Path, api_server: str, mocker
+) -> None:
+    write_kubeconfig(kubeconfig, api_server, "c", token="t")
+    mock_run = mocker.patch("dp.inventory.run")
+
+    secrets = inventory.list_release_secrets("user-ssb-a")
+
+    assert len(secrets) == 5
+    assert FakeApiServer.requests[0]["path"] == "/api/v1/namespaces/user-ssb-a/secrets"
+    mock_run.assert_not_called()
+
+
+def test_list_release_secrets_falls_back_to_kubectl(kubeconfig: Path, mocker) -> None:
+    write_kubeconfig(kubeconfig, "http://127.0.0.1:1", "c", token="t")
+    mock_run = mocker.patch(
+        "dp.inventory.run",
+        return_value=RunResult(stdout='{"items": []}', stderr="", returncode=0),
+    )
+
+    assert inventory.list_release_secrets(None) == []
+    assert "--all-namespaces" in mock_run.call_args.args[0]
+
+
+def test_cluster_name_falls_back_to_kubectl(mocker) -> None:
+    mock_run = mocker.patch(
+        "dp.lab.run",
+        return_value=RunResult(stdout="gke_dapla-lab-dev", stderr="", returncode=0),
+    )
+
+    assert lab._get_current_cluster_name() == "gke_dapla-lab-dev"
+    mock_run.assert_called_once()
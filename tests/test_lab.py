@@ -1,9 +1,27 @@
 import io
+import json
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 
-from dp import lab
-from dp.lab import Env, Service
+import pytest
+import typer
+
+from dp import lab, utils
+from dp.events import OutputFormat, Reporter
+from dp.journal import Journal
+from dp.lab import Env, Inventory, OperationType, Service
 from dp.utils import RunResult, strip_ansi
+from tests.helpers import release_secret
+
+
+@pytest.fixture(autouse=True)
+def scaled_down(mocker) -> dict[tuple[str, str], datetime | None]:
+    """Keep discovery from listing workloads, finding no scaled down releases unless a test adds them."""
+    releases: dict[tuple[str, str], datetime | None] = {}
+    mocker.patch("dp.lab.workloads.scaled_down_releases", return_value=releases)
+    return releases
 
 
 def test_doctor_all_commands_successful(mocker):
@@ -39,11 +57,23 @@ def test_add_chart_repos_successful(mocker):
     )
     lab.add_chart_repos(verbose=False)
     lab.run.assert_any_call(
-        "helm repo add dapla-lab-standard https://statisticsnorway.github.io/dapla-lab-helm-charts-standard",
+        [
+            "helm",
+            "repo",
+            "add",
+            "dapla-lab-standard",
+            "https://statisticsnorway.github.io/dapla-lab-helm-charts-standard",
+        ],
         verbose=False,
     )
     lab.run.assert_any_call(
-        "helm repo add dapla-lab-experimental https://statisticsnorway.github.io/dapla-lab-helm-charts-experimental",
+        [
+            "helm",
+            "repo",
+            "add",
+            "dapla-lab-experimental",
+            "https://statisticsnorway.github.io/dapla-lab-helm-charts-experimental",
+        ],
         verbose=False,
     )
 
@@ -81,7 +111,9 @@ def test_kill_service_successful(mocker):
         verbose=True,
     )
     lab.run.assert_called_once_with(
-        "helm delete test-service --namespace some-ns", dryrun=False, verbose=True
+        ["helm", "delete", "test-service", "--namespace", "some-ns"],
+        dryrun=False,
+        verbose=True,
     )
 
 
@@ -98,7 +130,9 @@ def test_kill_service_dryrun(mocker):
         verbose=True,
     )
     lab.run.assert_called_once_with(
-        "helm delete test-service --namespace some-ns", dryrun=True, verbose=True
+        ["helm", "delete", "test-service", "--namespace", "some-ns"],
+        dryrun=True,
+        verbose=True,
     )
 
 
@@ -122,12 +156,13 @@ def test_kill_services_with_services(mocker):
     mocker.patch("dp.lab._validate_env")
     lab.kill_services(env=Env.dev, namespace="some-ns", dryrun=False, verbose=True)
     lab.run.assert_called_once_with(
-        "helm delete test-service --namespace some-ns", dryrun=False, verbose=True
+        ["helm", "delete", "test-service", "--namespace", "some-ns"],
+        dryrun=False,
+        verbose=True,
     )
 
 
 def test_suspend_services_successful(mocker):
-    mocker.patch("dp.lab._get_all_user_namespaces", return_value=["some-ns"])
     mocker.patch(
         "dp.lab._find_services",
         return_value=[Service(name="test-service", namespace="some-ns")],
@@ -151,7 +186,6 @@ def test_suspend_services_successful(mocker):
 
 
 def test_suspend_services_error(mocker):
-    mocker.patch("dp.lab._get_all_user_namespaces", return_value=["some-ns"])
     mocker.patch(
         "dp.lab._find_services",
         return_value=[Service(name="test-service", namespace="some-ns")],
@@ -171,3 +205,638 @@ def test_suspend_services_error(mocker):
             verbose=True,
         )
         assert "Error: Could not suspend service test-service" in mock_stdout.getvalue()
+
+
+def test_prune_services_parallel_counts_are_exact(mocker):
+    mocker.patch(
+        "dp.lab._list_releases_in_all_namespaces",
+        return_value={
+            f"user-ssb-{i}": [
+                {
+                    "name": f"jupyter-{j}",
+                    "namespace": f"user-ssb-{i}",
+                    "status": "failed",
+                }
+                for j in range(3)
+            ]
+            for i in range(10)
+        },
+    )
+    mocker.patch(
+        "dp.lab._get_helm_release_details",
+        side_effect=lambda releases, verbose: [
+            ([{"updated": datetime.now(timezone.utc)}], {}) for _ in releases
+        ],
+    )
+    mocker.patch(
+        "dp.lab.run",
+        side_effect=lambda cmd, dryrun, verbose: RunResult(
+            stdout="", stderr="error", returncode=1 if "user-ssb-0" in cmd else 0
+        ),
+    )
+    mocker.patch("dp.lab._validate_env")
+    with mocker.patch("sys.stdout", new=io.StringIO()) as mock_stdout:
+        lab.prune_services(
+            env=Env.dev, namespace="all", dryrun=False, verbose=False, parallel=8
+        )
+        output = strip_ansi(mock_stdout.getvalue())
+        assert (
+            "Pruned 27 services, failed 3, skipped 0 (total: 30) from 10 namespaces"
+            in output
+        )
+    assert lab.run.call_count == 30
+
+
+def test_process_service_serializes_mutations_per_release(mocker):
+    service = Service(name="test-service", namespace="some-ns")
+    in_flight = []
+    overlaps = []
+
+    def slow_run(cmd, dryrun, verbose):
+        overlaps.append(len(in_flight))
+        in_flight.append(cmd)
+        time.sleep(0.01)
+        in_flight.pop()
+        return RunResult(stdout="", stderr="", returncode=0)
+
+    mocker.patch("dp.lab.run", side_effect=slow_run)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(
+            pool.map(
+                lambda _: lab._process_service(
+                    service,
+                    OperationType.kill,
+                    dryrun=False,
+                    verbose=False,
+                    report=Reporter("Kill services"),
+                ),
+                range(8),
+            )
+        )
+    assert all(results)
+    assert max(overlaps) == 0
+
+
+def test_suspend_services_from_release_secrets(mocker):
+    mocker.patch(
+        "dp.inventory.list_release_secrets",
+        return_value=[
+            release_secret("jupyter-abc", "user-ssb-a", 1),
+            release_secret("jupyter-def", "user-ssb-b", 1, suspend=True),
+            release_secret("jupyter-ghi", "kube-system", 1),
+        ],
+    )
+    mocker.patch("dp.annotations._get_config_timestamp", return_value=datetime.now())
+    mocker.patch("dp.lab._find_services")
+    mocker.patch(
+        "dp.lab.run", return_value=RunResult(stdout="", stderr="", returncode=0)
+    )
+    mocker.patch("dp.lab._validate_env")
+    with mocker.patch("sys.stdout", new=io.StringIO()) as mock_stdout:
+        lab.suspend_services(
+            env=Env.dev,
+            namespace="all",
+            dryrun=False,
+            verbose=False,
+            inventory_backend=Inventory.secrets,
+        )
+        output = strip_ansi(mock_stdout.getvalue())
+        assert (
+            "Suspended 2 services, failed 0, skipped 0 (total: 2) from 2 namespaces"
+            in output
+        )
+    lab._find_services.assert_not_called()
+    lab.run.assert_called_once()
+    assert lab.run.call_args.args[0][:3] == ["helm", "upgrade", "jupyter-abc"]
+
+
+def test_list_releases_in_all_namespaces(mocker):
+    mocker.patch("dp.annotations._get_config_timestamp", return_value=datetime.now())
+    releases = [
+        {"name": "jupyter-a", "namespace": "user-ssb-a"},
+        {"name": "jupyter-b", "namespace": "user-ssb-a"},
+        {"name": "rstudio-c", "namespace": "user-ssb-b"},
+        {"name": "ingress", "namespace": "kube-system"},
+    ]
+    mocker.patch(
+        "dp.lab.run",
+        return_value=RunResult(stdout=json.dumps(releases), stderr="", returncode=0),
+    )
+    grouped = lab._list_releases_in_all_namespaces("^user-", verbose=False)
+    assert {ns: [r["name"] for r in rs] for ns, rs in grouped.items()} == {
+        "user-ssb-a": ["jupyter-a", "jupyter-b"],
+        "user-ssb-b": ["rstudio-c"],
+    }
+    lab.run.assert_called_once()
+    assert "--all-namespaces" in lab.run.call_args.args[0]
+
+    assert list(lab._list_releases_in_all_namespaces("user-ssb-b", False)) == [
+        "user-ssb-b"
+    ]
+
+
+def test_invalid_namespace_pattern():
+    with pytest.raises(typer.BadParameter):
+        lab._validate_namespace_pattern("user-(")
+
+
+def test_prune_services_reuses_cached_inventory(mocker):
+    mocker.patch("dp.annotations._get_config_timestamp", return_value=datetime.now())
+    releases = [
+        {
+            "name": "jupyter-abc",
+            "namespace": "user-ssb-a",
+            "revision": "1",
+            "updated": "2024-10-01T08:00:00Z",
+            "chart": "jupyter-4.2.1",
+        }
+    ]
+    mocker.patch(
+        "dp.lab.run",
+        side_effect=lambda cmd, **kwargs: RunResult(
+            stdout=json.dumps(releases if "list" in cmd else {}),
+            stderr="",
+            returncode=0,
+        ),
+    )
+    mocker.patch(
+        "dp.lab._get_helm_release_details",
+        side_effect=lambda releases, verbose: [
+            ([{"updated": datetime.now(timezone.utc)}], {}) for _ in releases
+        ],
+    )
+    mocker.patch(
+        "dp.lab._prune", return_value=RunResult(stdout="", stderr="", returncode=0)
+    )
+    mocker.patch("dp.lab._validate_env")
+
+    for _ in range(2):
+        lab.prune_services(env=Env.dev, namespace="all", dryrun=False, verbose=False)
+    assert lab.run.call_count == 2
+    described = lab._get_helm_release_details.call_args_list
+    assert [len(c.args[0]) for c in described] == [1, 0]
+
+    lab.prune_services(
+        env=Env.dev, namespace="all", dryrun=False, verbose=False, no_cache=True
+    )
+    assert [len(c.args[0]) for c in described] == [1, 0, 1]
+
+
+def test_discovery_of_all_namespaces_lists_workloads_once(mocker):
+    mocker.patch("dp.annotations._get_config_timestamp", return_value=datetime.now())
+    releases = [
+        {"name": "jupyter-abc", "namespace": f"user-ssb-{ns}", "chart": "jupyter-1"}
+        for ns in "abc"
+    ]
+    mocker.patch(
+        "dp.lab.run",
+        return_value=RunResult(stdout=json.dumps(releases), stderr="", returncode=0),
+    )
+    mocker.patch(
+        "dp.lab._get_helm_release_details",
+        side_effect=lambda releases, verbose: [([{"updated": None}], {})]
+        * len(releases),
+    )
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        namespaces, discovered = lab._discover_services(
+            pool, "all", False, True, Inventory.helm, "^user-", None
+        )
+        assert len(list(discovered)) == len(namespaces) == 3
+
+    lab.workloads.scaled_down_releases.assert_called_once_with(None, False)
+
+
+def test_sweep_exits_if_releases_cannot_be_listed_past_deadline(mocker, capsys):
+    mocker.patch("dp.annotations._get_config_timestamp", return_value=datetime.now())
+    mocker.patch("dp.lab._validate_env")
+
+    with utils.deadline(0), pytest.raises(typer.Exit):
+        lab.prune_services(env=Env.dev, namespace="all", dryrun=False, verbose=False)
+
+    output = " ".join(strip_ansi(capsys.readouterr().err).split())
+    assert "Could not list helm releases in all namespaces: Deadline exceeded" in output
+
+
+def test_sweep_skips_namespace_whose_releases_cannot_be_described(mocker, capsys):
+    mocker.patch("dp.annotations._get_config_timestamp", return_value=datetime.now())
+    mocker.patch("dp.lab._validate_env")
+    releases = [{"name": "jupyter-abc", "namespace": "some-ns", "chart": "jupyter-1"}]
+    mocker.patch(
+        "dp.lab.run",
+        return_value=RunResult(stdout=json.dumps(releases), stderr="", returncode=0),
+    )
+
+    with utils.deadline(0):
+        lab.prune_services(
+            env=Env.dev, namespace="some-ns", dryrun=False, verbose=False, no_cache=True
+        )
+
+    output = " ".join(strip_ansi(capsys.readouterr().err).split())
+    assert "Could not get the history of jupyter-abc: Deadline exceeded" in output
+    assert "Skipping namespace some-ns" in output
+
+
+def test_get_helm_release_details_runs_reads_concurrently(mocker):
+    def helm(command, timeout):
+        time.sleep(0.1)
+        output = {"history": [{"revision": command[2]}], "get": {"name": command[3]}}
+        return RunResult(stdout=json.dumps(output[command[1]]), stderr="", returncode=0)
+
+    mocker.patch("dp.utils._run", side_effect=helm)
+    releases = [{"name": f"jupyter-{i}", "namespace": "some-ns"} for i in range(2)]
+
+    start = time.monotonic()
+    details = lab._get_helm_release_details(releases)
+
+    assert time.monotonic() - start < 0.3
+    assert details == [
+        ([{"revision": "jupyter-0"}], {"name": "jupyter-0"}),
+        ([{"revision": "jupyter-1"}], {"name": "jupyter-1"}),
+    ]
+
+
+def test_plan_prune_and_apply(mocker, tmp_path):
+    now = datetime.now(timezone.utc)
+    services = [
+        Service(
+            name="jupyter-failed", namespace="some-ns", revision="1", status="failed"
+        ),
+        Service(name="jupyter-idle", namespace="some-ns", revision="2", updated=now),
+        Service(name="jupyter-moved", namespace="some-ns", revision="3", updated=now),
+        Service(
+            name="jupyter-done",
+            namespace="some-ns",
+            revision="4",
+            updated=now,
+            suspended=True,
+        ),
+    ]
+    mocker.patch("dp.lab._find_services", return_value=services)
+    mocker.patch("dp.lab._validate_env")
+    plan_file = tmp_path / "plan.json"
+    lab.plan_prune(env=Env.dev, namespace="some-ns", plan_file=plan_file)
+
+    plan = lab.Plan.model_validate_json(plan_file.read_text())
+    assert [(e.service.name, e.operation, e.reason) for e in plan.entries] == [
+        ("jupyter-done", None, "has already been suspended"),
+        ("jupyter-failed", OperationType.kill, "has status failed"),
+        ("jupyter-idle", OperationType.suspend, "was updated 0 hours ago"),
+        ("jupyter-moved", OperationType.suspend, "was updated 0 hours ago"),
+    ]
+
+    services[2] = services[2].model_copy(update={"revision": "5"})
+    mocker.patch(
+        "dp.lab.run", return_value=RunResult(stdout="", stderr="", returncode=0)
+    )
+    mocker.patch(
+        "dp.lab._determine_chart_name", return_value="dapla-lab-standard/jupyter"
+    )
+    with mocker.patch("sys.stdout", new=io.StringIO()) as mock_stdout:
+        lab.apply(plan_file=plan_file, env=Env.dev, dryrun=False, verbose=False)
+        output = strip_ansi(mock_stdout.getvalue())
+    assert "jupyter-moved in namespace some-ns as it has changed" in output
+    assert "Applied 2 services, failed 0, skipped 1 (total: 3)" in output
+    lab._find_services.assert_called_with("some-ns", False, comprehensive=False)
+    commands = sorted(call.args[0] for call in lab.run.call_args_list)
+    assert commands[0] == ["helm", "delete", "jupyter-failed", "--namespace", "some-ns"]
+    assert commands[1][:3] == ["helm", "upgrade", "jupyter-idle"]
+
+    with mocker.patch("sys.stdout", new=io.StringIO()) as mock_stdout:
+        lab.apply(plan_file=plan_file, env=Env.dev, output=OutputFormat.jsonl)
+        lines = [json.loads(line) for line in mock_stdout.getvalue().splitlines()]
+    assert [
+        (line["event"], line["name"])
+        for line in lines
+        if line["event"] in ("skipped", "failed")
+    ] == [("skipped", "jupyter-moved")]
+    assert lines[-1]["skipped"] == 1
+
+
+def test_apply_rejects_plan_for_other_env(mocker, tmp_path):
+    plan_file = tmp_path / "plan.json"
+    plan_file.write_text(
+        lab.Plan(
+            env=Env.prod,
+            namespace="all",
+            namespace_pattern="^user-",
+            created=datetime.now(timezone.utc),
+            entries=[],
+        ).model_dump_json()
+    )
+    with pytest.raises(typer.Exit):
+        lab.apply(plan_file=plan_file, env=Env.dev)
+
+
+def test_kill_services_jsonl_output(mocker):
+    mocker.patch(
+        "dp.lab._find_services",
+        return_value=[
+            Service(name="test-service", namespace="some-ns"),
+            Service(name="other-service", namespace="some-ns"),
+        ],
+    )
+    mocker.patch(
+        "dp.lab.run",
+        side_effect=lambda cmd, dryrun, verbose: RunResult(
+            stdout="", stderr="error", returncode=1 if "other-service" in cmd else 0
+        ),
+    )
+    mocker.patch("dp.lab._validate_env")
+    with mocker.patch("sys.stdout", new=io.StringIO()) as mock_stdout:
+        lab.kill_services(env=Env.dev, namespace="some-ns", output=OutputFormat.jsonl)
+        events = [json.loads(line) for line in mock_stdout.getvalue().splitlines()]
+
+    assert [e["event"] for e in events].count("started") == 2
+    assert events[0]["event"] == "discovered"
+    assert events[0]["services"] == 2
+    finished = next(e for e in events if e["event"] == "finished")
+    assert finished["name"] == "test-service"
+    assert finished["duration"] >= 0
+    failed = next(e for e in events if e["event"] == "failed")
+    assert failed["name"] == "other-service"
+    assert "Could not kill service other-service" in failed["error"]
+    assert events[-1]["event"] == "summary"
+    assert events[-1]["processed"] == 1
+    assert events[-1]["failed"] == 1
+    assert events[-1]["skipped"] == 0
+
+
+def test_kill_services_retries_transient_failures(mocker):
+    mocker.patch(
+        "dp.lab._find_services",
+        return_value=[Service(name="test-service", namespace="some-ns")],
+    )
+    mocker.patch(
+        "dp.lab.run",
+        side_effect=[
+            RunResult(
+                stdout="",
+                stderr="Error: UPGRADE FAILED: another operation (install/upgrade/rollback) is in progress",
+                returncode=1,
+            ),
+            RunResult(stdout="", stderr="", returncode=0),
+        ],
+    )
+    sleep = mocker.patch("dp.lab.sleep", return_value=True)
+    mocker.patch("dp.lab._validate_env")
+    with mocker.patch("sys.stdout", new=io.StringIO()) as mock_stdout:
+        lab.kill_services(env=Env.dev, namespace="some-ns", output=OutputFormat.jsonl)
+        events = [json.loads(line) for line in mock_stdout.getvalue().splitlines()]
+
+    retrying = next(e for e in events if e["event"] == "retrying")
+    assert retrying["attempt"] == 1
+    assert 0 <= retrying["delay"] <= lab.RETRY_BACKOFF
+    sleep.assert_called_once_with(retrying["delay"])
+    assert events[-1]["processed"] == 1
+    assert events[-1]["retried"] == 1
+    assert events[-1]["failed"] == 0
+
+
+def test_kill_services_does_not_retry_permanent_failures(mocker):
+    mocker.patch(
+        "dp.lab._find_services",
+        return_value=[Service(name="test-service", namespace="some-ns")],
+    )
+    run = mocker.patch(
+        "dp.lab.run",
+        return_value=RunResult(
+            stdout="", stderr="Error: release: not found", returncode=1
+        ),
+    )
+    mocker.patch("dp.lab._validate_env")
+    with mocker.patch("sys.stdout", new=io.StringIO()):
+        lab.kill_services(env=Env.dev, namespace="some-ns", output=OutputFormat.jsonl)
+
+    run.assert_called_once()
+
+
+def test_scale_mode_retries_and_journals_failed_workload_listing(mocker):
+    mocker.patch(
+        "dp.workloads._list_workloads",
+        side_effect=ValueError("Could not list workloads: connection refused"),
+    )
+    mocker.patch("dp.lab.sleep", return_value=True)
+    journal = Journal.for_sweep("dev-suspend-some-ns", resume=False)
+    service = Service(name="jupyter-abc", namespace="some-ns", suspended=False)
+
+    outcome = lab._process_service(
+        service,
+        OperationType.suspend,
+        False,
+        False,
+        mocker.Mock(spec=Reporter),
+        lab.SuspendMode.scale,
+        journal,
+    )
+
+    assert outcome == lab.Outcome.failed
+    assert lab.workloads._list_workloads.call_count == lab.RETRY_ATTEMPTS + 1
+    assert not Journal.for_sweep("dev-suspend-some-ns", resume=True).done(
+        "some-ns", "jupyter-abc"
+    )
+
+
+def test_kill_services_resume_skips_completed_services(mocker):
+    mocker.patch(
+        "dp.lab._find_services",
+        return_value=[
+            Service(name="test-service", namespace="some-ns"),
+            Service(name="other-service", namespace="some-ns"),
+        ],
+    )
+    failing = {"other-service"}
+    run = mocker.patch(
+        "dp.lab.run",
+        side_effect=lambda cmd, dryrun, verbose: RunResult(
+            stdout="", stderr="error", returncode=1 if cmd[2] in failing else 0
+        ),
+    )
+    mocker.patch("dp.lab._validate_env")
+    with mocker.patch("sys.stdout", new=io.StringIO()):
+        lab.kill_services(env=Env.dev, namespace="some-ns", output=OutputFormat.jsonl)
+    journal = Journal.for_sweep("dev-kill-some-ns", resume=True)
+    assert journal.done("some-ns", "test-service")
+    assert not journal.done("some-ns", "other-service")
+
+    failing.clear()
+    run.reset_mock()
+    with mocker.patch("sys.stdout", new=io.StringIO()) as mock_stdout:
+        lab.kill_services(
+            env=Env.dev, namespace="some-ns", output=OutputFormat.jsonl, resume=True
+        )
+        summary = json.loads(mock_stdout.getvalue().splitlines()[-1])
+
+    run.assert_called_once()
+    assert run.call_args.args[0][2] == "other-service"
+    assert summary["processed"] == 1
+    assert summary["resumed"] == 1
+    assert not journal.path.exists()
+
+
+def test_kill_services_adaptive_reports_concurrency_limit(mocker):
+    mocker.patch(
+        "dp.lab._find_services",
+        return_value=[
+            Service(name=f"service-{i}", namespace="some-ns") for i in range(6)
+        ],
+    )
+    mocker.patch(
+        "dp.lab.run",
+        side_effect=lambda cmd, dryrun, verbose: RunResult(
+            stdout="", stderr="throttled", returncode=1 if "service-5" in cmd else 0
+        ),
+    )
+    mocker.patch("dp.lab._validate_env")
+    with mocker.patch("sys.stdout", new=io.StringIO()) as mock_stdout:
+        lab.kill_services(
+            env=Env.dev,
+            namespace="some-ns",
+            parallel=4,
+            output=OutputFormat.jsonl,
+            adaptive=True,
+        )
+        summary = json.loads(mock_stdout.getvalue().splitlines()[-1])
+
+    assert summary["processed"] == 5
+    assert 1 <= summary["concurrency_limit"] <= 4
+    assert summary["concurrency_limit_highest"] > 1
+    assert "Concurrency limit" in summary["message"]
+
+
+def test_suspend_services_scale_mode(mocker):
+    mocker.patch(
+        "dp.lab._find_services",
+        return_value=[
+            Service(name="jupyter-abc", namespace="some-ns", suspended=False),
+            Service(name="jupyter-def", namespace="some-ns", suspended=True),
+        ],
+    )
+    mocker.patch("dp.lab._validate_env")
+    mock_run = mocker.patch("dp.lab.run")
+    mock_scale_down = mocker.patch(
+        "dp.lab.workloads.scale_down",
+        return_value=RunResult(stdout="", stderr="", returncode=0),
+    )
+
+    lab.suspend_services(
+        env=Env.dev, namespace="some-ns", no_cache=True, mode=lab.SuspendMode.scale
+    )
+
+    mock_scale_down.assert_called_once_with("some-ns", "jupyter-abc", False, False)
+    mock_run.assert_not_called()
+
+
+def test_scaled_down_service_is_not_suspended_again(mocker, scaled_down):
+    mocker.patch(
+        "dp.inventory.list_release_secrets",
+        return_value=[
+            release_secret("jupyter-abc", "user-ssb-a", 1),
+            release_secret("jupyter-def", "user-ssb-a", 1),
+        ],
+    )
+    scaled_down[("user-ssb-a", "jupyter-abc")] = None
+    mocker.patch("dp.annotations._get_config_timestamp", return_value=datetime.now())
+    mocker.patch("dp.lab._validate_env")
+    mock_run = mocker.patch(
+        "dp.lab.run", return_value=RunResult(stdout="", stderr="", returncode=0)
+    )
+
+    lab.suspend_services(
+        env=Env.dev,
+        namespace="user-ssb-a",
+        inventory_backend=Inventory.secrets,
+        no_cache=True,
+    )
+
+    lab.workloads.scaled_down_releases.assert_called_once_with("user-ssb-a", False)
+    mock_run.assert_called_once()
+    assert "jupyter-def" in mock_run.call_args.args[0]
+
+
+def test_prune_counts_scaled_down_service_as_suspended_when_scaled_down():
+    long_ago = datetime.now(timezone.utc) - timedelta(hours=50)
+    service = Service(
+        name="jupyter-abc",
+        namespace="user-ssb-a",
+        created=long_ago,
+        updated=long_ago,
+        suspended=True,
+        scaled_down=True,
+        suspended_at=datetime.now(timezone.utc),
+    )
+
+    assert lab._plan_prune(service) == (None, "has already been suspended")
+
+    service.suspended_at = long_ago
+    assert lab._plan_prune(service) == (
+        OperationType.kill,
+        "was suspended 50 hours ago",
+    )
+
+
+def test_discovery_reads_when_service_was_scaled_down(mocker, scaled_down):
+    mocker.patch(
+        "dp.inventory.list_release_secrets",
+        return_value=[release_secret("jupyter-abc", "user-ssb-a", 1)],
+    )
+    mocker.patch("dp.annotations._get_config_timestamp", return_value=datetime.now())
+    suspended_at = datetime.now(timezone.utc)
+    scaled_down[("user-ssb-a", "jupyter-abc")] = suspended_at
+
+    services = lab._find_services_from_release_secrets("user-ssb-a", False)
+
+    [service] = services["user-ssb-a"]
+    assert service.scaled_down
+    assert service.suspended_at == suspended_at
+
+
+def test_suspend_in_scale_mode_needs_no_chart(mocker):
+    mock_scale_down = mocker.patch(
+        "dp.lab.workloads.scale_down",
+        return_value=RunResult(stdout="", stderr="", returncode=0),
+    )
+
+    service = Service(name="custom-abc", namespace="some-ns", suspended=False)
+    res = lab._suspend(service, False, False, lab.SuspendMode.scale)
+
+    assert res.returncode == 0
+    mock_scale_down.assert_called_once_with("some-ns", "custom-abc", False, False)
+
+
+def test_unsuspend_scaled_down_service_scales_up(mocker):
+    service = Service(
+        name="custom-abc", namespace="some-ns", suspended=True, scaled_down=True
+    )
+    mock_run = mocker.patch("dp.lab.run")
+    mock_scale_up = mocker.patch(
+        "dp.lab.workloads.scale_up",
+        return_value=RunResult(stdout="", stderr="", returncode=0),
+    )
+
+    res = lab._unsuspend(service, False, False, lab.SuspendMode.helm)
+
+    assert res.returncode == 0
+    mock_scale_up.assert_called_once_with("some-ns", "custom-abc", False, False)
+    mock_run.assert_not_called()
+
+
+def test_unsuspend_helm_suspended_service_in_scale_mode(mocker):
+    service = Service(
+        name="jupyter-abc", namespace="some-ns", suspended=True, chart_version="1.0.0"
+    )
+    mock_run = mocker.patch(
+        "dp.lab.run", return_value=RunResult(stdout="", stderr="", returncode=0)
+    )
+    mock_clear = mocker.patch(
+        "dp.lab.workloads.clear_annotations",
+        return_value=RunResult(stdout="", stderr="", returncode=0),
+    )
+    mock_scale_up = mocker.patch("dp.lab.workloads.scale_up")
+
+    res = lab._unsuspend(service, False, False, lab.SuspendMode.scale)
+
+    assert res.returncode == 0
+    assert "global.suspend=False" in mock_run.call_args.args[0]
+    mock_clear.assert_called_once_with("some-ns", "jupyter-abc", False, False)
+    mock_scale_up.assert_not_called()
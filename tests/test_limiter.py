@@ -0,0 +1,73 @@
+import threading
+import time
+
+from dp import limiter
+from dp.limiter import AdaptiveLimiter
+
+
+def test_limit_increases_additively_on_healthy_calls() -> None:
+    concurrency = AdaptiveLimiter(maximum=3)
+
+    for _ in range(4):
+        with concurrency.slot():
+            pass
+
+    assert concurrency.limit == 3
+    assert concurrency.highest == 3
+    assert concurrency.in_flight == 0
+
+
+def test_limit_backs_off_once_per_round_of_failures() -> None:
+    concurrency = AdaptiveLimiter(maximum=16, initial=8)
+    calls = [concurrency.slot() for _ in range(4)]
+    for call in [c.__enter__() for c in calls]:
+        call.failed = True
+    for c in calls:
+        c.__exit__(None, None, None)
+
+    assert concurrency.limit == 4
+    assert concurrency.lowest == 4
+
+    with concurrency.slot() as call:
+        call.failed = True
+
+    assert concurrency.limit == 2
+
+
+def test_limit_backs_off_on_slow_calls() -> None:
+    concurrency = AdaptiveLimiter(
+        maximum=16, initial=8, latency_tolerance=2, latency_floor=0
+    )
+    with concurrency.slot():
+        pass
+    with concurrency.slot():
+        time.sleep(0.05)
+
+    assert concurrency.limit < 8
+
+
+def test_limit_bounds_concurrency() -> None:
+    concurrency = AdaptiveLimiter(maximum=2, initial=2)
+    peak = 0
+    lock = threading.Lock()
+
+    def call() -> None:
+        nonlocal peak
+        with limiter.limiting(concurrency), limiter.slot():
+            with lock:
+                peak = max(peak, concurrency.in_flight)
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=call) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert peak <= 2
+    assert concurrency.in_flight == 0
+
+
+def test_slot_without_active_limiter() -> None:
+    with limiter.slot() as call:
+        call.failed = True
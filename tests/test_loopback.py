@@ -0,0 +1,42 @@
+import threading
+
+import pytest
+import requests
+
+from dp.loopback import RedirectReceiver
+
+
+def test_wait_returns_code_of_redirect_with_matching_state():
+    def redirect() -> None:
+        forged = requests.get(
+            receiver.redirect_uri, params={"state": "forged", "code": "forged"}
+        )
+        assert forged.status_code == 400
+        requests.get(receiver.redirect_uri, params={"state": "state", "code": "code"})
+
+    with RedirectReceiver(state="state") as receiver:
+        thread = threading.Thread(target=redirect)
+        thread.start()
+
+        assert receiver.wait(timeout=5) == "code"
+        thread.join()
+
+
+def test_wait_raises_authorization_error():
+    with RedirectReceiver(state="state") as receiver:
+        thread = threading.Thread(
+            target=requests.get,
+            args=(receiver.redirect_uri,),
+            kwargs={"params": {"state": "state", "error": "access_denied"}},
+        )
+        thread.start()
+
+        with pytest.raises(ValueError, match="access_denied"):
+            receiver.wait(timeout=5)
+        thread.join()
+
+
+def test_wait_times_out():
+    with RedirectReceiver(state="state") as receiver:
+        with pytest.raises(ValueError, match="No redirect"):
+            receiver.wait(timeout=0.1)
@@ -1,11 +1,22 @@
 """Test cases for the __main__ module."""
 
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+
 import pytest
 from typer.testing import CliRunner
 
+from dp import config
 from dp.main import app
+from tests.helpers import make_token
 
 runner = CliRunner()
+# Seconds dp may take to start and run a trivial command, with plenty of headroom for slow CI runners
+STARTUP_BUDGET = 1.0
 
 
 @pytest.fixture
@@ -18,3 +29,70 @@ def test_main_succeeds(cli_runner: CliRunner) -> None:
     """It exits with a status code of zero."""
     result = cli_runner.invoke(app, ["--help"])
     assert result.exit_code == 0
+
+
+def test_subcommands_are_invoked(cli_runner: CliRunner) -> None:
+    """It loads a sub-command when it is invoked."""
+    result = cli_runner.invoke(app, ["lab", "--help"])
+    assert result.exit_code == 0
+    assert "suspend-services" in result.output
+
+
+def _startup(
+    args: list[str], app_dir: Path, version_check: bool = False
+) -> tuple[float, set[str]]:
+    """Run dp in a fresh interpreter, and return how long it took and which modules it imported.
+
+    If the version check is enabled, starting the process that refreshes the latest version fails the run.
+    """
+    code = f"""
+import json, subprocess, sys, time
+class Popen(subprocess.Popen):
+    def __init__(self, args, **kwargs):
+        raise AssertionError(f"Started {{args}}")
+subprocess.Popen = Popen
+start = time.perf_counter()
+import typer
+typer.get_app_dir = lambda app_name, **kwargs: {str(app_dir)!r}
+from dp.main import app
+app({args!r}, prog_name="dp", standalone_mode=False)
+print()
+print(json.dumps([time.perf_counter() - start, sorted(sys.modules)]))
+"""
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+    if version_check:
+        env.pop("DAPLA_CLI_NO_VERSION_CHECK", None)
+    else:
+        env["DAPLA_CLI_NO_VERSION_CHECK"] = "1"
+    result = subprocess.run(
+        [sys.executable, "-c", code], env=env, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+    duration, modules = json.loads(result.stdout.splitlines()[-1])
+    return duration, set(modules)
+
+
+@pytest.mark.parametrize("version_check", [False, True])
+@pytest.mark.parametrize(
+    "args", [["--version"], ["--help"], ["auth", "show-access-token"]]
+)
+def test_startup_is_fast(args: list[str], app_dir: Path, version_check: bool) -> None:
+    """It starts within its budget, without importing modules it does not need."""
+    config.put("auth", "access_token", make_token(3600), namespace="dapla-cli-prod")
+    # Checked for the latest version a moment ago, as is the case for most invocations
+    config.put(
+        "general", "last_checked_version", datetime.now().isoformat(), namespace=None
+    )
+
+    duration, modules = _startup(args, app_dir, version_check)
+
+    assert duration < STARTUP_BUDGET
+    assert not modules & {
+        "dp.lab",
+        "dp.team_api",
+        "jwt",
+        "packaging",
+        "pydantic",
+        "pyperclip",
+        "requests",
+    }
@@ -0,0 +1,64 @@
+from pathlib import Path
+
+import pytest
+
+from dp.snapshot import Snapshot
+
+
+@pytest.fixture
+def snapshot(tmp_path: Path) -> Snapshot:
+    snapshot = Snapshot(tmp_path / "team-api.sqlite")
+    snapshot.replace(
+        teams={
+            "play-a": {"uniform_name": "play-a"},
+            "play-b": {"uniform_name": "play-b"},
+        },
+        groups={
+            "play-a-developers": ("play-a", {}),
+            "play-b-developers": ("play-b", {}),
+        },
+        members={
+            "play-a-developers": {"abc@ssb.no": {}, "def@ssb.no": {}},
+            "play-b-developers": {"abc@ssb.no": {"display_name": "Abc"}},
+        },
+    )
+    return snapshot
+
+
+def test_lookups(snapshot: Snapshot):
+    assert snapshot.teams_of_user("abc@ssb.no") == [
+        {"team": "play-a", "group": "play-a-developers"},
+        {"team": "play-b", "group": "play-b-developers"},
+    ]
+    assert snapshot.members_of_team("play-b") == [
+        {
+            "user": "abc@ssb.no",
+            "group": "play-b-developers",
+            "data": {"display_name": "Abc"},
+        }
+    ]
+    assert [row["user"] for row in snapshot.members_of_group("play-a-developers")] == [
+        "abc@ssb.no",
+        "def@ssb.no",
+    ]
+    assert [row["team"] for row in snapshot.teams()] == ["play-a", "play-b"]
+    assert snapshot.synced_at() is not None
+
+
+def test_replace_removes_what_is_gone(snapshot: Snapshot):
+    snapshot.replace(
+        teams={"play-a": {}},
+        groups={"play-a-developers": ("play-a", {})},
+        members={"play-a-developers": {"def@ssb.no": {}}},
+    )
+
+    assert snapshot.teams_of_user("abc@ssb.no") == []
+    assert [row["team"] for row in snapshot.teams()] == ["play-a"]
+
+
+def test_lookups_use_indexes(snapshot: Snapshot):
+    plan = snapshot.connection.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM members WHERE user = ?", ("abc@ssb.no",)
+    ).fetchall()
+
+    assert "members_by_user" in " ".join(row["detail"] for row in plan)
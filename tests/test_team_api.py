@@ -0,0 +1,335 @@
+import gzip
+import io
+import json
+import time
+from http.server import BaseHTTPRequestHandler
+from typing import Any, ClassVar
+
+import pytest
+import requests
+import typer
+from typer.testing import CliRunner
+
+from dp import team_api
+from dp.auth import Env
+from dp.main import app
+
+TEAMS = ["play-enhjoern-a", "play-enhjoern-b", "dapla-felles"]
+
+
+class FakeTeamApi(BaseHTTPRequestHandler):
+    """Serves /teams in pages, linked by Link headers, and the users of each team in HAL pages.
+
+    A team is served with an ETag, and not served again to requests that already have it. The resources of a
+    directory of teams, groups and members are served under /directory, with ETags.
+    """
+
+    requests: ClassVar[list[dict[str, str]]] = []
+    directory: ClassVar[dict[str, Any]] = {}
+
+    def do_GET(self) -> None:
+        FakeTeamApi.requests.append({"path": self.path, **self.headers})
+        headers = {}
+        if self.path.removeprefix("/directory") in self.directory:
+            body = self.directory[self.path.removeprefix("/directory")]
+            headers["ETag"] = f'"{hash(json.dumps(body))}"'
+            if self.headers.get("If-None-Match") == headers["ETag"]:
+                self.send_response(304)
+                self.end_headers()
+                return
+        elif self.path == "/teams/dapla-felles":
+            if self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+                self.end_headers()
+                return
+            body = {"name": "dapla-felles"}
+            headers["ETag"] = '"v1"'
+        elif self.path == "/teams":
+            body: Any = TEAMS[:2]
+            headers["Link"] = '</teams?page=2>; rel="next"'
+        elif self.path == "/teams?page=2":
+            body = TEAMS[2:]
+        elif self.path.startswith("/teams/play-enhjoern-a/users"):
+            time.sleep(0.1)  # Completes last
+            page = 2 if self.path.endswith("page=2") else 1
+            body = {"users": [f"user-{page}"]}
+            if page == 1:
+                body["_links"] = {
+                    "next": {"href": "/teams/play-enhjoern-a/users?page=2"}
+                }
+        elif self.path.endswith("/users") and self.path.split("/")[2] in TEAMS:
+            body = {"users": []}
+        else:
+            self.send_error(404)
+            return
+
+        encoded = json.dumps(body).encode()
+        self.send_response(200)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def log_message(self, fmt: str, *args: Any) -> None:
+        pass
+
+
+@pytest.fixture(autouse=True)
+def team_api_url(monkeypatch, mocker, http_server) -> str:
+    mocker.patch("dp.team_api.local_access_token", return_value="token")
+    FakeTeamApi.requests = []
+    FakeTeamApi.directory = {}
+    url = f"{http_server(FakeTeamApi)}/"
+    monkeypatch.setitem(team_api.env_config, Env.prod, {"team_api_url": url})
+    return url
+
+
+def invoke(*args: str, stdin: str | None = None) -> tuple[int, list[dict[str, Any]]]:
+    result = CliRunner().invoke(app, ["team-api", "get", *args], input=stdin)
+    return result.exit_code, [json.loads(line) for line in result.stdout.splitlines()]
+
+
+def test_get_single_path_prints_response():
+    result = CliRunner().invoke(app, ["team-api", "get", "/teams?page=2"])
+
+    assert result.exit_code == 0
+    assert json.loads(result.stdout) == ["dapla-felles"]
+
+
+def test_get_many_paths_follows_pagination():
+    exit_code, pages = invoke("/teams", "/teams/play-enhjoern-a/users")
+
+    assert exit_code == 0
+    assert [(page["path"], page["status"]) for page in pages] == [
+        ("/teams", 200),
+        ("/teams", 200),
+        ("/teams/play-enhjoern-a/users", 200),
+        ("/teams/play-enhjoern-a/users", 200),
+    ]
+    assert pages[0]["body"] + pages[1]["body"] == TEAMS
+    assert [page["body"]["users"] for page in pages[2:]] == [["user-1"], ["user-2"]]
+    assert pages[1]["url"].endswith("/teams?page=2")
+
+
+def test_get_template_expands_values_from_stdin():
+    exit_code, pages = invoke(
+        "--template",
+        "/teams/{name}/users",
+        "--order",
+        "completion",
+        stdin='play-enhjoern-b\n\n{"name": "dapla-felles"}\nplay-enhjoern-a\n',
+    )
+
+    assert exit_code == 0
+    paths = [page["path"] for page in pages]
+    assert set(paths[:2]) == {
+        "/teams/play-enhjoern-b/users",
+        "/teams/dapla-felles/users",
+    }
+    assert (
+        paths[2:] == ["/teams/play-enhjoern-a/users"] * 2
+    )  # The slowest completes last
+    assert pages[-1]["body"] == {"users": ["user-2"]}
+
+
+def test_get_many_paths_fails_if_any_path_fails():
+    exit_code, pages = invoke("/teams?page=2", "/unknown")
+
+    assert exit_code == 1
+    assert [page["status"] for page in pages] == [200, 404]
+
+
+def test_expand_template_encodes_values():
+    assert list(team_api.expand_template("/teams/{name}/users", ["a/b c"])) == [
+        "/teams/a%2Fb%20c/users"
+    ]
+
+
+@pytest.fixture
+def cache(team_api_url, app_dir) -> team_api.ResponseCache:
+    return team_api.ResponseCache.for_env(Env.prod)
+
+
+def test_cache_revalidates_with_etag(cache, team_api_url, capsys):
+    url = f"{team_api_url}teams/dapla-felles"
+
+    first = cache.get(url, {"Authorization": "Bearer token"}, verbose=True).json()
+    second = cache.get(url, {"Authorization": "Bearer token"}, verbose=True)
+
+    assert first == second.json() == {"name": "dapla-felles"}
+    assert second.headers["ETag"] == '"v1"'
+    assert "If-None-Match" not in FakeTeamApi.requests[0]
+    assert FakeTeamApi.requests[1]["If-None-Match"] == '"v1"'
+    reported = capsys.readouterr().err
+    assert "Cache miss" in reported
+    assert "Cache revalidated" in reported
+    [entry] = cache.path.iterdir()
+    headers, body = gzip.decompress(entry.read_bytes()).split(b"\n", 1)
+    assert json.loads(headers)["ETag"] == '"v1"'
+    assert json.loads(body) == first
+
+
+def test_cache_serves_fresh_responses_offline(cache, team_api_url):
+    url = f"{team_api_url}teams?page=2"
+    cache.get(url, {}).json()
+
+    cache.max_age = 60
+    response = cache.get(url, {})
+
+    assert response.json() == ["dapla-felles"]
+    assert len(FakeTeamApi.requests) == 1
+
+
+def test_cache_does_not_store_partly_read_responses(cache, team_api_url):
+    url = f"{team_api_url}teams?page=2"
+    with cache.get(url, {}) as response:
+        next(response.iter_content(1))
+
+    assert not any(cache.path.iterdir())
+
+
+def test_get_uses_cache_unless_disabled(team_api_url):
+    for _ in range(2):
+        exit_code, pages = invoke(
+            "/teams/dapla-felles", "/teams?page=2", "--max-age", "60"
+        )
+        assert exit_code == 0
+        assert [page["status"] for page in pages] == [200, 200]
+    exit_code, _ = invoke("/teams/dapla-felles", "--no-cache")
+
+    assert exit_code == 0
+    paths = [request["path"] for request in FakeTeamApi.requests]
+    assert sorted(paths[:2]) == ["/teams/dapla-felles", "/teams?page=2"]
+    assert paths[2:] == ["/teams/dapla-felles"]
+    assert "If-None-Match" not in FakeTeamApi.requests[-1]
+
+
+def test_get_serves_fresh_responses_without_access_token(mocker):
+    for _ in range(2):
+        exit_code, _ = invoke("/teams/dapla-felles", "/teams?page=2", "--max-age", "60")
+        assert exit_code == 0
+    team_api.local_access_token.side_effect = typer.Exit(code=1)
+
+    for args in [["/teams/dapla-felles"], ["/teams/dapla-felles", "/teams?page=2"]]:
+        exit_code, pages = invoke(*args, "--max-age", "60")
+        assert exit_code == 0
+        assert len(pages) == len(args)
+    assert len(FakeTeamApi.requests) == 2
+    team_api.local_access_token.assert_called_once()
+
+
+def test_get_streams_selected_fields_as_json_lines(mocker):
+    mocker.patch("dp.team_api.http.get").return_value = streamed(
+        b'[{"name": "a", "manager": {"email": "a@ssb.no"}}, {"name": "b"}]'
+    )
+
+    result = CliRunner().invoke(
+        app,
+        ["team-api", "get", "/teams", "--no-cache", "--select", "name,manager.email"],
+    )
+
+    assert result.exit_code == 0
+    assert [json.loads(line) for line in result.stdout.splitlines()] == [
+        {"name": "a", "manager.email": "a@ssb.no"},
+        {"name": "b", "manager.email": None},
+    ]
+
+
+def test_get_streams_response_to_stdout(mocker):
+    mocker.patch("dp.team_api.http.get").return_value = streamed(b'{"name": "a"}')
+
+    result = CliRunner().invoke(app, ["team-api", "get", "/teams/a", "--no-cache"])
+
+    assert result.exit_code == 0
+    assert result.stdout == '{"name": "a"}\n'
+
+
+def streamed(body: bytes) -> requests.Response:
+    response = requests.Response()
+    response.status_code = 200
+    response.raw = io.BytesIO(body)
+    return response
+
+
+@pytest.fixture
+def directory(team_api_url, monkeypatch) -> dict[str, Any]:
+    monkeypatch.setitem(
+        team_api.env_config, Env.prod, {"team_api_url": f"{team_api_url}directory/"}
+    )
+    FakeTeamApi.directory = {
+        "/teams": {
+            "_embedded": {
+                "teams": [
+                    {"uniform_name": "play-a", "display_name": "Play A"},
+                    {"uniform_name": "dapla-felles", "display_name": "Dapla Felles"},
+                ]
+            }
+        },
+        "/teams/play-a/groups": [
+            {"uniform_name": "play-a-developers"},
+            {"uniform_name": "play-a-managers"},
+        ],
+        "/teams/dapla-felles/groups": [{"uniform_name": "dapla-felles-developers"}],
+        "/groups/play-a-developers/users": [
+            {"principal_name": "abc@ssb.no"},
+            {"principal_name": "def@ssb.no"},
+        ],
+        "/groups/play-a-managers/users": [{"principal_name": "abc@ssb.no"}],
+        "/groups/dapla-felles-developers/users": [{"principal_name": "def@ssb.no"}],
+    }
+    return FakeTeamApi.directory
+
+
+def test_sync_mirrors_teams_groups_and_members(directory):
+    result = CliRunner().invoke(app, ["team-api", "sync"])
+    assert result.exit_code == 0, result.output
+
+    exit_code, rows = invoke_query("--user", "abc@ssb.no")
+    assert exit_code == 0
+    assert rows == [
+        {"team": "play-a", "group": "play-a-developers"},
+        {"team": "play-a", "group": "play-a-managers"},
+    ]
+    _, rows = invoke_query()
+    assert [row["data"]["display_name"] for row in rows] == ["Dapla Felles", "Play A"]
+    _, rows = invoke_query("--team", "dapla-felles", "--groups")
+    assert [row["group"] for row in rows] == ["dapla-felles-developers"]
+
+
+def test_sync_revalidates_unchanged_resources(directory):
+    CliRunner().invoke(app, ["team-api", "sync"])
+    FakeTeamApi.requests = []
+    directory["/groups/dapla-felles-developers/users"].append(
+        {"principal_name": "abc@ssb.no"}
+    )
+
+    result = CliRunner().invoke(app, ["team-api", "sync"])
+
+    assert result.exit_code == 0, result.output
+    assert len(FakeTeamApi.requests) == len(directory)
+    assert all("If-None-Match" in request for request in FakeTeamApi.requests)
+    _, rows = invoke_query("--user", "abc@ssb.no")
+    assert [row["team"] for row in rows] == ["dapla-felles", "play-a", "play-a"]
+
+
+def test_sync_keeps_snapshot_if_it_fails(directory):
+    CliRunner().invoke(app, ["team-api", "sync"])
+    del directory["/groups/play-a-managers/users"]
+
+    result = CliRunner().invoke(app, ["team-api", "sync"])
+
+    assert result.exit_code == 1
+    _, rows = invoke_query("--group", "play-a-managers")
+    assert [row["user"] for row in rows] == ["abc@ssb.no"]
+
+
+def test_query_requires_a_snapshot():
+    result = CliRunner().invoke(app, ["team-api", "query", "--user", "abc@ssb.no"])
+
+    assert result.exit_code == 1
+
+
+def invoke_query(*args: str) -> tuple[int, list[dict[str, Any]]]:
+    result = CliRunner().invoke(app, ["team-api", "query", *args])
+    return result.exit_code, [json.loads(line) for line in result.stdout.splitlines()]
@@ -0,0 +1,79 @@
+import io
+import json
+import threading
+from pathlib import Path
+
+import pytest
+import requests
+from pytest_mock import MockerFixture
+from typer.testing import CliRunner
+
+from dp import tracing
+from dp.main import app
+
+
+@pytest.fixture
+def tracer(tmp_path: Path) -> tracing.Tracer:
+    return tracing.Tracer(tmp_path / "trace.json", operation="dp")
+
+
+def test_span_is_a_noop_when_tracing_is_disabled() -> None:
+    with tracing.span("helm list", "subprocess", command="helm list") as span:
+        span["returncode"] = 0
+
+    assert tracing._tracer is None
+
+
+def test_spans_are_attributed_to_their_parent(tracer: tracing.Tracer) -> None:
+    with tracer.span("suspend user-ssb-0/jupyter", "operation"):
+        with tracer.span("helm upgrade", "subprocess", command="helm upgrade") as span:
+            span["returncode"] = 1
+
+    def worker() -> None:
+        with tracer.span("helm list", "subprocess"):
+            pass
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+
+    spans = {e["name"]: e for e in tracer.events}
+    assert spans["helm upgrade"]["args"] == {
+        "command": "helm upgrade",
+        "returncode": 1,
+        "parent": "suspend user-ssb-0/jupyter",
+    }
+    assert spans["suspend user-ssb-0/jupyter"]["args"]["parent"] == "dp"
+    assert spans["helm list"]["args"]["parent"] == "dp"
+    assert spans["suspend user-ssb-0/jupyter"]["dur"] >= spans["helm upgrade"]["dur"]
+
+
+def test_stop_writes_chrome_trace(tracer: tracing.Tracer) -> None:
+    with tracer.span("config read", "config"):
+        pass
+    tracer.stop()
+
+    trace = json.loads(tracer.path.read_text())
+    assert [e["name"] for e in trace["traceEvents"]] == ["config read", "dp"]
+    assert all(e["ph"] == "X" for e in trace["traceEvents"])
+    assert [e["name"] for e in tracer.slowest()] == ["config read"]
+
+
+def test_trace_option(tmp_path: Path, mocker: MockerFixture) -> None:
+    mocker.patch.dict("os.environ", {"DAPLA_CLI_NO_VERSION_CHECK": "1"})
+    mocker.patch("dp.team_api.local_access_token", return_value="token")
+    response = requests.Response()
+    response.status_code, response.raw = 200, io.BytesIO(b"{}")
+    mocker.patch("dp.http.session").return_value.request.return_value = response
+    trace_file = tmp_path / "trace.json"
+
+    result = CliRunner().invoke(
+        app, ["--trace", str(trace_file), "team-api", "get", "/teams", "--no-cache"]
+    )
+
+    assert result.exit_code == 0
+    events = json.loads(trace_file.read_text())["traceEvents"]
+    http = next(e for e in events if e["cat"] == "http")
+    assert http["args"]["status"] == 200
+    assert http["args"]["url"].endswith("/teams")
+    assert tracing._tracer is None
@@ -1,5 +1,8 @@
 import importlib.metadata
 import io
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from unittest import mock
 
@@ -11,6 +14,10 @@ from rich.console import Console
 
 from dp import utils
 
+posix_only = pytest.mark.skipif(
+    sys.platform == "win32", reason="Process groups are POSIX only"
+)
+
 
 def test_colors() -> None:
     assert utils.red("Hello World") == "[bold red]Hello World[/bold red]"
@@ -65,42 +72,139 @@ def test_hours_since_future_datetime():
     assert result == -5
 
 
-def test_run_command_successful(mocker):
-    mocker.patch(
-        "subprocess.run",
-        return_value=mocker.Mock(stdout="output", stderr="", returncode=0),
-    )
-    result = utils.run("echo 'Hello World'")
-    assert result.stdout == "output"
+def python(code: str) -> list[str]:
+    return [sys.executable, "-c", code]
+
+
+def test_run_command_successful():
+    result = utils.run(python("print('Hello World')"))
+    assert result.stdout == "Hello World\n"
     assert result.stderr == ""
     assert result.returncode == 0
 
 
-def test_run_command_failure(mocker):
-    mocker.patch(
-        "subprocess.run",
-        return_value=mocker.Mock(stdout="", stderr="error", returncode=1),
-    )
-    result = utils.run("invalid_command")
+def test_run_command_failure():
+    result = utils.run(python("import sys; sys.exit('error')"))
     assert result.stdout == ""
-    assert result.stderr == "error"
+    assert result.stderr == "error\n"
     assert result.returncode == 1
 
 
+def test_run_command_does_not_use_a_shell():
+    result = utils.run([*python("import sys; print(sys.argv[1])"), "$HOME; exit 1"])
+    assert result.stdout == "$HOME; exit 1\n"
+    assert result.returncode == 0
+
+
+def test_run_command_not_found():
+    result = utils.run(["dp-no-such-command", "--version"])
+    assert result.returncode == utils.COMMAND_NOT_FOUND_RETURNCODE
+    assert "dp-no-such-command" in result.stderr
+
+
+@posix_only
+def test_run_command_timeout_kills_process_group():
+    start = time.monotonic()
+    result = utils.run(
+        python(
+            "import subprocess, sys, time; "
+            "subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)']); "
+            "print('started', flush=True); "
+            "time.sleep(30)"
+        ),
+        timeout=1,
+    )
+    assert isinstance(result, utils.RunTimeout)
+    assert result.returncode == utils.TIMEOUT_RETURNCODE
+    assert result.stdout == "started\n"
+    # The child sleep holds on to stdout, so we only get here if it was killed too
+    assert time.monotonic() - start < 5
+
+
+def test_run_command_global_deadline():
+    with utils.deadline(1):
+        result = utils.run(python("import time; time.sleep(30)"), timeout=None)
+        assert isinstance(result, utils.RunTimeout)
+        assert result.timeout <= 1
+
+        time.sleep(0.5)
+        result = utils.run(python("print('Hello World')"))
+        assert isinstance(result, utils.RunTimeout)
+        assert result.stdout == ""
+
+    assert utils.run(python("print('Hello World')")).returncode == 0
+
+
+def test_run_command_cancelled():
+    utils.cancel_all()
+    try:
+        result = utils.run(python("print('Hello World')"))
+        assert result.returncode == utils.CANCELLED_RETURNCODE
+        assert result.stdout == ""
+    finally:
+        utils._cancelled.clear()
+
+
+def test_run_many_preserves_order():
+    results = utils.run_many(
+        [python(f"import time; time.sleep(0.{3 - i}); print({i})") for i in range(3)],
+        3,
+    )
+    assert [r.stdout for r in results] == ["0\n", "1\n", "2\n"]
+
+
+def test_cancel_on_interrupt_nested_keeps_cancellation():
+    with pytest.raises(KeyboardInterrupt), utils.cancel_on_interrupt():
+        try:
+            with utils.cancel_on_interrupt():
+                raise KeyboardInterrupt
+        except KeyboardInterrupt:
+            with utils.cancel_on_interrupt():
+                result = utils.run(python("print('Hello World')"))
+            raise
+
+    assert result.returncode == utils.CANCELLED_RETURNCODE
+    with utils.cancel_on_interrupt():
+        assert utils.run(python("print('Hello World')")).returncode == 0
+
+
+def test_cancel_on_interrupt_cancels_pending_jobs():
+    with (
+        pytest.raises(KeyboardInterrupt),
+        ThreadPoolExecutor(max_workers=1) as pool,
+        utils.cancel_on_interrupt(pool),
+    ):
+        # The first job keeps the only worker busy until the interrupt cancels commands
+        running = pool.submit(utils._cancelled.wait, 5)
+        pending = [pool.submit(print, i) for i in range(2)]
+        raise KeyboardInterrupt
+
+    utils._cancelled.clear()
+    assert running.result()
+    assert all(job.cancelled() for job in pending)
+
+
 def test_run_command_dryrun(mocker):
-    result = utils.run("echo 'Hello World'", dryrun=True)
+    result = utils.run(["echo", "Hello World"], dryrun=True)
     assert result.stdout == ""
     assert result.stderr == ""
     assert result.returncode == 0
 
 
+def test_run_command_verbose_prints_to_stderr(capsys):
+    utils.run(["echo", "Hello World"], dryrun=True, verbose=True)
+    captured = capsys.readouterr()
+    assert captured.out == ""
+    assert "DRYRUN: echo 'Hello World'" in captured.err
+
+
 def test_assert_successful_command_success(mocker):
     mocker.patch(
         "dp.utils.run", return_value=utils.RunResult(stdout="", stderr="", returncode=0)
     )
     with mocker.patch("sys.stdout", new=io.StringIO()) as mock_stdout:
         utils.assert_successful_command(
-            "echo 'Hello World'", "Error message", "Success message"
+            ["echo", "Hello World"], "Error message", "Success message"
         )
         assert "✔️ Success message" in mock_stdout.getvalue()
 
@@ -112,7 +216,7 @@ def test_assert_successful_command_failure(mocker):
     )
     with mocker.patch("sys.stderr", new=io.StringIO()) as mock_stderr:
         with pytest.raises(typer.Exit):
-            utils.assert_successful_command("invalid_command", "Error message", None)
+            utils.assert_successful_command(["invalid_command"], "Error message", None)
             assert "❌  Error message" in mock_stderr.getvalue()
 
 
@@ -0,0 +1,208 @@
+import json
+from datetime import datetime, timezone
+from typing import Any
+
+import pytest
+
+from dp import kube, utils, workloads
+from dp.utils import RunResult, RunTimeout
+from dp.workloads import (
+    RELEASE_NAME_ANNOTATION,
+    SUSPENDED_AT_ANNOTATION,
+    SUSPENDED_REPLICAS_ANNOTATION,
+)
+
+
+def workload(name: str, release: str, replicas: int, **annotations: str) -> dict:
+    return {
+        "metadata": {
+            "name": name,
+            "annotations": {RELEASE_NAME_ANNOTATION: release, **annotations},
+        },
+        "spec": {"replicas": replicas},
+    }
+
+
+@pytest.fixture
+def client(mocker):
+    cluster: dict[str, list[dict[str, Any]]] = {
+        "/apis/apps/v1/namespaces/user-ssb-a/deployments": [
+            workload("jupyter-abc", "jupyter-abc", 1),
+            workload("other", "other", 1),
+        ],
+        "/apis/apps/v1/namespaces/user-ssb-a/statefulsets": [
+            workload("jupyter-abc-db", "jupyter-abc", 2),
+            workload(
+                "jupyter-abc-cache",
+                "jupyter-abc",
+                0,
+                **{SUSPENDED_REPLICAS_ANNOTATION: "3"},
+            ),
+        ],
+    }
+    client = mocker.MagicMock()
+    client.list.side_effect = lambda path, verbose: iter(cluster[path])
+    mocker.patch("dp.workloads.kube.client", return_value=client)
+    return client
+
+
+def test_scale_down_records_replicas(client) -> None:
+    before = datetime.now(timezone.utc)
+    res = workloads.scale_down("user-ssb-a", "jupyter-abc")
+
+    assert res.returncode == 0
+    patches = {c.args[0]: c.args[1] for c in client.patch.call_args_list}
+    for patch in patches.values():
+        suspended_at = patch["metadata"]["annotations"].pop(SUSPENDED_AT_ANNOTATION)
+        assert datetime.fromisoformat(suspended_at) >= before
+    assert patches == {
+        "/apis/apps/v1/namespaces/user-ssb-a/deployments/jupyter-abc": {
+            "metadata": {"annotations": {SUSPENDED_REPLICAS_ANNOTATION: "1"}},
+            "spec": {"replicas": 0},
+        },
+        "/apis/apps/v1/namespaces/user-ssb-a/statefulsets/jupyter-abc-db": {
+            "metadata": {"annotations": {SUSPENDED_REPLICAS_ANNOTATION: "2"}},
+            "spec": {"replicas": 0},
+        },
+    }
+
+
+def test_scale_up_restores_recorded_replicas(client) -> None:
+    res = workloads.scale_up("user-ssb-a", "jupyter-abc")
+
+    assert res.returncode == 0
+    client.patch.assert_called_once_with(
+        "/apis/apps/v1/namespaces/user-ssb-a/statefulsets/jupyter-abc-cache",
+        {
+            "metadata": {
+                "annotations": {
+                    SUSPENDED_REPLICAS_ANNOTATION: None,
+                    SUSPENDED_AT_ANNOTATION: None,
+                }
+            },
+            "spec": {"replicas": 3},
+        },
+        verbose=False,
+        timeout=kube.REQUEST_TIMEOUT,
+    )
+
+
+def test_scaled_down_releases(client) -> None:
+    assert workloads.scaled_down_releases("user-ssb-a") == {
+        ("user-ssb-a", "jupyter-abc"): None
+    }
+
+
+def test_scaled_down_releases_records_when_suspended(client) -> None:
+    suspended_at = datetime(2024, 10, 1, 12, tzinfo=timezone.utc)
+    client.list.side_effect = lambda path, verbose: iter(
+        [
+            workload(
+                "jupyter-abc",
+                "jupyter-abc",
+                0,
+                **{
+                    SUSPENDED_REPLICAS_ANNOTATION: "1",
+                    SUSPENDED_AT_ANNOTATION: suspended_at.isoformat(),
+                },
+            )
+        ]
+        if path.endswith("/deployments")
+        else []
+    )
+
+    assert workloads.scaled_down_releases("user-ssb-a") == {
+        ("user-ssb-a", "jupyter-abc"): suspended_at
+    }
+
+
+def test_scaled_down_releases_in_all_namespaces_ignores_scaled_up(mocker) -> None:
+    items = [
+        {**workload(name, name, replicas, **annotations), "kind": "Deployment"}
+        for name, replicas, annotations in [
+            ("jupyter-abc", 0, {SUSPENDED_REPLICAS_ANNOTATION: "1"}),
+            ("jupyter-def", 1, {SUSPENDED_REPLICAS_ANNOTATION: "1"}),
+            ("jupyter-ghi", 0, {}),
+        ]
+    ]
+    items[0]["metadata"]["namespace"] = "user-ssb-a"
+    mock_run = mocker.patch(
+        "dp.workloads.run",
+        return_value=RunResult(
+            stdout=json.dumps({"items": items}), stderr="", returncode=0
+        ),
+    )
+    mocker.patch("dp.workloads.kube.client", side_effect=kube.KubeUnavailable)
+
+    assert workloads.scaled_down_releases(None) == {("user-ssb-a", "jupyter-abc"): None}
+    assert "--all-namespaces" in mock_run.call_args.args[0]
+
+
+def test_scale_down_dryrun_does_not_patch(client) -> None:
+    assert (
+        workloads.scale_down("user-ssb-a", "jupyter-abc", dryrun=True).returncode == 0
+    )
+    client.patch.assert_not_called()
+
+
+def test_scale_down_reports_failed_patch(client) -> None:
+    client.patch.side_effect = ValueError("Could not patch: 403 Forbidden")
+
+    res = workloads.scale_down("user-ssb-a", "jupyter-abc")
+
+    assert res.returncode == 1
+    assert "403 Forbidden" in res.stderr
+
+
+def test_scale_down_does_not_patch_once_cancelled(client) -> None:
+    utils.cancel_all()
+    try:
+        res = workloads.scale_down("user-ssb-a", "jupyter-abc")
+    finally:
+        utils._cancelled.clear()
+
+    assert res.returncode == utils.CANCELLED_RETURNCODE
+    client.patch.assert_not_called()
+
+
+def test_scale_down_does_not_patch_past_deadline(client) -> None:
+    with utils.deadline(0):
+        res = workloads.scale_down("user-ssb-a", "jupyter-abc")
+
+    assert isinstance(res, RunTimeout)
+    client.patch.assert_not_called()
+
+
+def test_scale_down_bounds_patches_by_deadline(client) -> None:
+    with utils.deadline(10):
+        workloads.scale_down("user-ssb-a", "jupyter-abc")
+
+    assert all(c.kwargs["timeout"] <= 10 for c in client.patch.call_args_list)
+
+
+def test_scale_down_reports_failed_listing(client) -> None:
+    client.list.side_effect = ValueError("Could not list: 503 Service Unavailable")
+
+    res = workloads.scale_down("user-ssb-a", "jupyter-abc")
+
+    assert res.returncode == 1
+    assert "503 Service Unavailable" in res.stderr
+    client.patch.assert_not_called()
+
+
+def test_scale_down_falls_back_to_kubectl(mocker) -> None:
+    items = [{**workload("jupyter-abc", "jupyter-abc", 1), "kind": "Deployment"}]
+    mock_run = mocker.patch(
+        "dp.workloads.run",
+        side_effect=[
+            RunResult(stdout=json.dumps({"items": items}), stderr="", returncode=0),
+            RunResult(stdout="", stderr="", returncode=0),
+        ],
+    )
+    mocker.patch("dp.workloads.kube.client", side_effect=kube.KubeUnavailable)
+
+    assert workloads.scale_down("user-ssb-a", "jupyter-abc").returncode == 0
+
+    patch = mock_run.call_args_list[1].args[0]
+    assert patch[:3] == ["kubectl", "patch", "deployments/jupyter-abc"]
+    assert json.loads(patch[-1])["spec"] == {"replicas": 0}